@@ -1,18 +1,56 @@
 #Versão restruturada do do jogo
 
-import pygame as pg
+from __future__ import annotations
+
 import random
 import time
+# Início da carga do módulo (relatório de inicialização)
+_MODULE_START = time.perf_counter()
 import sys
 import math
-from typing import List, Tuple, Dict, Optional, Any
+from typing import List, Tuple, Dict, Optional, Any, NamedTuple, Iterator, Sequence
 from enum import Enum, auto
 from dataclasses import dataclass, field
-from collections import deque
+from collections import OrderedDict, deque
+from itertools import islice
+import argparse
+import importlib
+import io
+import queue
+import sqlite3
+import threading
 import json
+import struct
+from array import array
 import os
 
 
+class _LazyModule:
+    """Importa um módulo só quando algum atributo dele é usado.
+
+    Assim a simulação headless roda em servidores sem display e sem pygame,
+    e a abertura do jogo não paga numpy, asyncio e multiprocessing, que só a
+    simulação em lote, o multiplayer e o self-play usam.
+    """
+
+    def __init__(self, name: str, alias: str):
+        self._name = name
+        self._alias = alias
+
+    def __getattr__(self, attr: str):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+
+pg = _LazyModule('pygame', 'pg')
+np = _LazyModule('numpy', 'np')
+asyncio = _LazyModule('asyncio', 'asyncio')
+multiprocessing = _LazyModule('multiprocessing', 'multiprocessing')
+futures = _LazyModule('concurrent.futures', 'futures')
+tracemalloc = _LazyModule('tracemalloc', 'tracemalloc')
+
+
 class GameConfiguration:
     
     @staticmethod
@@ -26,6 +64,56 @@ class GameConfiguration:
         WINDOW_HEIGHT = BASE_TILE_SIZE * SCREEN_MULTIPLIER_Y
         FPS_LIMIT = 60
         WINDOW_TITLE = "POP BLOCK"
+        # Passo fixo: no máximo tantos ticks por quadro; o atraso acima de
+        # MAX_FRAME_TIME é descartado em vez de acumulado
+        MAX_TICKS_PER_FRAME = 16
+        MAX_FRAME_TIME = 0.25
+        # Auto-repeat das teclas de movimento (delay e intervalo, em ms)
+        DAS_MS = 170
+        ARR_MS = 50
+        # Pula o render enquanto a lógica estiver atrasada, mas desenha pelo
+        # menos um quadro a cada MAX_SKIPPED_FRAMES pulados seguidos
+        SKIP_RENDER_WHEN_BEHIND = True
+        MAX_SKIPPED_FRAMES = 5
+        # Desenha a peça entre duas linhas conforme o progresso da gravidade
+        INTERPOLATE_RENDER = False
+        # Camadas em cache + pg.display.update(rects) em vez de flip()
+        DIRTY_RECT_RENDERING = True
+        # Contorno de onde a peça vai cair
+        SHOW_GHOST_PIECE = True
+        # Grades grandes: o tile diminui até caber na janela (BASE_TILE_SIZE é
+        # o máximo e a escala dos painéis); abaixo de GRID_LINES_MIN_TILE as
+        # linhas da grade não são desenhadas
+        MIN_TILE_SIZE = 2
+        GRID_LINES_MIN_TILE = 8
+        # Fonte dos textos: arquivo junto do jogo ou, sem ele, a fonte do
+        # sistema (procurada em segundo plano). A abertura espera a fonte no
+        # máximo FONT_WAIT_MS antes de desenhar com a fonte padrão.
+        FONT_FILE = 'RussoOne-Regular.ttf'
+        FONT_NAME = 'Russo One'
+        FONT_WAIT_MS = 50
+
+    @staticmethod
+    class AudioSettings:
+        FREQUENCY = 44100
+        BUFFER = 512
+        MUSIC_FILE = 'tetris_music.mp3'
+        MUSIC_VOLUME = 0.3
+        # Vozes simultâneas dos efeitos; com todas ocupadas a próxima do
+        # rodízio é cortada
+        SFX_CHANNELS = 8
+        SFX_VOLUME = 0.5
+        # Efeitos: SFX_DIR/<nome>.ogg ou .wav junto do jogo ou, sem o
+        # arquivo, um tom gerado com as notas (Hz) e a duração total (ms)
+        SFX_DIR = 'sfx'
+        SFX_TONES = {
+            'rotate': ((880,), 25),
+            'lock': ((196,), 50),
+            'clear': ((523, 659, 784), 180),
+            'tetris': ((523, 659, 784, 1047), 320),
+            'level': ((392, 523, 659, 784), 400),
+            'game_over': ((392, 330, 262, 196), 700),
+        }
         
     @staticmethod
     class ColorSystem:
@@ -77,13 +165,27 @@ class GameConfiguration:
         LINE_CLEAR_SCORE = 10
         SPEED_INCREASE_THRESHOLD = 100
         FALL_TIME_BASE = 60
+        # Ticks de lógica por segundo; FALL_TIME_BASE está em ticks a BASE_TICK_RATE
+        TICK_RATE = 60
+        BASE_TICK_RATE = 60
         PREVIEW_SHAPES_COUNT = 4
+        # Formas sorteadas à frente na fila; além disso peek() usa um clone
+        PREVIEW_BUFFER_SIZE = 8
+        RANDOMIZER = 'uniform'  # nome em RANDOMIZERS
         GRID_WIDTH = 10
         GRID_HEIGHT = 20
+        # Spawn das peças; SPAWN_X None = centro (GRID_WIDTH // 2 - 1)
+        SPAWN_X = None
+        SPAWN_Y = 0
+        PIECE_SET = 'classic'  # nome em PIECE_SETS ou arquivo JSON
+        GRID_BACKEND = 'bitboard'  # 'list' ou 'bitboard'
+        STATS_PATH = 'pop_block_stats.db'
 
 
 class GameEventType(Enum):
-    
+    # Hash por identidade: o Enum.__hash__ padrão é Python puro e pesa em emit()
+    __hash__ = object.__hash__
+
     SHAPE_LOCKED = auto()
     LINE_CLEARED = auto()
     GAME_OVER = auto()
@@ -94,29 +196,266 @@ class GameEventType(Enum):
     SHAPE_ROTATED = auto()
     SHAPE_MOVED = auto()
 
-@dataclass
+# Nomes dos campos de data de cada tipo, na ordem de emit()
+EVENT_FIELDS: Dict[GameEventType, Tuple[str, ...]] = {
+    GameEventType.SHAPE_LOCKED: ('shape', 'ticks'),
+    GameEventType.LINE_CLEARED: ('lines',),
+    GameEventType.SCORE_UPDATED: ('score', 'level'),
+    GameEventType.LEVEL_CHANGED: ('level',),
+    GameEventType.SHAPE_ROTATED: ('rotation',),
+    GameEventType.SHAPE_MOVED: ('x', 'y'),
+}
+
+# Eventos de alta frequência: juntados em um por tick (vale o último data)
+COALESCED_EVENTS = frozenset({
+    GameEventType.SHAPE_MOVED,
+    GameEventType.SHAPE_ROTATED,
+    GameEventType.SCORE_UPDATED,
+})
+
+
 class GameEvent:
-    event_type: GameEventType
-    data: Dict[str, Any] = field(default_factory=dict)
-    timestamp: float = field(default_factory=time.time)
+    """Evento do jogo, com o tick da simulação como carimbo de tempo.
+
+    Os eventos de emit() vêm de um pool e são reaproveitados depois da
+    entrega: listeners síncronos não devem guardar o objeto (use copy()).
+    count diz quantas emissões foram juntadas no evento.
+    """
+
+    __slots__ = ('event_type', 'data', 'tick', 'count')
+
+    def __init__(self, event_type: GameEventType, data: Optional[Dict[str, Any]] = None,
+                 tick: int = 0, count: int = 1):
+        self.event_type = event_type
+        self.data = data if data is not None else {}
+        self.tick = tick
+        self.count = count
+
+    def copy(self) -> 'GameEvent':
+        return GameEvent(self.event_type, dict(self.data), self.tick, self.count)
+
+    def __repr__(self) -> str:
+        return f"GameEvent({self.event_type.name}, {self.data}, tick={self.tick}, count={self.count})"
+
 
 class EventDispatcher:
-    
-    
-    def __init__(self):
-        self._listeners: Dict[GameEventType, List] = {}
-        
-    def add_listener(self, event_type: GameEventType, callback):
+    """Entrega de eventos com prioridades, eventos em pool e junção por tick.
+
+    - emit() sem listeners para o tipo só faz uma consulta de dicionário,
+      então a simulação pode emitir eventos de movimento em todo tick.
+    - Listeners de prioridade maior rodam antes; empates na ordem de inscrição.
+    - Tipos em coalesce são guardados até end_tick() e entregues uma vez.
+    - Listeners com threaded=True recebem uma cópia do evento numa thread de
+      fundo, em lotes numa fila limitada. Enquanto a thread está ocupada os
+      ticks seguintes são juntados no mesmo lote (até ASYNC_BATCH_EVENTS), em
+      vez de um put por tick.
+    - Com a fila cheia, só eventos de listeners marcados com drop_ok=True são
+      descartados (contados em dropped); os demais esperam até
+      ASYNC_PUT_TIMEOUT e, se ainda não couberem, seguem para o próximo tick
+      (contado em stalls). Nenhum evento de listener sem drop_ok se perde.
+    """
+
+    # Prioridade dos handlers da própria simulação
+    PRIORITY_CORE = 100
+    POOL_SIZE = 64
+    # Lotes (ticks) na fila da thread de eventos
+    ASYNC_QUEUE_SIZE = 1024
+    # Eventos juntados antes de mandar um lote com a thread ainda ocupada
+    ASYNC_BATCH_EVENTS = 64
+    # Espera máxima (s) por vaga na fila antes de adiar o lote para o próximo tick
+    ASYNC_PUT_TIMEOUT = 0.05
+
+    def __init__(self, coalesce=COALESCED_EVENTS):
+        self._listeners: Dict[GameEventType, List[Tuple[int, int, Any, bool, bool]]] = {}
+        # Por tipo: (callbacks síncronos, de fundo, de fundo com drop_ok), em ordem
+        self._callbacks: Dict[GameEventType, Tuple[tuple, tuple, tuple]] = {}
+        self._sequence = 0
+        self.coalesce = frozenset(coalesce)
+        self._pending: Dict[GameEventType, GameEvent] = {}
+        self._pool: List[GameEvent] = []
+        # Eventos para os listeners de fundo, mandados à fila em end_tick();
+        # _lossy guarda os dos listeners com drop_ok, que podem ser descartados
+        self._outbox: List[Tuple[tuple, GameEvent]] = []
+        self._lossy: List[Tuple[tuple, GameEvent]] = []
+        self._queue: Optional[queue.Queue] = None
+        self._worker: Optional[threading.Thread] = None
+        self.dropped = 0
+        self.stalls = 0
+
+    def add_listener(self, event_type: GameEventType, callback, priority: int = 0,
+                     threaded: bool = False, drop_ok: bool = False):
+        """Inscreve callback; threaded=True entrega na thread de eventos.
+
+        drop_ok=True marca um listener de fundo que tolera perder eventos
+        quando a fila enche (efeitos, telemetria); sem ele a entrega é garantida.
+        """
+        if drop_ok and not threaded:
+            raise ValueError("drop_ok só vale para listeners com threaded=True")
+        self._sequence += 1
+        listeners = self._listeners.setdefault(event_type, [])
+        listeners.append((-priority, self._sequence, callback, threaded, drop_ok))
+        listeners.sort(key=lambda entry: entry[:2])
+        self._rebuild(event_type)
+        if threaded and self._worker is None:
+            self._start_worker()
+        return callback
+
+    def remove_listener(self, event_type: GameEventType, callback) -> bool:
+        """Cancela a inscrição; retorna se o callback estava inscrito"""
+        listeners = self._listeners.get(event_type, [])
+        for index, entry in enumerate(listeners):
+            if entry[2] == callback:
+                del listeners[index]
+                self._rebuild(event_type)
+                return True
+        return False
+
+    def _rebuild(self, event_type: GameEventType):
+        # Tuplas novas: remover durante uma entrega não afeta a entrega atual
+        listeners = self._listeners.get(event_type)
+        if not listeners:
+            self._listeners.pop(event_type, None)
+            self._callbacks.pop(event_type, None)
+            return
+        self._callbacks[event_type] = (
+            tuple(entry[2] for entry in listeners if not entry[3]),
+            tuple(entry[2] for entry in listeners if entry[3] and not entry[4]),
+            tuple(entry[2] for entry in listeners if entry[4]),
+        )
+
+    def has_listeners(self, event_type: GameEventType) -> bool:
+        return event_type in self._callbacks
+
+    def emit(self, event_type: GameEventType, tick: int = 0, *values):
+        """Emite um evento com os campos de EVENT_FIELDS, sem alocar o evento"""
+        callbacks = self._callbacks.get(event_type)
+        if callbacks is None:
+            return
+        if event_type in self.coalesce:
+            event = self._pending.get(event_type)
+            if event is not None:
+                event.count += 1
+                event.tick = tick
+                event.data.update(zip(EVENT_FIELDS[event_type], values))
+                return
+        pool = self._pool
+        event = pool.pop() if pool else GameEvent(event_type)
+        event.event_type = event_type
+        event.tick = tick
+        event.count = 1
+        if values:
+            event.data.update(zip(EVENT_FIELDS[event_type], values))
+        if event_type in self.coalesce:
+            self._pending[event_type] = event
+            return
+
+        for callback in callbacks[0]:
+            callback(event)
+        if callbacks[1] or callbacks[2]:
+            self._post(callbacks, event)
+        if len(pool) < self.POOL_SIZE:
+            event.data.clear()
+            pool.append(event)
 
-        if event_type not in self._listeners:
-            self._listeners[event_type] = []
-        self._listeners[event_type].append(callback)
-        
     def dispatch_event(self, event: GameEvent):
-        
-        if event.event_type in self._listeners:
-            for callback in self._listeners[event.event_type]:
-                callback(event)
+        """Entrega um evento já montado, na hora (nunca é juntado)"""
+        callbacks = self._callbacks.get(event.event_type)
+        if callbacks is None:
+            return
+        for callback in callbacks[0]:
+            callback(event)
+        if callbacks[1] or callbacks[2]:
+            self._post(callbacks, event)
+
+    def _post(self, callbacks: Tuple[tuple, tuple, tuple], event: GameEvent):
+        # Uma cópia para a thread de eventos, dividida entre as duas caixas
+        event = event.copy()
+        if callbacks[1]:
+            self._outbox.append((callbacks[1], event))
+        if callbacks[2]:
+            self._lossy.append((callbacks[2], event))
+
+    def end_tick(self):
+        """Entrega os eventos juntados no tick e manda o lote da thread de eventos"""
+        if self._pending:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            for event in pending:
+                self.dispatch_event(event)
+                if len(self._pool) < self.POOL_SIZE:
+                    event.data.clear()
+                    self._pool.append(event)
+        if self._outbox or self._lossy:
+            self._send()
+
+    def _send(self, force: bool = False):
+        """Manda as caixas de saída para a thread de eventos como um lote.
+
+        Com force=False o lote pode ser adiado (thread ocupada ou fila cheia);
+        com force=True espera a vaga sem limite de tempo.
+        """
+        outbox, lossy = self._outbox, self._lossy
+        if not force and len(outbox) + len(lossy) < self.ASYNC_BATCH_EVENTS \
+                and self._queue.qsize():
+            # Thread ainda ocupada: junta este tick ao próximo lote
+            return
+        if force:
+            self._queue.put(outbox + lossy)
+        else:
+            try:
+                self._queue.put_nowait(outbox + lossy)
+            except queue.Full:
+                self.dropped += len(lossy)
+                self._lossy = []
+                if not outbox:
+                    return
+                try:
+                    self._queue.put(outbox, timeout=self.ASYNC_PUT_TIMEOUT)
+                except queue.Full:
+                    # Continua na caixa e vai junto com o próximo tick
+                    self.stalls += 1
+                    return
+        self._outbox = []
+        self._lossy = []
+
+    def _start_worker(self):
+        self._queue = queue.Queue(self.ASYNC_QUEUE_SIZE)
+        self._worker = threading.Thread(target=self._worker_loop, name='event-worker',
+                                        daemon=True)
+        self._worker.start()
+
+    def _worker_loop(self):
+        while True:
+            batch = self._queue.get()
+            try:
+                if batch is None:
+                    return
+                for callbacks, event in batch:
+                    for callback in callbacks:
+                        try:
+                            callback(event)
+                        except Exception as e:
+                            print(f"Erro em listener de {event.event_type.name}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Espera a thread de eventos entregar tudo que já foi emitido"""
+        if self._queue is not None:
+            self.end_tick()
+            if self._outbox or self._lossy:
+                self._send(force=True)
+            self._queue.join()
+
+    def close(self):
+        """Entrega o que falta e para a thread de eventos"""
+        self.end_tick()
+        if self._worker is not None and self._worker.is_alive():
+            if self._outbox or self._lossy:
+                self._send(force=True)
+            self._queue.put(None)
+            self._worker.join()
+        self._worker = None
 
 #  Formas
 class TetrominoType(Enum):
@@ -129,18 +468,99 @@ class TetrominoType(Enum):
     S = auto()  # S
     Z = auto()  # Z
 
+@dataclass(frozen=True)
+class RotationMask:
+    """Máscaras de colisão pré-calculadas de uma rotação.
+
+    row_masks[dy] tem o bit i ligado quando a célula (min_x + i, dy) está
+    ocupada, então basta deslocar por (x + min_x) para testar contra a grade.
+    column_profile tem (x, dy de cima, dy de baixo, células) de cada coluna.
+    shifted() guarda, por deslocamento, só as linhas ocupadas já deslocadas;
+    painted() junta a cada uma a máscara espalhada em bytes (um 1 por célula)
+    para pintar as cores.
+    """
+    cells: Tuple[Tuple[int, int], ...]
+    row_masks: Tuple[int, ...]
+    min_x: int
+    max_x: int
+    min_y: int
+    max_y: int
+    column_profile: Tuple[Tuple[int, int, int, int], ...]
+    shifted_rows: Dict[int, Tuple[Tuple[int, int], ...]] = field(
+        default_factory=dict, compare=False, repr=False)
+    painted_rows: Dict[int, Tuple[Tuple[int, int, int], ...]] = field(
+        default_factory=dict, compare=False, repr=False)
+
+    def shifted(self, shift: int) -> Tuple[Tuple[int, int], ...]:
+        """(dy, máscara << shift) das linhas ocupadas, em cache por shift"""
+        rows = self.shifted_rows.get(shift)
+        if rows is None:
+            rows = self.shifted_rows[shift] = tuple(
+                (dy, row_mask << shift) for dy, row_mask in enumerate(self.row_masks) if row_mask
+            )
+        return rows
+
+    def painted(self, shift: int) -> Tuple[Tuple[int, int, int], ...]:
+        """(dy, máscara << shift, um byte 1 por célula) das linhas ocupadas"""
+        rows = self.painted_rows.get(shift)
+        if rows is None:
+            rows = self.painted_rows[shift] = tuple(
+                (dy, row_mask, sum(1 << (x << 3) for x in range(row_mask.bit_length())
+                                   if row_mask >> x & 1))
+                for dy, row_mask in self.shifted(shift)
+            )
+        return rows
+
+    @classmethod
+    def from_matrix(cls, matrix: List[List[int]]) -> 'RotationMask':
+        cells = tuple(
+            (x, y)
+            for y, row in enumerate(matrix)
+            for x, cell in enumerate(row)
+            if cell
+        )
+        min_x = min(x for x, _ in cells)
+        row_masks = tuple(
+            sum(1 << (x - min_x) for x, cell in enumerate(row) if cell)
+            for row in matrix
+        )
+        columns = sorted({x for x, _ in cells})
+        column_profile = tuple(
+            (
+                column,
+                min(y for x, y in cells if x == column),
+                max(y for x, y in cells if x == column),
+                sum(1 for x, _ in cells if x == column),
+            )
+            for column in columns
+        )
+        return cls(
+            cells=cells,
+            row_masks=row_masks,
+            min_x=min_x,
+            max_x=max(x for x, _ in cells),
+            min_y=min(y for _, y in cells),
+            max_y=max(y for _, y in cells),
+            column_profile=column_profile,
+        )
+
+
 @dataclass
 class TetrominoDefinition:
-    
+
     shape_type: TetrominoType
     shape_matrix: List[List[int]]
     color_name: str
     rotation_states: List[List[List[int]]] = field(default_factory=list)
-    
+    rotation_masks: List[RotationMask] = field(default_factory=list)
+
     def __post_init__(self):
-        
+
         self.rotation_states = self._generate_all_rotations()
-    
+        self.rotation_masks = [
+            RotationMask.from_matrix(matrix) for matrix in self.rotation_states
+        ]
+
     def _generate_all_rotations(self) -> List[List[List[int]]]:
         rotations = [self.shape_matrix]
         current = self.shape_matrix
@@ -153,67 +573,363 @@ class TetrominoDefinition:
             
         return rotations
 
+@dataclass(frozen=True)
+class TetrominoRotationView:
+    """Visão imutável de uma forma numa rotação, criada uma vez pela fábrica"""
+    shape_type: TetrominoType
+    rotation_index: int
+    shape_matrix: Tuple[Tuple[int, ...], ...]
+    color_name: str
+    color_code: str
+    mask: RotationMask
+    block_count: int
+
+
+class PentominoType(Enum):
+    """Peças de cinco blocos do conjunto 'pentomino'"""
+    F = auto()
+    I = auto()
+    L = auto()
+    N = auto()
+    P = auto()
+    T = auto()
+    U = auto()
+    V = auto()
+    W = auto()
+    X = auto()
+    Y = auto()
+    Z = auto()
+
+
+# Conjuntos de peças: tipo -> (matriz, nome da cor). O código de cor de cada
+# peça vem de ColorSystem.get_color_code_mapping
+PIECE_SETS: Dict[str, Dict[Any, Tuple[List[List[int]], str]]] = {
+    'classic': {
+        TetrominoType.O: ([[1, 1], [1, 1]], 'YELLOW'),
+        TetrominoType.I: ([[1, 1, 1, 1]], 'LIGHT_BLUE'),
+        TetrominoType.T: ([[0, 1, 0], [1, 1, 1]], 'PURPLE'),
+        TetrominoType.L: ([[1, 0, 0], [1, 1, 1]], 'ORANGE'),
+        TetrominoType.J: ([[0, 0, 1], [1, 1, 1]], 'BLUE'),
+        TetrominoType.S: ([[0, 1, 1], [1, 1, 0]], 'GREEN'),
+        TetrominoType.Z: ([[1, 1, 0], [0, 1, 1]], 'RED'),
+    },
+    'pentomino': {
+        PentominoType.F: ([[0, 1, 1], [1, 1, 0], [0, 1, 0]], 'PURPLE'),
+        PentominoType.I: ([[1, 1, 1, 1, 1]], 'LIGHT_BLUE'),
+        PentominoType.L: ([[1, 0, 0, 0], [1, 1, 1, 1]], 'ORANGE'),
+        PentominoType.N: ([[1, 1, 0, 0], [0, 1, 1, 1]], 'RED'),
+        PentominoType.P: ([[1, 1], [1, 1], [1, 0]], 'YELLOW'),
+        PentominoType.T: ([[1, 1, 1], [0, 1, 0], [0, 1, 0]], 'PURPLE'),
+        PentominoType.U: ([[1, 0, 1], [1, 1, 1]], 'BLUE'),
+        PentominoType.V: ([[1, 0, 0], [1, 0, 0], [1, 1, 1]], 'BLUE'),
+        PentominoType.W: ([[1, 0, 0], [1, 1, 0], [0, 1, 1]], 'GREEN'),
+        PentominoType.X: ([[0, 1, 0], [1, 1, 1], [0, 1, 0]], 'RED'),
+        PentominoType.Y: ([[0, 1, 0, 0], [1, 1, 1, 1]], 'YELLOW'),
+        PentominoType.Z: ([[1, 1, 0], [0, 1, 0], [0, 1, 1]], 'GREEN'),
+    },
+}
+
+
+def load_piece_set(path: str) -> str:
+    """Registra em PIECE_SETS as peças de um JSON e devolve o nome (o caminho).
+
+    Formato: {"NOME": {"shape": [[0, 1], [1, 1]], "color": "RED"}, ...}, com
+    cores da paleta que tenham código de cor.
+    """
+    with open(path, encoding='utf-8') as piece_file:
+        spec = json.load(piece_file)
+    color_codes = {
+        name: code
+        for code, name in GameConfiguration.ColorSystem.get_color_code_mapping().items()
+    }
+    if not spec:
+        raise ValueError(f"nenhuma peça em {path}")
+    piece_type = Enum('PieceType', list(spec))
+    pieces = {}
+    for name, piece in spec.items():
+        matrix = [[1 if cell else 0 for cell in row] for row in piece['shape']]
+        color_name = piece.get('color', 'GRAY')
+        if color_name not in color_codes:
+            raise ValueError(f"cor sem código de cor na peça {name}: {color_name}")
+        if not any(any(row) for row in matrix) or len({len(row) for row in matrix}) != 1:
+            raise ValueError(f"forma inválida na peça {name}")
+        pieces[piece_type[name]] = (matrix, color_name)
+    PIECE_SETS[path] = pieces
+    return path
+
+
+def get_piece_set(name: str) -> Dict[Any, Tuple[List[List[int]], str]]:
+    """Conjunto de peças pelo nome; um caminho de JSON é carregado na primeira vez"""
+    if name not in PIECE_SETS:
+        if not os.path.isfile(name):
+            raise ValueError(f"conjunto de peças desconhecido: {name}")
+        load_piece_set(name)
+    return PIECE_SETS[name]
+
+
+class PieceRandomizer:
+    """Sorteia a sequência de formas a partir de um random.Random.
+
+    next() devolve a próxima forma e take() várias de uma vez. getstate() e
+    setstate() cobrem só o estado do próprio randomizador (saco, histórico);
+    o rng é guardado à parte.
+    """
+
+    def __init__(self, shapes: Sequence, rng):
+        self.shapes = tuple(shapes)
+        self.rng = rng
+
+    def next(self):
+        raise NotImplementedError
+
+    def take(self, count: int) -> list:
+        next_shape = self.next
+        return [next_shape() for _ in range(count)]
+
+    def getstate(self) -> tuple:
+        return ()
+
+    def setstate(self, state: tuple):
+        pass
+
+    def clone(self, rng) -> 'PieceRandomizer':
+        """Cópia com o mesmo estado, sorteando de outro rng"""
+        randomizer = type(self)(self.shapes, rng)
+        randomizer.setstate(self.getstate())
+        return randomizer
+
+
+class UniformRandomizer(PieceRandomizer):
+    """Cada forma sorteada de forma independente (o sorteio original)"""
+
+    def next(self):
+        return self.rng.choice(self.shapes)
+
+    def take(self, count: int) -> list:
+        choice = self.rng.choice
+        shapes = self.shapes
+        return [choice(shapes) for _ in range(count)]
+
+
+class BagRandomizer(PieceRandomizer):
+    """Saco embaralhado com uma forma de cada (o 7-bag no conjunto clássico)"""
+
+    def __init__(self, shapes: Sequence, rng):
+        super().__init__(shapes, rng)
+        self._bag: list = []
+
+    def next(self):
+        bag = self._bag
+        if not bag:
+            bag.extend(self.shapes)
+            self.rng.shuffle(bag)
+        return bag.pop()
+
+    def take(self, count: int) -> list:
+        shapes = []
+        bag = self._bag
+        while len(shapes) < count:
+            if not bag:
+                bag.extend(self.shapes)
+                self.rng.shuffle(bag)
+            needed = min(count - len(shapes), len(bag))
+            shapes.extend(reversed(bag[-needed:]))
+            del bag[-needed:]
+        return shapes
+
+    def getstate(self) -> tuple:
+        return tuple(self._bag)
+
+    def setstate(self, state: tuple):
+        self._bag = list(state)
+
+
+class HistoryRandomizer(PieceRandomizer):
+    """Estilo TGM: ressorteia (até ROLLS vezes) formas entre as últimas HISTORY"""
+
+    HISTORY = 4
+    ROLLS = 4
+
+    def __init__(self, shapes: Sequence, rng):
+        super().__init__(shapes, rng)
+        self._history = deque(maxlen=self.HISTORY)
+
+    def next(self):
+        choice = self.rng.choice
+        shapes = self.shapes
+        history = self._history
+        shape = choice(shapes)
+        for _ in range(self.ROLLS - 1):
+            if shape not in history:
+                break
+            shape = choice(shapes)
+        history.append(shape)
+        return shape
+
+    def getstate(self) -> tuple:
+        return tuple(self._history)
+
+    def setstate(self, state: tuple):
+        self._history = deque(state, maxlen=self.HISTORY)
+
+
+RANDOMIZERS: Dict[str, type] = {
+    'uniform': UniformRandomizer,
+    'bag': BagRandomizer,
+    'history': HistoryRandomizer,
+}
+
+
+def get_randomizer(name: str, shapes: Sequence, rng) -> PieceRandomizer:
+    """Randomizador pelo nome (ver RANDOMIZERS)"""
+    if name not in RANDOMIZERS:
+        raise ValueError(f"randomizador desconhecido: {name}")
+    return RANDOMIZERS[name](shapes, rng)
+
+
 class TetrominoFactory:
-    
-    
-    def __init__(self):
+
+    # Tabelas de cada conjunto de peças, compartilhadas entre as fábricas
+    _shared_tables: Dict[str, tuple] = {}
+
+    def __init__(self, rng: Optional[random.Random] = None, seed: Optional[int] = None,
+                 piece_set: Optional[str] = None, randomizer: Optional[str] = None,
+                 queue_size: Optional[int] = None):
+        # Com seed cada jogo tem seu próprio rng; sem nada usa o random global
+        self.seed = seed
+        if rng is None and seed is not None:
+            rng = random.Random(seed)
+        self.rng = rng if rng is not None else random
+        self.draw_count = 0
         self.color_system = GameConfiguration.ColorSystem()
-        self.definitions = self._create_definitions()
-        
+        palette = self.color_system.get_color_palette()
+        self._code_colors = {
+            code: palette[name]
+            for code, name in self.color_system.get_color_code_mapping().items()
+        }
+        self._fallback_color = palette['GRAY']
+        # Definições e visões não mudam: as fábricas do mesmo conjunto usam as mesmas
+        self.piece_set = piece_set or GameConfiguration.GameParameters.PIECE_SET
+        tables = TetrominoFactory._shared_tables.get(self.piece_set)
+        if tables is None:
+            self.definitions = self._create_definitions()
+            self.color_codes = self._create_color_codes()
+            tables = (self.definitions, self.color_codes, self._create_rotation_views(),
+                      tuple(self.definitions))
+            TetrominoFactory._shared_tables[self.piece_set] = tables
+        self.definitions, self.color_codes, self.rotation_views, self._shape_types = tables
+
+        # Fila de preview: buffer circular de tamanho fixo, completado a cada saída
+        params = GameConfiguration.GameParameters
+        self.randomizer_name = randomizer or params.RANDOMIZER
+        self.randomizer = get_randomizer(self.randomizer_name, self._shape_types, self.rng)
+        self.queue: deque = deque(maxlen=queue_size or params.PREVIEW_BUFFER_SIZE)
+
+    def _create_color_codes(self) -> Dict[Any, str]:
+        codes = {
+            name: code
+            for code, name in self.color_system.get_color_code_mapping().items()
+        }
+        return {
+            shape_type: codes[definition.color_name]
+            for shape_type, definition in self.definitions.items()
+        }
+
+    @property
+    def max_shape_size(self) -> Tuple[int, int]:
+        """(largura, altura) máximas das peças do conjunto na rotação inicial"""
+        matrices = [definition.shape_matrix for definition in self.definitions.values()]
+        return (max(len(matrix[0]) for matrix in matrices),
+                max(len(matrix) for matrix in matrices))
+
+    def _create_rotation_views(self) -> Dict[TetrominoType, Tuple[TetrominoRotationView, ...]]:
+        """Pré-calcula as visões (forma, rotação) usadas no hot path"""
+        views = {}
+        for shape_type, definition in self.definitions.items():
+            views[shape_type] = tuple(
+                TetrominoRotationView(
+                    shape_type=shape_type,
+                    rotation_index=index,
+                    shape_matrix=tuple(tuple(row) for row in matrix),
+                    color_name=definition.color_name,
+                    color_code=self.color_codes[shape_type],
+                    mask=definition.rotation_masks[index],
+                    block_count=len(definition.rotation_masks[index].cells)
+                )
+                for index, matrix in enumerate(definition.rotation_states)
+            )
+        return views
+
     def _create_definitions(self) -> Dict[TetrominoType, TetrominoDefinition]:
-        
-        colors = self.color_system.get_color_palette()
-        
+        """Definições (com as quatro rotações) das peças do conjunto"""
         return {
-            TetrominoType.O: TetrominoDefinition(
-                shape_type=TetrominoType.O,
-                shape_matrix=[[1, 1], [1, 1]],
-                color_name='YELLOW'
-            ),
-            TetrominoType.I: TetrominoDefinition(
-                shape_type=TetrominoType.I,
-                shape_matrix=[[1, 1, 1, 1]],
-                color_name='LIGHT_BLUE'
-            ),
-            TetrominoType.T: TetrominoDefinition(
-                shape_type=TetrominoType.T,
-                shape_matrix=[[0, 1, 0], [1, 1, 1]],
-                color_name='PURPLE'
-            ),
-            TetrominoType.L: TetrominoDefinition(
-                shape_type=TetrominoType.L,
-                shape_matrix=[[1, 0, 0], [1, 1, 1]],
-                color_name='ORANGE'
-            ),
-            TetrominoType.J: TetrominoDefinition(
-                shape_type=TetrominoType.J,
-                shape_matrix=[[0, 0, 1], [1, 1, 1]],
-                color_name='BLUE'
-            ),
-            TetrominoType.S: TetrominoDefinition(
-                shape_type=TetrominoType.S,
-                shape_matrix=[[0, 1, 1], [1, 1, 0]],
-                color_name='GREEN'
-            ),
-            TetrominoType.Z: TetrominoDefinition(
-                shape_type=TetrominoType.Z,
-                shape_matrix=[[1, 1, 0], [0, 1, 1]],
-                color_name='RED'
+            shape_type: TetrominoDefinition(
+                shape_type=shape_type,
+                shape_matrix=matrix,
+                color_name=color_name
             )
+            for shape_type, (matrix, color_name) in get_piece_set(self.piece_set).items()
         }
     
     def create_random(self) -> TetrominoType:
-        """Cria forma aleatória"""
-        return random.choice(list(self.definitions.keys()))
+        """Cria forma aleatória (direto do randomizador, fora da fila)"""
+        self.draw_count += 1
+        return self.randomizer.next()
+
+    def reset_queue(self):
+        """Esvazia a fila e sorteia formas até enchê-la"""
+        queue = self.queue
+        queue.clear()
+        self.draw_count += queue.maxlen
+        queue.extend(self.randomizer.take(queue.maxlen))
+
+    def next_shape(self) -> TetrominoType:
+        """Tira a próxima forma da fila e sorteia a que entra no fim"""
+        queue = self.queue
+        if not queue:
+            self.reset_queue()
+        shape = queue.popleft()
+        self.draw_count += 1
+        queue.append(self.randomizer.next())
+        return shape
+
+    def peek(self, count: int) -> Tuple[TetrominoType, ...]:
+        """As próximas count formas sem tirá-las da fila nem mexer no rng"""
+        queue = self.queue
+        if count <= len(queue):
+            return tuple(islice(queue, count))
+        return tuple(islice(self.iter_ahead(), count))
+
+    def iter_ahead(self) -> Iterator[TetrominoType]:
+        """Sequência sem fim das próximas formas: a fila e depois um clone do randomizador"""
+        yield from tuple(self.queue)
+        rng = random.Random()
+        rng.setstate(self.rng.getstate())
+        next_shape = self.randomizer.clone(rng).next
+        while True:
+            yield next_shape()
     
     def get_definition(self, shape_type: TetrominoType) -> TetrominoDefinition:
         
         return self.definitions[shape_type]
+
+    def get_rotation_views(self, shape_type: TetrominoType) -> Tuple[TetrominoRotationView, ...]:
+        """As quatro visões de rotação em cache de uma forma"""
+        return self.rotation_views[shape_type]
     
     def get_color_by_code(self, color_code: str) -> Tuple[int, int, int]:
-        
-        color_name = self.color_system.get_color_code_mapping().get(color_code, 'GRAY')
-        return self.color_system.get_color_palette()[color_name]
+
+        return self._code_colors.get(color_code, self._fallback_color)
+
+class BoardFeatures(NamedTuple):
+    """Atributos da superfície da grade usados pelas heurísticas"""
+    column_heights: Tuple[int, ...]
+    column_holes: Tuple[int, ...]
+    well_depths: Tuple[int, ...]
+    holes: int
+    aggregate_height: int
+    bumpiness: int
+
 
 #  GRADE do Jogo
 class GameGrid:
@@ -223,7 +939,10 @@ class GameGrid:
         self.width = width
         self.height = height
         self.cells: List[List[str]] = self._create_empty_grid()
-        
+        # Incrementa a cada mudança nas células fixas (cache do renderer)
+        self.revision = 0
+        self._reset_features()
+
     def _create_empty_grid(self) -> List[List[str]]:
         #grade vazia
         return [['' for _ in range(self.width)] for _ in range(self.height)]
@@ -231,31 +950,37 @@ class GameGrid:
     def clear(self):
         """Limpa toda a grade"""
         self.cells = self._create_empty_grid()
+        self.revision += 1
+        self._reset_features()
     
     def place_tetromino(self, tetromino: 'ActiveTetromino') -> bool:
         """Coloca um tetrominó na grade"""
-        shape_def = tetromino.get_current_shape()
+        mask = tetromino.get_collision_mask()
         color_code = tetromino.color_code
-        
-        for y, row in enumerate(shape_def.shape_matrix):
-            for x, cell in enumerate(row):
-                if cell:
-                    grid_x = tetromino.position[0] + x
-                    grid_y = tetromino.position[1] + y
-                    
-                    if (0 <= grid_x < self.width and 
-                        0 <= grid_y < self.height and 
-                        self.cells[grid_y][grid_x] == ''):
-                        self.cells[grid_y][grid_x] = color_code
-                    else:
-                        return False
+        pos_x, pos_y = tetromino.position
+        self.revision += 1
+
+        for x, y in mask.cells:
+            grid_x = pos_x + x
+            grid_y = pos_y + y
+
+            if (0 <= grid_x < self.width and
+                0 <= grid_y < self.height and
+                self.cells[grid_y][grid_x] == ''):
+                self.cells[grid_y][grid_x] = color_code
+            else:
+                # Peça colocada pela metade: recalcula tudo
+                self._recompute_features()
+                return False
+        self._add_piece_features(mask, pos_x, pos_y)
         return True
-    
-    def check_line_completions(self) -> List[int]:
-        """Verifica linhas completas"""
+
+    def check_line_completions(self, top: int = 0, bottom: Optional[int] = None) -> List[int]:
+        """Verifica linhas completas entre top e bottom (padrão: a grade toda)"""
         completed_rows = []
+        bottom = self.height - 1 if bottom is None else min(bottom, self.height - 1)
         
-        for y in range(self.height):
+        for y in range(max(top, 0), bottom + 1):
             if all(cell != '' for cell in self.cells[y]):
                 completed_rows.append(y)
                 
@@ -263,67 +988,448 @@ class GameGrid:
     
     def remove_lines(self, rows: List[int]):
         """tira linhas inteiras"""
+        if not rows:
+            return
         rows.sort()
+        self.revision += 1
         
         for row in rows:
             # tira a linha 
             del self.cells[row]
             # Adiciona nova linha 
             self.cells.insert(0, ['' for _ in range(self.width)])
+        self._shift_features(rows)
     
-    def is_collision(self, tetromino: 'ActiveTetromino', 
+    def is_collision(self, tetromino: 'ActiveTetromino',
                     offset_x: int = 0, offset_y: int = 0) -> bool:
         """Verifica colisão com ma grade"""
-        shape_def = tetromino.get_current_shape()
-        
-        for y, row in enumerate(shape_def.shape_matrix):
+        mask = tetromino.get_collision_mask()
+        pos_x = tetromino.position[0] + offset_x
+        pos_y = tetromino.position[1] + offset_y
+
+        if (pos_x + mask.min_x < 0 or pos_x + mask.max_x >= self.width or
+                pos_y + mask.max_y >= self.height):
+            return True
+
+        for x, y in mask.cells:
+            grid_y = pos_y + y
+            if grid_y >= 0 and self.cells[grid_y][pos_x + x] != '':
+                return True
+
+        return False
+
+    def get_cell(self, x: int, y: int) -> str:
+        """Código de cor da célula ('' se vazia)"""
+        return self.cells[y][x]
+
+    def add_garbage_rows(self, count: int, hole_x: int) -> bool:
+        """Empurra a grade para cima e põe linhas de lixo com um buraco em hole_x.
+
+        Retorna False se algum bloco saiu pelo topo.
+        """
+        count = min(count, self.height)
+        overflow = any(cell for row in self.cells[:count] for cell in row)
+        del self.cells[:count]
+        for _ in range(count):
+            self.cells.append(['' if x == hole_x else 'x' for x in range(self.width)])
+        self.revision += 1
+        self._recompute_features()
+        return not overflow
+
+    def snapshot_state(self):
+        """Estado imutável das células fixas"""
+        return tuple(tuple(row) for row in self.cells)
+
+    def restore_state(self, state):
+        self.cells = [list(row) for row in state]
+        self.revision += 1
+        self._recompute_features()
+
+    def _column_height(self, x: int, start: int = 0) -> int:
+        """Altura de uma coluna procurando a célula mais alta a partir de start"""
+        for y in range(start, self.height):
+            if self.get_cell(x, y):
+                return self.height - y
+        return 0
+
+    # Atributos da superfície, mantidos a cada fixação e limpeza de linhas.
+    # _heights e _filled_counts guardam os valores somados a _height_base:
+    # limpar linhas desce todas as colunas por igual, o que vira só um
+    # incremento da base em vez de uma passada pela largura toda.
+    def _reset_features(self):
+        self._heights = [0] * self.width
+        self._filled_counts = [0] * self.width
+        self._height_base = 0
+        self._max_height = 0
+        self._aggregate_height = 0
+        self._filled = 0
+        self._bumpiness = 0
+
+    def _recompute_features(self):
+        """Recalcula tudo do zero (restore e casos raros)"""
+        self._reset_features()
+        heights = self._heights
+        counts = self._filled_counts
+        for y, row_mask in enumerate(self.occupancy_rows()):
+            x = 0
+            while row_mask:
+                if row_mask & 1:
+                    counts[x] += 1
+                    if not heights[x]:
+                        heights[x] = self.height - y
+                row_mask >>= 1
+                x += 1
+        self._max_height = max(heights)
+        self._aggregate_height = sum(heights)
+        self._filled = sum(counts)
+        self._bumpiness = sum(
+            abs(heights[x] - heights[x + 1]) for x in range(self.width - 1)
+        )
+
+    def _set_column_height(self, x: int, height: int):
+        if height > self._max_height:
+            self._max_height = height
+        heights = self._heights
+        height += self._height_base
+        old = heights[x]
+        if x > 0:
+            self._bumpiness += abs(height - heights[x - 1]) - abs(old - heights[x - 1])
+        if x < self.width - 1:
+            self._bumpiness += abs(height - heights[x + 1]) - abs(old - heights[x + 1])
+        self._aggregate_height += height - old
+        heights[x] = height
+
+    def _add_piece_features(self, mask: RotationMask, pos_x: int, pos_y: int):
+        """Atualiza só as colunas tocadas pela peça"""
+        counts = self._filled_counts
+        for x, top_dy, _, count in mask.column_profile:
+            column = pos_x + x
+            counts[column] += count
+            self._filled += count
+            height = self.height - (pos_y + top_dy)
+            if height > self._heights[column] - self._height_base:
+                self._set_column_height(column, height)
+
+    def _shift_features(self, rows: List[int]):
+        """Linhas completas removidas: cada coluna perde len(rows) células.
+
+        Como as linhas estavam cheias, toda coluna tem topo na linha removida
+        mais alta ou acima dela. A altura cai len(rows) (só a base muda),
+        exceto nas colunas com topo justamente nessa linha (pode haver
+        buracos logo abaixo), que são relidas.
+        """
+        lines = len(rows)
+        first = min(rows)
+        old_top = self.height - self._max_height
+        self._height_base += lines
+        self._filled -= lines * self.width
+        self._aggregate_height -= lines * self.width
+        self._max_height -= lines
+        if old_top == first:
+            # Nada acima das linhas removidas: todas as colunas são relidas
+            topped = range(self.width)
+            self._max_height = 0
+        else:
+            topped = self._columns_topped_at(first, old_top, lines)
+        # Acima do topo antigo a coluna continua vazia
+        for x in topped:
+            self._set_column_height(x, self._column_height(x, first + lines))
+
+    def _columns_topped_at(self, first: int, old_top: int, lines: int):
+        """Colunas cujo topo era a linha first (já com as linhas removidas)"""
+        height = self.height - first + self._height_base
+        return [x for x, value in enumerate(self._heights) if value + lines == height]
+
+    @property
+    def column_heights(self) -> Tuple[int, ...]:
+        base = self._height_base
+        if not base:
+            return tuple(self._heights)
+        return tuple(height - base for height in self._heights)
+
+    @property
+    def column_holes(self) -> Tuple[int, ...]:
+        """Células vazias abaixo do topo de cada coluna"""
+        return tuple(
+            height - count for height, count in zip(self._heights, self._filled_counts)
+        )
+
+    @property
+    def holes(self) -> int:
+        return self._aggregate_height - self._filled
+
+    @property
+    def aggregate_height(self) -> int:
+        return self._aggregate_height
+
+    @property
+    def bumpiness(self) -> int:
+        return self._bumpiness
+
+    @property
+    def well_depths(self) -> Tuple[int, ...]:
+        """Profundidade de poço de cada coluna (as paredes contam como cheias)"""
+        heights = self.column_heights
+        last = self.width - 1
+        return tuple(
+            max(0, min(heights[x - 1] if x > 0 else self.height,
+                       heights[x + 1] if x < last else self.height) - heights[x])
+            for x in range(self.width)
+        )
+
+    def features(self) -> BoardFeatures:
+        return BoardFeatures(
+            self.column_heights, self.column_holes, self.well_depths,
+            self.holes, self._aggregate_height, self._bumpiness,
+        )
+
+    def landing_row(self, tetromino: 'ActiveTetromino') -> int:
+        """Linha onde o hard drop para, pelas alturas das colunas.
+
+        Vale max(altura da coluna - perfil de baixo da peça) convertido para
+        linhas da grade; com um beiral acima da peça cai para a busca linha
+        a linha.
+        """
+        mask = tetromino.get_collision_mask()
+        pos_x, pos_y = tetromino.position
+        heights = self._heights
+        landing = self.height - 1 + self._height_base - max(
+            heights[pos_x + x] + bottom_dy for x, _, bottom_dy, _ in mask.column_profile
+        )
+        if landing >= pos_y:
+            return landing
+
+        landing = pos_y
+        while not self.is_collision(tetromino, 0, landing + 1 - pos_y):
+            landing += 1
+        return landing
+
+    def drop_distance(self, tetromino: 'ActiveTetromino') -> int:
+        """Quantas linhas a peça cai até parar"""
+        return self.landing_row(tetromino) - tetromino.position[1]
+
+    def occupancy_rows(self) -> Tuple[int, ...]:
+        """Ocupação de cada linha como bitmask (bit x = célula (x, y) ocupada)"""
+        return tuple(
+            sum(1 << x for x, cell in enumerate(row) if cell) for row in self.cells
+        )
+
+    def iter_filled_cells(self):
+        """Itera (x, y, código de cor) das células ocupadas"""
+        for y, row in enumerate(self.cells):
             for x, cell in enumerate(row):
                 if cell:
-                    grid_x = tetromino.position[0] + x + offset_x
-                    grid_y = tetromino.position[1] + y + offset_y
-                    
-                    
-                    if grid_x < 0 or grid_x >= self.width or grid_y >= self.height:
-                        return True
-                    
-                    if grid_y >= 0 and self.cells[grid_y][grid_x] != '':
-                        return True
-                        
+                    yield x, y, cell
+
+
+class BitboardGameGrid(GameGrid):
+    """Grade com cada linha guardada como bitmask inteiro.
+
+    O bit x de rows[y] indica se a célula (x, y) está ocupada. As cores ficam
+    em colors[y], um inteiro com um byte por célula (ord do código de cor,
+    0 = vazia), paralelo a rows.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.full_row_mask = (1 << width) - 1
+        self.rows: List[int] = [0] * height
+        self.colors: List[int] = [0] * height
+        self.revision = 0
+        self._snapshot = None
+        self._snapshot_revision = -1
+        self._reset_features()
+
+    def clear(self):
+        """Limpa toda a grade"""
+        self.rows = [0] * self.height
+        self.colors = [0] * self.height
+        self.revision += 1
+        self._reset_features()
+
+    @property
+    def cells(self) -> List[List[str]]:
+        """Visão em lista de listas (compatibilidade, não usar no hot path)"""
+        return [
+            [self.get_cell(x, y) for x in range(self.width)]
+            for y in range(self.height)
+        ]
+
+    def get_cell(self, x: int, y: int) -> str:
+        code = (self.colors[y] >> (x << 3)) & 0xFF
+        return chr(code) if code else ''
+
+    def snapshot_state(self):
+        """Tuplas de linhas empacotadas; os ints das linhas que não mudaram
+        são os mesmos objetos em snapshots consecutivos"""
+        if self._snapshot_revision != self.revision:
+            self._snapshot = (tuple(self.rows), tuple(self.colors))
+            self._snapshot_revision = self.revision
+        return self._snapshot
+
+    def restore_state(self, state):
+        rows, colors = state
+        self.rows = list(rows)
+        self.colors = list(colors)
+        self.revision += 1
+        self._snapshot = state
+        self._snapshot_revision = self.revision
+        self._recompute_features()
+
+    def _column_height(self, x: int, start: int = 0) -> int:
+        bit = 1 << x
+        rows = self.rows
+        for y in range(start, self.height):
+            if rows[y] & bit:
+                return self.height - y
+        return 0
+
+    def _columns_topped_at(self, first: int, old_top: int, lines: int):
+        # Colunas vazias entre o topo antigo e first, que agora desceram lines
+        covered = 0
+        rows = self.rows
+        for y in range(old_top + lines, first + lines):
+            covered |= rows[y]
+        free = self.full_row_mask & ~covered
+        topped = []
+        while free:
+            low = free & -free
+            topped.append(low.bit_length() - 1)
+            free ^= low
+        return topped
+
+    def occupancy_rows(self) -> Tuple[int, ...]:
+        return self.snapshot_state()[0]
+
+    def iter_filled_cells(self):
+        for y, row_mask in enumerate(self.rows):
+            if not row_mask:
+                continue
+            colors = self.colors[y]
+            x = 0
+            while row_mask:
+                if row_mask & 1:
+                    yield x, y, chr((colors >> (x << 3)) & 0xFF)
+                row_mask >>= 1
+                x += 1
+
+    def place_tetromino(self, tetromino: 'ActiveTetromino') -> bool:
+        """Coloca um tetrominó na grade"""
+        mask = tetromino.get_collision_mask()
+        pos_x, pos_y = tetromino.position
+
+        if pos_y + mask.min_y < 0 or self.is_collision(tetromino):
+            return False
+
+        self.revision += 1
+        color_value = ord(tetromino.color_code)
+        rows = self.rows
+        colors = self.colors
+        shift = pos_x + mask.min_x
+        # Células vazias têm byte 0, então somar color_value * bytes pinta a linha
+        for dy, row_mask, cell_bytes in mask.painted_rows.get(shift) or mask.painted(shift):
+            grid_y = pos_y + dy
+            rows[grid_y] |= row_mask
+            colors[grid_y] |= color_value * cell_bytes
+        self._add_piece_features(mask, pos_x, pos_y)
+        return True
+
+    def check_line_completions(self, top: int = 0, bottom: Optional[int] = None) -> List[int]:
+        """Verifica linhas completas entre top e bottom (padrão: a grade toda)"""
+        full = self.full_row_mask
+        rows = self.rows
+        bottom = self.height - 1 if bottom is None else min(bottom, self.height - 1)
+        return [y for y in range(max(top, 0), bottom + 1) if rows[y] == full]
+
+    def remove_lines(self, rows: List[int]):
+        """Remove as linhas numa única passada de compactação.
+
+        Só o trecho entre o topo da pilha e a linha removida mais baixa se
+        move; acima do topo as linhas são todas vazias e ficam como estão.
+        """
+        if not rows:
+            return
+        self.revision += 1
+        removed = set(rows)
+        top = min(self.height - self._max_height, min(rows))
+        bottom = max(rows)
+        kept = [y for y in range(top, bottom + 1) if y not in removed]
+        padding = [0] * len(removed)
+        self.rows[top:bottom + 1] = padding + [self.rows[y] for y in kept]
+        self.colors[top:bottom + 1] = padding + [self.colors[y] for y in kept]
+        self._shift_features(rows)
+
+    def add_garbage_rows(self, count: int, hole_x: int) -> bool:
+        count = min(count, self.height)
+        overflow = any(self.rows[:count])
+        row_mask = self.full_row_mask & ~(1 << hole_x)
+        row_colors = sum(ord('x') << (x << 3) for x in range(self.width) if x != hole_x)
+        self.rows = self.rows[count:] + [row_mask] * count
+        self.colors = self.colors[count:] + [row_colors] * count
+        self.revision += 1
+        self._recompute_features()
+        return not overflow
+
+    def is_collision(self, tetromino: 'ActiveTetromino',
+                    offset_x: int = 0, offset_y: int = 0) -> bool:
+        """Verifica colisão com a grade (um AND por linha ocupada da peça)"""
+        mask = tetromino._views[tetromino.rotation_index].mask
+        pos_x, pos_y = tetromino.position
+        pos_x += offset_x
+        pos_y += offset_y
+        shift = pos_x + mask.min_x
+
+        if shift < 0 or pos_x + mask.max_x >= self.width or pos_y + mask.max_y >= self.height:
+            return True
+
+        rows = self.rows
+        shifted = mask.shifted_rows.get(shift) or mask.shifted(shift)
+        if pos_y + mask.min_y >= 0:
+            for dy, row_mask in shifted:
+                if rows[pos_y + dy] & row_mask:
+                    return True
+            return False
+        for dy, row_mask in shifted:
+            grid_y = pos_y + dy
+            if grid_y >= 0 and rows[grid_y] & row_mask:
+                return True
         return False
 
 
+GRID_BACKENDS = {
+    'list': GameGrid,
+    'bitboard': BitboardGameGrid,
+}
+
+
 class ActiveTetromino:
     """Representa um tetrominó ativo no jogo"""
-    
-    def __init__(self, shape_type: TetrominoType, factory: TetrominoFactory):
+
+    __slots__ = ('shape_type', 'factory', 'definition', 'rotation_index',
+                 'position', 'color_code', '_views')
+
+    def __init__(self, shape_type: TetrominoType, factory: TetrominoFactory,
+                 spawn: Tuple[int, int] = (4, 0)):
         self.shape_type = shape_type
         self.factory = factory
         self.definition = factory.get_definition(shape_type)
         self.rotation_index = 0
-        self.position = [4, 0]  
+        self.position = list(spawn)
+        self._views = factory.get_rotation_views(shape_type)
         self.color_code = self._get_color_code()
-        
+
     def _get_color_code(self) -> str:
         """Obtém o código de cor do tetrominó"""
-        color_mapping = {
-            TetrominoType.O: 'y',
-            TetrominoType.I: 'l',
-            TetrominoType.T: 'p',
-            TetrominoType.L: 'o',
-            TetrominoType.J: 'b',
-            TetrominoType.S: 'g',
-            TetrominoType.Z: 'r'
-        }
-        return color_mapping[self.shape_type]
-    
-    def get_current_shape(self) -> TetrominoDefinition:
-        
-        rotated_matrix = self.definition.rotation_states[self.rotation_index]
-        return TetrominoDefinition(
-            shape_type=self.shape_type,
-            shape_matrix=rotated_matrix,
-            color_name=self.definition.color_name
-        )
+        return self._views[0].color_code
+
+    def get_collision_mask(self) -> RotationMask:
+        """Máscaras pré-calculadas da rotação atual"""
+        return self._views[self.rotation_index].mask
+
+    def get_current_shape(self) -> TetrominoRotationView:
+        """Visão em cache da rotação atual (não aloca)"""
+        return self._views[self.rotation_index]
     
     def rotate(self, direction: int, grid: GameGrid) -> bool:
         
@@ -349,8 +1455,7 @@ class ActiveTetromino:
     
     def hard_drop(self, grid: GameGrid):
         #bloco cai instataneamente
-        while self.move(0, 1, grid):
-            pass
+        self.position[1] += grid.drop_distance(self)
 
 #pontos
 class ScoreManager:
@@ -360,83 +1465,2479 @@ class ScoreManager:
         self.level = 1
         self.lines_cleared = 0
         self.combo = 0
+        self.max_combo = 0
         self.multiplier = 1.0
         
     def add_shape_score(self, tetromino: ActiveTetromino):
-        shape_def = tetromino.get_current_shape()
-        block_count = sum(sum(row) for row in shape_def.shape_matrix)
+        block_count = tetromino.get_current_shape().block_count
         self.score += int(block_count * 10 * self.multiplier)
         
-    def add_line_clear_score(self, lines_count: int):
+    @staticmethod
+    def line_clear_points(lines_count: int, combo: int, multiplier: float) -> int:
+        """Pontos de uma limpeza de linhas (usado também pela IA)"""
         line_scores = {1: 100, 2: 300, 3: 500, 4: 800}
         base_score = line_scores.get(lines_count, 0)
-        
+
         # Bônus de combo
-        combo_bonus = self.combo * 50
-        
-        self.score += int((base_score + combo_bonus) * self.multiplier)
+        combo_bonus = combo * 50
+
+        return int((base_score + combo_bonus) * multiplier)
+
+    def add_line_clear_score(self, lines_count: int):
+        self.score += self.line_clear_points(lines_count, self.combo, self.multiplier)
         self.lines_cleared += lines_count
         
         # Atualizar combo
         if lines_count > 0:
             self.combo += 1
+            self.max_combo = max(self.max_combo, self.combo)
+        else:
+            self.combo = 0
+            
+        # Atualizar nível
+        self.level = self.lines_cleared // 10 + 1
+        
+        # Atualizar multiplicador baseado no nível
+        self.multiplier = 1.0 + (self.level - 1) * 0.1
+        
+    def reset(self):
+        '''zerar pontuação'''
+        self.__init__()
+
+class GameAction(Enum):
+    """Ações aceitas pela simulação (mesmos nomes do InputHandler)"""
+    LEFT = 'left'
+    RIGHT = 'right'
+    DOWN = 'down'
+    ROTATE_CW = 'rotate_cw'
+    ROTATE_CCW = 'rotate_ccw'
+    HARD_DROP = 'hard_drop'
+    PAUSE = 'pause'
+    RESTART = 'restart'
+    # Só no front end (sair do jogo); não passa pela simulação
+    QUIT = 'quit'
+
+
+# Um bit por ação no campo de entrada de cada tick (usado pelos replays)
+INPUT_BITS = {
+    GameAction.LEFT: 1 << 0,
+    GameAction.RIGHT: 1 << 1,
+    GameAction.DOWN: 1 << 2,
+    GameAction.ROTATE_CW: 1 << 3,
+    GameAction.ROTATE_CCW: 1 << 4,
+    GameAction.HARD_DROP: 1 << 5,
+    GameAction.PAUSE: 1 << 6,
+    GameAction.RESTART: 1 << 7,
+}
+
+
+class GameSnapshot(NamedTuple):
+    """Estado imutável de uma GameSimulation (ver GameSimulation.snapshot)"""
+    grid: tuple
+    piece: Optional[Tuple[TetrominoType, int, int, int]]
+    preview: Tuple[TetrominoType, ...]
+    score: Tuple[int, int, int, int, int, float]
+    game_over: bool
+    paused: bool
+    fall_timer: int
+    fall_speed: int
+    tick_count: int
+    # tick em que a peça atual nasceu (tempo até fixar em SHAPE_LOCKED)
+    piece_spawn_tick: int
+    draw_count: int
+    # (sorteios na âncora, estado empacotado do rng, estado do randomizador)
+    # compartilhado entre snapshots
+    rng_anchor: Tuple[int, tuple, tuple]
+
+
+def _pack_rng_state(state: tuple) -> tuple:
+    """Estado do random.Random com os 625 ints do Mersenne Twister em bytes"""
+    version, internal, gauss = state
+    return version, array('I', internal).tobytes(), gauss
+
+
+def _unpack_rng_state(packed: tuple) -> tuple:
+    version, internal, gauss = packed
+    return version, tuple(array('I', internal)), gauss
+
+
+def fall_speed_for_level(level: int, tick_rate: int) -> int:
+    """Ticks por linha de queda no nível, convertidos para a taxa de ticks"""
+    params = GameConfiguration.GameParameters
+    base_ticks = max(10, params.FALL_TIME_BASE - (level - 1) * 5)
+    return max(1, round(base_ticks * tick_rate / params.BASE_TICK_RATE))
+
+
+class BoardConfig(NamedTuple):
+    """Tamanho da grade, spawn, conjunto de peças e randomizador de uma partida"""
+    width: int = 10
+    height: int = 20
+    # None: centro da grade (width // 2 - 1, que dá 4 na grade de 10)
+    spawn_x: Optional[int] = None
+    spawn_y: int = 0
+    piece_set: str = 'classic'
+    randomizer: str = 'uniform'
+    # Formas sorteadas à frente na fila de preview; muda quantos sorteios um
+    # reinício descarta, então faz parte da sequência de peças
+    queue_size: int = 8
+
+    @classmethod
+    def from_parameters(cls) -> 'BoardConfig':
+        """Configuração atual de GameConfiguration.GameParameters"""
+        params = GameConfiguration.GameParameters
+        return cls(params.GRID_WIDTH, params.GRID_HEIGHT, params.SPAWN_X,
+                   params.SPAWN_Y, params.PIECE_SET, params.RANDOMIZER,
+                   params.PREVIEW_BUFFER_SIZE)
+
+    @classmethod
+    def parse_size(cls, text: str) -> Tuple[int, int]:
+        """'LARGURAxALTURA' -> (largura, altura)"""
+        width, _, height = text.lower().partition('x')
+        width, height = int(width), int(height)
+        if width < 4 or height < 4:
+            raise ValueError(f"grade pequena demais: {text}")
+        return width, height
+
+    @property
+    def spawn(self) -> Tuple[int, int]:
+        spawn_x = self.width // 2 - 1 if self.spawn_x is None else self.spawn_x
+        return spawn_x, self.spawn_y
+
+
+class GameSimulation:
+    """Núcleo do jogo em Python puro, sem pygame.
+
+    Guarda a grade, a pontuação, a fábrica de peças, a fila de preview e a
+    gravidade. Cada chamada a step() é um tick de lógica, então a simulação
+    pode rodar sem limite de FPS.
+    """
+
+    # Sorteios máximos entre âncoras de rng nos snapshots
+    RNG_ANCHOR_INTERVAL = 32
+
+    def __init__(self, event_dispatcher: Optional[EventDispatcher] = None,
+                 rng: Optional[random.Random] = None, seed: Optional[int] = None,
+                 tick_rate: Optional[int] = None, board: Optional[BoardConfig] = None):
+        params = GameConfiguration.GameParameters
+
+        self.tick_rate = tick_rate or params.TICK_RATE
+        self.board = board or BoardConfig.from_parameters()
+        self.spawn = self.board.spawn
+        self.event_dispatcher = event_dispatcher or EventDispatcher()
+        self.score_manager = ScoreManager()
+        self.tetromino_factory = TetrominoFactory(rng, seed, self.board.piece_set,
+                                                  self.board.randomizer,
+                                                  self.board.queue_size)
+
+        grid_class = GRID_BACKENDS[params.GRID_BACKEND]
+        self.grid = grid_class(self.board.width, self.board.height)
+
+        self.current_tetromino: Optional[ActiveTetromino] = None
+        self.game_over = False
+        self.paused = False
+        self.fall_timer = 0
+        self.fall_speed = self.fall_speed_for_level(1)
+        self.tick_count = 0
+        self.piece_spawn_tick = 0
+        self.lines_cleared_last_step = 0
+        # Caches dos snapshots (compartilhados enquanto não mudam)
+        self._preview_snapshot: Optional[Tuple[TetrominoType, ...]] = None
+        self._rng_anchor: Optional[Tuple[int, tuple, tuple]] = None
+        self._unpacked_rng: Tuple[Optional[tuple], Optional[tuple]] = (None, None)
+
+        self._setup_event_handlers()
+        self.reset()
+
+    def reset(self):
+        """Inicializa o estado do jogo"""
+        self.grid.clear()
+        self.score_manager.reset()
+
+        self.tetromino_factory.reset_queue()
+        self._preview_snapshot = None
+
+        self._get_next_tetromino()
+
+        self.game_over = False
+        self.paused = False
+        self.fall_timer = 0
+        self.fall_speed = self.fall_speed_for_level(1)
+        self.tick_count = 0
+        self.piece_spawn_tick = 0
+
+        # Eventos juntados da partida anterior saem antes do início da nova
+        self.event_dispatcher.end_tick()
+        self.event_dispatcher.emit(GameEventType.GAME_STARTED, 0)
+
+    def _setup_event_handlers(self):
+        # Prioridade alta: o estado já está atualizado quando os outros listeners rodam
+        self.event_dispatcher.add_listener(
+            GameEventType.LINE_CLEARED,
+            self._on_line_cleared,
+            EventDispatcher.PRIORITY_CORE
+        )
+
+        self.event_dispatcher.add_listener(
+            GameEventType.GAME_OVER,
+            self._on_game_over,
+            EventDispatcher.PRIORITY_CORE
+        )
+
+    @property
+    def preview_shapes(self) -> Tuple[TetrominoType, ...]:
+        """As formas mostradas no preview (PREVIEW_SHAPES_COUNT)"""
+        return self.tetromino_factory.peek(GameConfiguration.GameParameters.PREVIEW_SHAPES_COUNT)
+
+    def _on_line_cleared(self, event: GameEvent):
+
+        lines_count = event.data.get('lines', 0)
+        score = self.score_manager
+        old_level = score.level
+        score.add_line_clear_score(lines_count)
+
+        self.fall_speed = self.fall_speed_for_level(score.level)
+        if score.level != old_level:
+            self.event_dispatcher.emit(GameEventType.LEVEL_CHANGED, self.tick_count,
+                                       score.level)
+
+    def fall_speed_for_level(self, level: int) -> int:
+        """Ticks por linha de queda, convertidos para a taxa de ticks da simulação"""
+        return fall_speed_for_level(level, self.tick_rate)
+
+    def _on_game_over(self, event: GameEvent):
+        """Handler para game over"""
+        self.game_over = True
+
+    def _get_next_tetromino(self):
+        next_shape = self.tetromino_factory.next_shape()
+        self.current_tetromino = ActiveTetromino(next_shape, self.tetromino_factory,
+                                                 self.spawn)
+        self.piece_spawn_tick = self.tick_count
+        self._preview_snapshot = None
+
+        if self.grid.is_collision(self.current_tetromino):
+            self.event_dispatcher.emit(GameEventType.GAME_OVER, self.tick_count)
+
+    def _lock_current_tetromino(self):
+        #FIXA BLOCO
+        if self.current_tetromino:
+
+            self.score_manager.add_shape_score(self.current_tetromino)
+
+            success = self.grid.place_tetromino(self.current_tetromino)
+
+            if not success:
+                self.event_dispatcher.emit(GameEventType.GAME_OVER, self.tick_count)
+                return
+
+            dispatcher = self.event_dispatcher
+            dispatcher.emit(GameEventType.SHAPE_LOCKED, self.tick_count,
+                            self.current_tetromino.shape_type,
+                            self.tick_count - self.piece_spawn_tick)
+
+            # Só as linhas da peça podem ter completado
+            mask = self.current_tetromino.get_collision_mask()
+            pos_y = self.current_tetromino.position[1]
+            completed_rows = self.grid.check_line_completions(pos_y + mask.min_y,
+                                                              pos_y + mask.max_y)
+            if completed_rows:
+                self.grid.remove_lines(completed_rows)
+                self.lines_cleared_last_step += len(completed_rows)
+                dispatcher.emit(GameEventType.LINE_CLEARED, self.tick_count,
+                                len(completed_rows))
+
+            dispatcher.emit(GameEventType.SCORE_UPDATED, self.tick_count,
+                            self.score_manager.score, self.score_manager.level)
+
+            self._get_next_tetromino()
+
+    def apply_action(self, action: GameAction) -> bool:
+        """Aplica uma ação do jogador; retorna se ela teve efeito"""
+        if action is GameAction.RESTART:
+            self.reset()
+            return True
+
+        if action is GameAction.PAUSE:
+            self.paused = not self.paused
+            return True
+
+        if self.game_over or self.paused or not self.current_tetromino:
+            return False
+
+        tetromino = self.current_tetromino
+        if action is GameAction.ROTATE_CW or action is GameAction.ROTATE_CCW:
+            if not tetromino.rotate(1 if action is GameAction.ROTATE_CW else -1, self.grid):
+                return False
+            self.event_dispatcher.emit(GameEventType.SHAPE_ROTATED, self.tick_count,
+                                       tetromino.rotation_index)
+            return True
+        if action is GameAction.LEFT:
+            moved = tetromino.move(-1, 0, self.grid)
+        elif action is GameAction.RIGHT:
+            moved = tetromino.move(1, 0, self.grid)
+        elif action is GameAction.DOWN:
+            moved = tetromino.move(0, 1, self.grid)
+        else:
+            moved = None
+        if moved is not None:
+            if moved:
+                self.event_dispatcher.emit(GameEventType.SHAPE_MOVED, self.tick_count,
+                                           tetromino.position[0], tetromino.position[1])
+            return moved
+        if action is GameAction.HARD_DROP:
+            tetromino.hard_drop(self.grid)
+            self._lock_current_tetromino()
+            return True
+        return False
+
+    def apply_input_bits(self, bits: int):
+        """Aplica as ações de um tick de entrada, na ordem do front end"""
+        if not bits:
+            return
+
+        if bits & INPUT_BITS[GameAction.RESTART]:
+            self.reset()
+            return
+
+        if bits & INPUT_BITS[GameAction.PAUSE]:
+            self.apply_action(GameAction.PAUSE)
+
+        if self.game_over or self.paused or not self.current_tetromino:
+            return
+
+        # Movimento da peça
+        if bits & INPUT_BITS[GameAction.LEFT]:
+            self.apply_action(GameAction.LEFT)
+        elif bits & INPUT_BITS[GameAction.RIGHT]:
+            self.apply_action(GameAction.RIGHT)
+        elif bits & INPUT_BITS[GameAction.DOWN]:
+            self.apply_action(GameAction.DOWN)
+
+        # Rotação
+        if bits & INPUT_BITS[GameAction.ROTATE_CW]:
+            self.apply_action(GameAction.ROTATE_CW)
+        elif bits & INPUT_BITS[GameAction.ROTATE_CCW]:
+            self.apply_action(GameAction.ROTATE_CCW)
+
+        if bits & INPUT_BITS[GameAction.HARD_DROP]:
+            self.apply_action(GameAction.HARD_DROP)
+
+    def receive_garbage(self, lines: int, hole_x: int):
+        """Linhas de lixo do oponente; a peça atual sobe se ficar sobreposta"""
+        if self.game_over or lines <= 0:
+            return
+        topped_out = not self.grid.add_garbage_rows(lines, hole_x)
+        tetromino = self.current_tetromino
+        if tetromino:
+            top = tetromino.get_collision_mask().min_y
+            while self.grid.is_collision(tetromino) and tetromino.position[1] + top > 0:
+                tetromino.position[1] -= 1
+            topped_out = topped_out or self.grid.is_collision(tetromino)
+        if topped_out:
+            self.event_dispatcher.emit(GameEventType.GAME_OVER, self.tick_count)
+
+    def step_bits(self, bits: int) -> int:
+        """Um tick de replay: campo de entrada + gravidade"""
+        self.lines_cleared_last_step = 0
+        self.apply_input_bits(bits)
+        self.tick()
+        return self.lines_cleared_last_step
+
+    def snapshot(self) -> 'GameSnapshot':
+        """Snapshot imutável e compacto do estado (microssegundos).
+
+        Grade, fila e estado do rng são compartilhados com snapshots
+        anteriores enquanto não mudam. O rng é guardado como uma âncora
+        compartilhada mais o número de sorteios, já que o estado completo do
+        Mersenne Twister ocupa KBs.
+        """
+        tetromino = self.current_tetromino
+        piece = None
+        if tetromino:
+            piece = (tetromino.shape_type, tetromino.rotation_index,
+                     tetromino.position[0], tetromino.position[1])
+
+        factory = self.tetromino_factory
+        if self._preview_snapshot is None:
+            self._preview_snapshot = tuple(factory.queue)
+
+        anchor = self._rng_anchor
+        if anchor is None or not 0 <= factory.draw_count - anchor[0] <= self.RNG_ANCHOR_INTERVAL:
+            anchor = self._rng_anchor = (factory.draw_count,
+                                         _pack_rng_state(factory.rng.getstate()),
+                                         factory.randomizer.getstate())
+
+        score = self.score_manager
+        return GameSnapshot(
+            self.grid.snapshot_state(),
+            piece,
+            self._preview_snapshot,
+            (score.score, score.level, score.lines_cleared, score.combo,
+             score.max_combo, score.multiplier),
+            self.game_over, self.paused, self.fall_timer, self.fall_speed,
+            self.tick_count, self.piece_spawn_tick, factory.draw_count, anchor,
+        )
+
+    def restore(self, snapshot: 'GameSnapshot'):
+        """Volta para o estado de um snapshot"""
+        self.grid.restore_state(snapshot.grid)
+
+        self.current_tetromino = None
+        if snapshot.piece:
+            shape_type, rotation_index, x, y = snapshot.piece
+            tetromino = ActiveTetromino(shape_type, self.tetromino_factory)
+            tetromino.rotation_index = rotation_index
+            tetromino.position = [x, y]
+            self.current_tetromino = tetromino
+
+        factory = self.tetromino_factory
+        factory.queue.clear()
+        factory.queue.extend(snapshot.preview)
+        self._preview_snapshot = snapshot.preview
+
+        score = self.score_manager
+        (score.score, score.level, score.lines_cleared, score.combo,
+         score.max_combo, score.multiplier) = snapshot.score
+
+        self.game_over = snapshot.game_over
+        self.paused = snapshot.paused
+        self.fall_timer = snapshot.fall_timer
+        self.fall_speed = snapshot.fall_speed
+        self.tick_count = snapshot.tick_count
+        self.piece_spawn_tick = snapshot.piece_spawn_tick
+
+        # rng: volta para a âncora e refaz os sorteios feitos depois dela
+        if snapshot.rng_anchor is self._rng_anchor and factory.draw_count == snapshot.draw_count:
+            return
+        anchor_draws, packed_state, randomizer_state = snapshot.rng_anchor
+        if self._unpacked_rng[0] is not packed_state:
+            self._unpacked_rng = (packed_state, _unpack_rng_state(packed_state))
+        factory.rng.setstate(self._unpacked_rng[1])
+        factory.randomizer.setstate(randomizer_state)
+        factory.randomizer.take(snapshot.draw_count - anchor_draws)
+        factory.draw_count = snapshot.draw_count
+        self._rng_anchor = snapshot.rng_anchor
+
+    def tick(self):
+        """Avança um tick de gravidade e entrega os eventos juntados no tick"""
+        if not (self.game_over or self.paused or not self.current_tetromino):
+            self.tick_count += 1
+            self.fall_timer += 1
+            if self.fall_timer >= self.fall_speed:
+                tetromino = self.current_tetromino
+                if tetromino.move(0, 1, self.grid):
+                    self.event_dispatcher.emit(GameEventType.SHAPE_MOVED, self.tick_count,
+                                               tetromino.position[0], tetromino.position[1])
+                else:
+                    self._lock_current_tetromino()
+                self.fall_timer = 0
+
+        self.event_dispatcher.end_tick()
+
+    def step(self, action: Optional[GameAction] = None) -> int:
+        """Aplica uma ação e avança um tick; retorna as linhas limpas no passo"""
+        self.lines_cleared_last_step = 0
+        if action is not None:
+            self.apply_action(action)
+        self.tick()
+        return self.lines_cleared_last_step
+
+
+# Simulação em lote (numpy)
+BATCH_ACTION_CODES = {
+    None: 0,
+    GameAction.LEFT: 1,
+    GameAction.RIGHT: 2,
+    GameAction.DOWN: 3,
+    GameAction.ROTATE_CW: 4,
+    GameAction.ROTATE_CCW: 5,
+    GameAction.HARD_DROP: 6,
+}
+
+
+class BatchGameGrid:
+    """N grades num único array (N, altura, largura) de uint8.
+
+    Cada célula guarda o ord do código de cor (0 = vazia), como as cores do
+    BitboardGameGrid. As peças são passadas como arrays de tipo, rotação e
+    posição, e todas as operações valem para o lote inteiro de uma vez.
+    """
+
+    def __init__(self, count: int, width: int, height: int,
+                 factory: Optional[TetrominoFactory] = None):
+        try:
+            np.zeros
+        except ImportError:
+            raise RuntimeError("BatchGameGrid precisa do numpy instalado") from None
+
+        self.count = count
+        self.width = width
+        self.height = height
+        self.cells = np.zeros((count, height, width), dtype=np.uint8)
+
+        factory = factory or TetrominoFactory()
+        self.shape_types = list(factory.definitions.keys())
+        if len({view.block_count for shape in self.shape_types
+                for view in factory.get_rotation_views(shape)}) != 1:
+            raise ValueError("o lote precisa de peças com o mesmo número de blocos")
+        # Tabelas (tipo, rotação, célula) com os offsets das máscaras
+        self.cell_x = np.array([
+            [[x for x, _ in view.mask.cells] for view in factory.get_rotation_views(shape)]
+            for shape in self.shape_types
+        ], dtype=np.int64)
+        self.cell_y = np.array([
+            [[y for _, y in view.mask.cells] for view in factory.get_rotation_views(shape)]
+            for shape in self.shape_types
+        ], dtype=np.int64)
+        self.color_values = np.array([
+            ord(factory.color_codes[shape]) for shape in self.shape_types
+        ], dtype=np.uint8)
+        self.block_counts = np.array([
+            [view.block_count for view in factory.get_rotation_views(shape)]
+            for shape in self.shape_types
+        ], dtype=np.int64)
+
+    def clear(self, boards=None):
+        """Limpa todas as grades (ou só as indicadas)"""
+        if boards is None:
+            self.cells[:] = 0
+        else:
+            self.cells[boards] = 0
+
+    def _piece_cells(self, types, rotations, xs, ys):
+        return (xs[:, None] + self.cell_x[types, rotations],
+                ys[:, None] + self.cell_y[types, rotations])
+
+    def is_collision(self, boards, types, rotations, xs, ys):
+        """Colisão de uma peça por grade; retorna array booleano"""
+        cx, cy = self._piece_cells(types, rotations, xs, ys)
+        return self.cells_collide(boards[:, None], cx, cy)
+
+    def cells_collide(self, boards, cx, cy):
+        """Colisão de células (..., 4) já posicionadas; reduz o último eixo"""
+        out_of_bounds = (cx < 0) | (cx >= self.width) | (cy >= self.height)
+        occupied = self.cells[
+            boards,
+            np.clip(cy, 0, self.height - 1),
+            np.clip(cx, 0, self.width - 1)
+        ] != 0
+        occupied &= (cy >= 0) & ~out_of_bounds
+        return (out_of_bounds | occupied).any(axis=-1)
+
+    def drop_distances(self, boards, types, rotations, xs, ys):
+        """Quantas linhas cada peça cai até colidir (mesmo que repetir move(0, 1))"""
+        cx, cy = self._piece_cells(types, rotations, xs, ys)
+        # Colunas de cada célula: (M, 4, altura)
+        columns = self.cells[boards[:, None], :, cx] != 0
+        rows = np.arange(self.height)
+        columns &= rows[None, None, :] > cy[:, :, None]
+        first_below = np.where(columns.any(axis=2), columns.argmax(axis=2), self.height)
+        return (first_below - cy).min(axis=1) - 1
+
+    def place_tetrominoes(self, boards, types, rotations, xs, ys):
+        """Fixa as peças; retorna quais grades conseguiram fixar"""
+        cx, cy = self._piece_cells(types, rotations, xs, ys)
+        placed = (cy >= 0).all(axis=1) & ~self.is_collision(boards, types, rotations, xs, ys)
+        rows = np.broadcast_to(boards[:, None], cx.shape)
+        colors = np.broadcast_to(self.color_values[types][:, None], cx.shape)
+        self.cells[rows[placed], cy[placed], cx[placed]] = colors[placed]
+        return placed
+
+    def check_line_completions(self, boards):
+        """Máscara (M, altura) das linhas completas"""
+        return (self.cells[boards] != 0).all(axis=2)
+
+    def remove_lines(self, boards, full_rows):
+        """Compacta as grades numa passada; retorna linhas removidas por grade"""
+        counts = full_rows.sum(axis=1)
+        cleared = counts > 0
+        if not cleared.any():
+            return counts
+
+        boards = boards[cleared]
+        full_rows = full_rows[cleared]
+        # Ordenação estável: linhas completas vão pro topo, as outras mantêm a ordem
+        order = np.argsort(~full_rows, axis=1, kind='stable')
+        compacted = np.take_along_axis(self.cells[boards], order[:, :, None], axis=1)
+        compacted[np.arange(self.height)[None, :] < counts[cleared][:, None]] = 0
+        self.cells[boards] = compacted
+        return counts
+
+
+class BatchSimulation:
+    """Avança N jogos independentes juntos com as regras da GameSimulation.
+
+    step() recebe um código de ação por grade (BATCH_ACTION_CODES) e repete
+    apply_action + tick da versão escalar. Cada grade tem seu random.Random,
+    então GameSimulation(seed=seed) produz o mesmo jogo.
+    Pausa e reinício não existem no lote.
+    """
+
+    LINE_SCORES = (0, 100, 300, 500, 800)
+    # Formas sorteadas de uma vez por grade quando o estoque dela acaba
+    SHAPE_CHUNK = 64
+    # Por número de formas: o sorteio em lote do uniforme confere com rng.choice
+    _bulk_uniform_checked: Dict[int, bool] = {}
+
+    def __init__(self, count: int, seeds: Optional[List[int]] = None,
+                 board: Optional[BoardConfig] = None, tick_rate: Optional[int] = None):
+        self.count = count
+        self.seeds = list(seeds) if seeds is not None else list(range(count))
+        if len(self.seeds) != count:
+            raise ValueError("é preciso uma seed por grade")
+
+        self.board = board or BoardConfig.from_parameters()
+        self.factory = TetrominoFactory(piece_set=self.board.piece_set,
+                                        randomizer=self.board.randomizer,
+                                        queue_size=self.board.queue_size)
+        self.grid = BatchGameGrid(count, self.board.width, self.board.height, self.factory)
+        self.spawn_position = self.board.spawn
+        # Queda por nível com a mesma conversão da GameSimulation; a partir de
+        # _max_level a velocidade não muda mais
+        params = GameConfiguration.GameParameters
+        self.tick_rate = tick_rate or params.TICK_RATE
+        self._max_level = max(1, (params.FALL_TIME_BASE - 10) // 5 + 2)
+        self._fall_speeds = np.array(
+            [fall_speed_for_level(level, self.tick_rate) for level in range(self._max_level + 1)],
+            dtype=np.int64
+        )
+        self.reset()
+
+    def reset(self):
+        """Reinicia todos os jogos a partir das seeds"""
+        n = self.count
+        self.grid.clear()
+        self.rngs = [random.Random(seed) for seed in self.seeds]
+
+        # Randomizador por grade sobre os índices das formas: mesma sequência
+        # que a fila da TetrominoFactory. As formas saem de um estoque por
+        # grade (_upcoming), sorteado SHAPE_CHUNK de cada vez. preview é um
+        # buffer circular por grade, com a próxima forma em preview_head
+        shape_indices = range(len(self.grid.shape_types))
+        self._randomizers = [get_randomizer(self.board.randomizer, shape_indices, rng)
+                             for rng in self.rngs]
+        self._bulk_uniform = (self.board.randomizer == 'uniform' and
+                              self._check_bulk_uniform(len(shape_indices)))
+        self._upcoming = np.zeros((n, self.SHAPE_CHUNK), dtype=np.int64)
+        self._upcoming_pos = np.zeros(n, dtype=np.int64)
+        self._upcoming_len = np.zeros(n, dtype=np.int64)
+        everyone = np.arange(n)
+        size = self.factory.queue.maxlen
+        self.preview = np.stack([self._draw(everyone) for _ in range(size)], axis=1)
+        self.preview_head = np.zeros(n, dtype=np.int64)
+
+        self.piece_type = np.zeros(n, dtype=np.int64)
+        self.rotation = np.zeros(n, dtype=np.int64)
+        self.pos_x = np.zeros(n, dtype=np.int64)
+        self.pos_y = np.zeros(n, dtype=np.int64)
+
+        self.score = np.zeros(n, dtype=np.int64)
+        self.level = np.ones(n, dtype=np.int64)
+        self.lines_cleared = np.zeros(n, dtype=np.int64)
+        self.combo = np.zeros(n, dtype=np.int64)
+        self.multiplier = np.ones(n, dtype=np.float64)
+
+        self.fall_timer = np.zeros(n, dtype=np.int64)
+        self.fall_speed = np.full(n, self._fall_speeds[1], dtype=np.int64)
+        self.game_over = np.zeros(n, dtype=bool)
+        self.placements = 0
+
+        self._spawn(np.arange(n))
+
+    def _spawn(self, boards):
+        """_get_next_tetromino para as grades indicadas"""
+        if boards.size == 0:
+            return
+        heads = self.preview_head[boards]
+        self.piece_type[boards] = self.preview[boards, heads]
+        self.preview[boards, heads] = self._draw(boards)
+        self.preview_head[boards] = (heads + 1) % self.preview.shape[1]
+        self.rotation[boards] = 0
+        self.pos_x[boards] = self.spawn_position[0]
+        self.pos_y[boards] = self.spawn_position[1]
+
+        blocked = self._collides(boards)
+        self.game_over[boards[blocked]] = True
+
+    def _draw(self, boards):
+        """Próxima forma (índice) de cada grade indicada, tirada do estoque"""
+        empty = self._upcoming_pos[boards] >= self._upcoming_len[boards]
+        while empty.any():
+            self._refill(boards[empty])
+            empty = self._upcoming_pos[boards] >= self._upcoming_len[boards]
+        positions = self._upcoming_pos[boards]
+        self._upcoming_pos[boards] = positions + 1
+        return self._upcoming[boards, positions]
+
+    def _refill(self, boards):
+        """Sorteia um novo estoque de formas para as grades indicadas"""
+        chunk = self.SHAPE_CHUNK
+        if not self._bulk_uniform:
+            randomizers = self._randomizers
+            self._upcoming[boards] = [randomizers[b].take(chunk) for b in boards.tolist()]
+            self._upcoming_len[boards] = chunk
+            self._upcoming_pos[boards] = 0
+            return
+
+        # rng.choice(formas) é getrandbits(k) com rejeição dos valores >= n, e
+        # getrandbits(k) são os k bits altos de uma palavra do Mersenne Twister.
+        # getrandbits(32 * chunk) devolve chunk palavras seguidas (a primeira
+        # nos bits baixos), então um sorteio por grade cobre o estoque todo
+        count = len(self.grid.shape_types)
+        rngs = self.rngs
+        words = np.frombuffer(b''.join(
+            rngs[b].getrandbits(32 * chunk).to_bytes(4 * chunk, 'little')
+            for b in boards.tolist()
+        ), dtype='<u4').reshape(len(boards), chunk)
+        values = (words >> (32 - count.bit_length())).astype(np.int64)
+        accepted = values < count
+        # Ordenação estável: os aceitos vão para o começo, na ordem sorteada
+        order = np.argsort(~accepted, axis=1, kind='stable')
+        self._upcoming[boards] = np.take_along_axis(values, order, axis=1)
+        self._upcoming_len[boards] = accepted.sum(axis=1)
+        self._upcoming_pos[boards] = 0
+
+    @classmethod
+    def _check_bulk_uniform(cls, count: int) -> bool:
+        """Confere uma vez se o sorteio em lote reproduz rng.choice neste Python"""
+        checked = cls._bulk_uniform_checked.get(count)
+        if checked is None:
+            bits = count.bit_length()
+            words = random.Random(count).getrandbits(32 * cls.SHAPE_CHUNK)
+            drawn = [(words >> (32 * i + 32 - bits)) & ((1 << bits) - 1)
+                     for i in range(cls.SHAPE_CHUNK)]
+            drawn = [value for value in drawn if value < count]
+            reference = random.Random(count)
+            checked = drawn == [reference.choice(range(count)) for _ in drawn]
+            cls._bulk_uniform_checked[count] = checked
+        return checked
+
+    def _collides(self, boards, dx: int = 0, dy: int = 0, rotations=None):
+        if rotations is None:
+            rotations = self.rotation[boards]
+        return self.grid.is_collision(
+            boards, self.piece_type[boards], rotations,
+            self.pos_x[boards] + dx, self.pos_y[boards] + dy
+        )
+
+    def _move(self, boards, dx: int, dy: int):
+        if boards.size:
+            ok = ~self._collides(boards, dx, dy)
+            self.pos_x[boards[ok]] += dx
+            self.pos_y[boards[ok]] += dy
+            return ok
+        return np.zeros(0, dtype=bool)
+
+    def _rotate(self, boards, direction: int):
+        if boards.size:
+            rotations = (self.rotation[boards] + direction) % 4
+            ok = ~self._collides(boards, rotations=rotations)
+            self.rotation[boards[ok]] = rotations[ok]
+
+    def _hard_drop(self, boards):
+        if boards.size:
+            self.pos_y[boards] += self.grid.drop_distances(
+                boards, self.piece_type[boards], self.rotation[boards],
+                self.pos_x[boards], self.pos_y[boards]
+            )
+
+    def _slide(self, boards, columns):
+        """Move na horizontal até a coluna alvo ou até o primeiro bloqueio"""
+        if boards.size == 0:
+            return
+        grid = self.grid
+        candidates = np.arange(-4, grid.width)
+        k = candidates.size
+        types = self.piece_type[boards]
+        rotations = self.rotation[boards]
+        # Células da peça em todas as colunas candidatas: (M, k, 4)
+        cx = grid.cell_x[types, rotations][:, None, :] + candidates[None, :, None]
+        cy = (grid.cell_y[types, rotations] + self.pos_y[boards][:, None])[:, None, :]
+        blocked = grid.cells_collide(boards[:, None, None], cx, cy)
+
+        start = self.pos_x[boards][:, None]
+        target = columns[:, None]
+        xs = candidates[None, :]
+        # Indo pra esquerda: o bloqueio mais à direita em [alvo, início)
+        left = blocked & (xs >= target) & (xs < start)
+        left_stop = np.where(left.any(axis=1), k - 1 - left[:, ::-1].argmax(axis=1), -1)
+        # Indo pra direita: o primeiro bloqueio em (início, alvo]
+        right = blocked & (xs > start) & (xs <= target)
+        right_stop = np.where(right.any(axis=1), right.argmax(axis=1), -1)
+
+        final = np.clip(columns, candidates[0], candidates[-1])
+        final = np.where(left_stop >= 0, candidates[left_stop] + 1, final)
+        final = np.where(right_stop >= 0, candidates[right_stop] - 1, final)
+        self.pos_x[boards] = final
+
+    def _lock(self, boards):
+        """_lock_current_tetromino para as grades indicadas"""
+        if boards.size == 0:
+            return np.zeros(0, dtype=np.int64)
+        grid = self.grid
+        types = self.piece_type[boards]
+        rotations = self.rotation[boards]
+
+        # add_shape_score
+        blocks = grid.block_counts[types, rotations]
+        self.score[boards] += np.trunc(blocks * 10 * self.multiplier[boards]).astype(np.int64)
+
+        placed = grid.place_tetrominoes(
+            boards, types, rotations, self.pos_x[boards], self.pos_y[boards]
+        )
+        self.game_over[boards[~placed]] = True
+        boards = boards[placed]
+        self.placements += int(boards.size)
+
+        counts = grid.remove_lines(boards, grid.check_line_completions(boards))
+        scored = boards[counts > 0]
+        if scored.size:
+            self._add_line_clear_score(scored, counts[counts > 0])
+
+        self._spawn(boards)
+        lines = np.zeros(placed.size, dtype=np.int64)
+        lines[placed] = counts
+        return lines
+
+    def _add_line_clear_score(self, boards, lines_count):
+        """ScoreManager.add_line_clear_score + ajuste de fall_speed"""
+        table = np.array(self.LINE_SCORES, dtype=np.int64)
+        base_score = np.where(
+            lines_count < table.size,
+            table[np.minimum(lines_count, table.size - 1)],
+            0
+        )
+        combo_bonus = self.combo[boards] * 50
+        self.score[boards] += np.trunc(
+            (base_score + combo_bonus) * self.multiplier[boards]
+        ).astype(np.int64)
+        self.lines_cleared[boards] += lines_count
+        self.combo[boards] += 1
+        self.level[boards] = self.lines_cleared[boards] // 10 + 1
+        self.multiplier[boards] = 1.0 + (self.level[boards] - 1) * 0.1
+        self.fall_speed[boards] = self._fall_speeds[np.minimum(self.level[boards], self._max_level)]
+
+    def apply_actions(self, actions):
+        """Aplica um código de ação por grade; retorna linhas limpas"""
+        actions = np.asarray(actions)
+        lines = np.zeros(self.count, dtype=np.int64)
+        active = ~self.game_over
+
+        self._move(np.flatnonzero(active & (actions == 1)), -1, 0)
+        self._move(np.flatnonzero(active & (actions == 2)), 1, 0)
+        self._move(np.flatnonzero(active & (actions == 3)), 0, 1)
+        self._rotate(np.flatnonzero(active & (actions == 4)), 1)
+        self._rotate(np.flatnonzero(active & (actions == 5)), -1)
+
+        dropping = np.flatnonzero(active & (actions == 6))
+        self._hard_drop(dropping)
+        lines[dropping] = self._lock(dropping)
+        return lines
+
+    def tick(self):
+        """Um tick de gravidade em todas as grades; retorna linhas limpas"""
+        lines = np.zeros(self.count, dtype=np.int64)
+        active = np.flatnonzero(~self.game_over)
+        self.fall_timer[active] += 1
+        falling = active[self.fall_timer[active] >= self.fall_speed[active]]
+        if falling.size:
+            landed = falling[~self._move(falling, 0, 1)]
+            lines[landed] = self._lock(landed)
+            self.fall_timer[falling] = 0
+        return lines
+
+    def step(self, actions):
+        """apply_actions + tick, como GameSimulation.step"""
+        return self.apply_actions(actions) + self.tick()
+
+    def place(self, rotations, columns):
+        """Gira, move até a coluna e faz hard drop em todas as grades ativas.
+
+        Usa as mesmas ações do step (sem ticks de gravidade), então a peça
+        para onde o caminho estiver bloqueado, como faria o jogador.
+        """
+        rotations = np.asarray(rotations) % 4
+        columns = np.asarray(columns)
+        active = np.flatnonzero(~self.game_over)
+
+        for turn in range(1, 4):
+            self._rotate(active[rotations[active] >= turn], 1)
+
+        self._slide(active, columns[active])
+
+        lines = np.zeros(self.count, dtype=np.int64)
+        self._hard_drop(active)
+        lines[active] = self._lock(active)
+        return lines
+
+
+# Self-play em vários processos
+@dataclass
+class GameResult:
+    """Estatísticas finais de um jogo headless"""
+    seed: int
+    score: int
+    level: int
+    lines_cleared: int
+    max_combo: int
+    ticks: int
+
+
+@dataclass
+class SelfPlaySummary:
+    """Resumo agregado de vários jogos"""
+    games: int = 0
+    total_score: int = 0
+    best_score: int = 0
+    best_seed: Optional[int] = None
+    max_level: int = 0
+    total_lines: int = 0
+    max_combo: int = 0
+    total_ticks: int = 0
+    results: List[GameResult] = field(default_factory=list)
+
+    def add(self, result: GameResult):
+        self.games += 1
+        self.total_score += result.score
+        if self.best_seed is None or result.score > self.best_score:
+            self.best_score = result.score
+            self.best_seed = result.seed
+        self.max_level = max(self.max_level, result.level)
+        self.total_lines += result.lines_cleared
+        self.max_combo = max(self.max_combo, result.max_combo)
+        self.total_ticks += result.ticks
+        self.results.append(result)
+
+    def merge(self, other: 'SelfPlaySummary'):
+        for result in other.results:
+            self.add(result)
+
+    @property
+    def mean_score(self) -> float:
+        return self.total_score / self.games if self.games else 0.0
+
+    def format(self) -> str:
+        return (
+            f"Jogos: {self.games} | Pontuação média: {self.mean_score:.1f} | "
+            f"Melhor: {self.best_score} (seed {self.best_seed}) | "
+            f"Nível máx.: {self.max_level} | Linhas: {self.total_lines} | "
+            f"Combo máx.: {self.max_combo} | Ticks: {self.total_ticks}"
+        )
+
+
+PLAYABLE_ACTIONS = [
+    None,
+    GameAction.LEFT,
+    GameAction.RIGHT,
+    GameAction.DOWN,
+    GameAction.ROTATE_CW,
+    GameAction.ROTATE_CCW,
+    GameAction.HARD_DROP,
+]
+
+
+def random_policy(simulation: GameSimulation, rng: random.Random) -> Optional[GameAction]:
+    """Política padrão: uma ação aleatória por tick"""
+    return rng.choice(PLAYABLE_ACTIONS)
+
+
+def play_game(seed: int, policy=random_policy, max_ticks: int = 100000) -> GameResult:
+    """Joga uma partida headless; a mesma seed sempre reproduz o mesmo jogo.
+
+    A política recebe (simulação, rng) e devolve uma GameAction ou None. O rng
+    da política é derivado da seed, separado do rng das peças.
+    """
+    simulation = GameSimulation(seed=seed)
+    policy_rng = random.Random(f"policy:{seed}")
+
+    while not simulation.game_over and simulation.tick_count < max_ticks:
+        simulation.step(policy(simulation, policy_rng))
+
+    score = simulation.score_manager
+    return GameResult(
+        seed=seed,
+        score=score.score,
+        level=score.level,
+        lines_cleared=score.lines_cleared,
+        max_combo=score.max_combo,
+        ticks=simulation.tick_count,
+    )
+
+
+def _play_game_chunk(seeds: List[int], policy, max_ticks: int) -> SelfPlaySummary:
+    summary = SelfPlaySummary()
+    for seed in seeds:
+        summary.add(play_game(seed, policy, max_ticks))
+    return summary
+
+
+def run_self_play(seeds, policy=random_policy, workers: Optional[int] = None,
+                  max_ticks: int = 100000) -> SelfPlaySummary:
+    """Joga várias partidas em paralelo e junta as estatísticas.
+
+    A política precisa ser uma função de módulo (picklable). As seeds são
+    divididas em blocos, poucos por processo, para manter o overhead de IPC
+    baixo e a escala próxima de linear.
+    """
+    seeds = list(seeds)
+    workers = workers or os.cpu_count() or 1
+    summary = SelfPlaySummary()
+    if workers == 1 or len(seeds) <= 1:
+        summary.merge(_play_game_chunk(seeds, policy, max_ticks))
+        return summary
+
+    chunk_size = max(1, len(seeds) // (workers * 4))
+    chunks = [seeds[i:i + chunk_size] for i in range(0, len(seeds), chunk_size)]
+    with futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = [
+            pool.submit(_play_game_chunk, chunk, policy, max_ticks) for chunk in chunks
+        ]
+        for future in pending:
+            summary.merge(future.result())
+    return summary
+
+
+# Jogador automático (busca de posições)
+@dataclass
+class HeuristicWeights:
+    """Pesos da avaliação de tabuleiro do AIPlayer (maior = melhor)"""
+    aggregate_height: float = -0.510066
+    holes: float = -0.35663
+    bumpiness: float = -0.184483
+    # Por ponto de ScoreManager.line_clear_points (uma linha simples = 100)
+    line_clear_points: float = 0.0076
+    game_over: float = -1000.0
+
+
+class ZobristHasher:
+    """Hash Zobrist da ocupação da grade (as cores não importam para a IA).
+
+    Cada célula tem uma chave aleatória de 64 bits; a chave de uma linha é o
+    XOR das chaves das suas células, calculada uma vez por (linha, máscara).
+    Fixar uma peça só troca as chaves das linhas tocadas.
+    """
+
+    def __init__(self, width: int, height: int, seed: int = 0x5EED):
+        rng = random.Random(seed)
+        self.width = width
+        self.height = height
+        self.cell_keys = [[rng.getrandbits(64) for _ in range(width)] for _ in range(height)]
+        self._row_keys: List[Dict[int, int]] = [{0: 0} for _ in range(height)]
+
+    def row_key(self, y: int, row_mask: int) -> int:
+        keys = self._row_keys[y]
+        key = keys.get(row_mask)
+        if key is None:
+            key = 0
+            cell_keys = self.cell_keys[y]
+            bits = row_mask
+            x = 0
+            while bits:
+                if bits & 1:
+                    key ^= cell_keys[x]
+                bits >>= 1
+                x += 1
+            keys[row_mask] = key
+        return key
+
+    def hash_rows(self, rows) -> int:
+        board_hash = 0
+        for y, row_mask in enumerate(rows):
+            if row_mask:
+                board_hash ^= self.row_key(y, row_mask)
+        return board_hash
+
+
+class TranspositionTable:
+    """Cache limitado (LRU) de avaliações, indexado pelo hash Zobrist"""
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class Placement(NamedTuple):
+    """Posição final de uma peça e o tabuleiro resultante"""
+    rotation: int
+    x: int
+    y: int
+    rows: Tuple[int, ...]
+    board_hash: int
+    lines: int
+
+
+class AIPlayer:
+    """Jogador automático para soak tests e ajuste de parâmetros.
+
+    Enumera todas as posições finais alcançáveis (rotação x coluna) da peça
+    atual e, com depth > 1, das próximas peças da fila, e escolhe a
+    de melhor avaliação. O lookahead só expande as beam_width melhores posições
+    de cada nível, para a decisão caber num quadro. Serve como fonte de entrada do motor (next_bits) e
+    como política do self-play (AIPlayer() é chamável como random_policy).
+    """
+
+    def __init__(self, weights: Optional[HeuristicWeights] = None, depth: int = 2,
+                 beam_width: int = 8, table_size: int = 100000):
+        self.weights = weights or HeuristicWeights()
+        self.depth = depth
+        self.beam_width = beam_width
+        self.table = TranspositionTable(table_size)
+        self.hasher: Optional[ZobristHasher] = None
+        self.last_decision_time = 0.0
+        self._rotations: Dict[TetrominoType, tuple] = {}
+        self._piece_set: Optional[str] = None
+        self._spawn = (4, 0)
+        self._plan_piece: Optional[ActiveTetromino] = None
+        self._plan: Optional[Tuple[int, int]] = None
+        self._last_state = None
+
+    def _prepare(self, grid: GameGrid, factory: TetrominoFactory):
+        if self.hasher is None or (self.hasher.width, self.hasher.height) != (grid.width, grid.height):
+            self.hasher = ZobristHasher(grid.width, grid.height)
+            self.table.clear()
+        if self._piece_set != factory.piece_set:
+            self._piece_set = factory.piece_set
+            self._rotations = {
+                shape_type: tuple(view.mask for view in factory.get_rotation_views(shape_type))
+                for shape_type in factory.definitions
+            }
+            self.table.clear()
+
+    def _collides(self, rows, mask: RotationMask, x: int, y: int) -> bool:
+        """Mesma regra do BitboardGameGrid.is_collision, sobre tuplas de linhas"""
+        shift = x + mask.min_x
+        hasher = self.hasher
+        if shift < 0 or x + mask.max_x >= hasher.width or y + mask.max_y >= hasher.height:
+            return True
+        for dy, row_mask in enumerate(mask.row_masks):
+            grid_y = y + dy
+            if grid_y >= 0 and rows[grid_y] & (row_mask << shift):
+                return True
+        return False
+
+    def _landing_row(self, rows, tops, mask: RotationMask, x: int, y: int) -> int:
+        """Linha onde a peça para no hard drop a partir de (x, y)
+        (mesma conta de GameGrid.landing_row, sobre os topos das colunas)"""
+        landing = min(
+            tops[x + column] - bottom_dy for column, _, bottom_dy, _ in mask.column_profile
+        ) - 1
+        if landing >= y:
+            return landing
+        # Há blocos acima da peça nalguma coluna (beiral): desce linha a linha
+        while not self._collides(rows, mask, x, y + 1):
+            y += 1
+        return y
+
+    def placements(self, rows, board_hash: int, tops, shape_type: TetrominoType,
+                   rotation: int = 0, x: int = 4, y: int = 0) -> List[Placement]:
+        """Posições finais alcançáveis girando em (x, y), deslizando e soltando"""
+        rotations = self._rotations[shape_type]
+        hasher = self.hasher
+        full_row_mask = (1 << hasher.width) - 1
+        results = []
+        seen = set()
+        # Mesma ordem de entradas do controle: rotações primeiro (CW, CCW ou
+        # duas CW), depois movimento lateral
+        for steps, direction in ((0, 1), (1, 1), (1, -1), (2, 1)):
+            target = (rotation + steps * direction) % 4
+            blocked = False
+            for step in range(1, steps + 1):
+                mask = rotations[(rotation + step * direction) % 4]
+                if self._collides(rows, mask, x, y):
+                    blocked = True
+                    break
+            if blocked:
+                continue
+
+            mask = rotations[target]
+            for slide in (-1, 1):
+                column = x if slide < 0 else x + 1
+                while not self._collides(rows, mask, column, y):
+                    landing = self._landing_row(rows, tops, mask, column, y)
+                    key = (mask.row_masks, column, landing)
+                    if key not in seen and landing + mask.min_y >= 0:
+                        seen.add(key)
+                        results.append(self._place(
+                            rows, board_hash, mask, target, column, landing, full_row_mask
+                        ))
+                    column += slide
+        return results
+
+    def _place(self, rows, board_hash: int, mask: RotationMask, rotation: int,
+               x: int, y: int, full_row_mask: int) -> Placement:
+        new_rows = list(rows)
+        row_key = self.hasher.row_key
+        shift = x + mask.min_x
+        lines = 0
+        for dy, row_mask in enumerate(mask.row_masks):
+            if row_mask:
+                grid_y = y + dy
+                old = new_rows[grid_y]
+                new = old | (row_mask << shift)
+                new_rows[grid_y] = new
+                board_hash ^= row_key(grid_y, old) ^ row_key(grid_y, new)
+                if new == full_row_mask:
+                    lines += 1
+        if lines:
+            kept = [row for row in new_rows if row != full_row_mask]
+            new_rows = [0] * lines + kept
+            board_hash = self.hasher.hash_rows(new_rows)
+        return Placement(rotation, x, y, tuple(new_rows), board_hash, lines)
+
+    def analyze(self, rows, board_hash: int) -> Tuple[float, Tuple[int, ...]]:
+        """(avaliação heurística, topo de cada coluna) de um tabuleiro, com memo"""
+        cached = self.table.get(board_hash)
+        if cached is not None:
+            return cached
+
+        height = self.hasher.height
+        width = self.hasher.width
+        tops = [height] * width
+        covered = 0
+        holes = 0
+        for y, row_mask in enumerate(rows):
+            if not covered and not row_mask:
+                continue
+            new_columns = row_mask & ~covered
+            while new_columns:
+                low_bit = new_columns & -new_columns
+                tops[low_bit.bit_length() - 1] = y
+                new_columns ^= low_bit
+            covered |= row_mask
+            gaps = covered & ~row_mask
+            if gaps:
+                holes += bin(gaps).count('1')
+
+        aggregate_height = width * height - sum(tops)
+        bumpiness = sum(abs(tops[x] - tops[x + 1]) for x in range(width - 1))
+        weights = self.weights
+        value = (weights.aggregate_height * aggregate_height +
+                 weights.holes * holes +
+                 weights.bumpiness * bumpiness)
+        result = (value, tuple(tops))
+        self.table.put(board_hash, result)
+        return result
+
+    def _ranked(self, placements: List[Placement], shapes: Tuple[TetrominoType, ...],
+                combo: int, multiplier: float) -> List[Tuple[float, Placement]]:
+        """(valor, posição) de cada posição; com lookahead só as beam_width
+        melhores pela avaliação imediata descem mais um nível"""
+        scored = []
+        for placement in placements:
+            value, tops = self.analyze(placement.rows, placement.board_hash)
+            reward = 0.0
+            next_combo = combo
+            if placement.lines:
+                points = ScoreManager.line_clear_points(placement.lines, combo, multiplier)
+                reward = self.weights.line_clear_points * points
+                next_combo += 1
+            scored.append((reward + value, reward, next_combo, tops, placement))
+        if not shapes:
+            return [(value, placement) for value, _, _, _, placement in scored]
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [
+            (reward + self._lookahead(placement.rows, placement.board_hash, tops,
+                                      shapes, next_combo, multiplier), placement)
+            for _, reward, next_combo, tops, placement in scored[:self.beam_width]
+        ]
+
+    def _lookahead(self, rows, board_hash: int, tops, shapes: Tuple[TetrominoType, ...],
+                   combo: int, multiplier: float) -> float:
+        """Melhor valor colocando as peças de shapes a partir do spawn"""
+        key = (board_hash, shapes, combo)
+        cached = self.table.get(key)
+        if cached is not None:
+            return cached
+
+        shape_type = shapes[0]
+        best = self.weights.game_over
+        spawn_x, spawn_y = self._spawn
+        if not self._collides(rows, self._rotations[shape_type][0], spawn_x, spawn_y):
+            ranked = self._ranked(self.placements(rows, board_hash, tops, shape_type,
+                                                  0, spawn_x, spawn_y),
+                                  shapes[1:], combo, multiplier)
+            if ranked:
+                best = max(value for value, _ in ranked)
+        self.table.put(key, best)
+        return best
+
+    def choose_placement(self, simulation: GameSimulation) -> Optional[Placement]:
+        """Melhor posição final para a peça atual (None se não houver)"""
+        tetromino = simulation.current_tetromino
+        if tetromino is None:
+            return None
+        start = time.perf_counter()
+        grid = simulation.grid
+        self._prepare(grid, simulation.tetromino_factory)
+        self._spawn = simulation.spawn
+
+        rows = grid.occupancy_rows()
+        board_hash = self.hasher.hash_rows(rows)
+        _, tops = self.analyze(rows, board_hash)
+        score = simulation.score_manager
+        shapes = simulation.tetromino_factory.peek(self.depth - 1)
+
+        placements = self.placements(rows, board_hash, tops, tetromino.shape_type,
+                                     tetromino.rotation_index, *tetromino.position)
+        ranked = self._ranked(placements, shapes, score.combo, score.multiplier)
+        best = max(ranked, key=lambda item: item[0], default=None)
+
+        self.last_decision_time = time.perf_counter() - start
+        return best[1] if best else None
+
+    def next_action(self, simulation: GameSimulation) -> Optional[GameAction]:
+        """Próxima entrada para levar a peça atual até a posição escolhida"""
+        tetromino = simulation.current_tetromino
+        if simulation.game_over or simulation.paused or tetromino is None:
+            return None
+
+        if tetromino is not self._plan_piece:
+            self._plan_piece = tetromino
+            placement = self.choose_placement(simulation)
+            self._plan = (placement.rotation, placement.x) if placement else None
+            self._last_state = None
+        if self._plan is None:
+            return GameAction.HARD_DROP
+
+        state = (tetromino.rotation_index, tetromino.position[0])
+        if state == self._last_state:
+            # A entrada anterior não teve efeito (a gravidade mudou o caminho)
+            return GameAction.HARD_DROP
+        self._last_state = state
+
+        rotation, x = self._plan
+        if tetromino.rotation_index != rotation:
+            if (rotation - tetromino.rotation_index) % 4 == 3:
+                return GameAction.ROTATE_CCW
+            return GameAction.ROTATE_CW
+        if tetromino.position[0] != x:
+            return GameAction.LEFT if tetromino.position[0] > x else GameAction.RIGHT
+        return GameAction.HARD_DROP
+
+    def next_bits(self, simulation: GameSimulation) -> int:
+        """Entrada do próximo tick no formato de INPUT_BITS"""
+        action = self.next_action(simulation)
+        return INPUT_BITS[action] if action else 0
+
+    def __call__(self, simulation: GameSimulation, rng: random.Random) -> Optional[GameAction]:
+        return self.next_action(simulation)
+
+
+# Replays
+REPLAY_MAGIC = b'PBRP'
+REPLAY_VERSION = 5
+REPLAY_HEADER = struct.Struct('<4sBqI')
+# Versão 2: taxa de ticks logo depois do cabeçalho (a versão 1 era sempre 60 Hz)
+REPLAY_TICK_RATE = struct.Struct('<H')
+# Versão 3: largura, altura, spawn (x -1 = centro) e o nome do conjunto de
+# peças (tamanho + UTF-8); antes era sempre BoardConfig()
+REPLAY_BOARD = struct.Struct('<HHhhB')
+# Versão 4: nome do randomizador (tamanho em um byte + UTF-8) depois das peças
+# Versão 5: tamanho da fila de preview (um byte) depois do randomizador
+# Fila de preview das versões sem o campo: 10 formas até a 3, 8 na 4
+REPLAY_LEGACY_QUEUE_SIZES = {1: 10, 2: 10, 3: 10, 4: 8}
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class ReplayRecorder:
+    """Grava a seed e o campo de entrada (INPUT_BITS) de cada tick.
+
+    Só os ticks com entrada são guardados, como pares de varints
+    (ticks desde a última entrada, bits), então minutos de jogo cabem em
+    poucos KB.
+    """
+
+    def __init__(self, seed: int, tick_rate: Optional[int] = None,
+                 board: Optional[BoardConfig] = None):
+        self.seed = seed
+        self.tick_rate = tick_rate or GameConfiguration.GameParameters.TICK_RATE
+        self.board = board or BoardConfig.from_parameters()
+        self.tick = 0
+        self._last_input_tick = 0
+        self._events = bytearray()
+
+    def record(self, bits: int):
+        if bits:
+            _write_varint(self._events, self.tick - self._last_input_tick)
+            _write_varint(self._events, bits)
+            self._last_input_tick = self.tick
+        self.tick += 1
+
+    def to_bytes(self) -> bytes:
+        header = REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.seed, self.tick)
+        board = self.board
+        piece_set = board.piece_set.encode('utf-8')
+        randomizer = board.randomizer.encode('utf-8')
+        spawn_x = -1 if board.spawn_x is None else board.spawn_x
+        return (header + REPLAY_TICK_RATE.pack(self.tick_rate) +
+                REPLAY_BOARD.pack(board.width, board.height, spawn_x, board.spawn_y,
+                                  len(piece_set)) +
+                piece_set + bytes((len(randomizer),)) + randomizer +
+                bytes((board.queue_size,)) + bytes(self._events))
+
+    def save(self, path: str):
+        with open(path, 'wb') as replay_file:
+            replay_file.write(self.to_bytes())
+
+
+@dataclass
+class ReplayData:
+    """Replay carregado: seed, total de ticks e entradas esparsas por tick"""
+    seed: int
+    total_ticks: int
+    inputs: Dict[int, int] = field(default_factory=dict)
+    tick_rate: int = 60
+    board: BoardConfig = BoardConfig()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'ReplayData':
+        magic, version, seed, total_ticks = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or not 1 <= version <= REPLAY_VERSION:
+            raise ValueError("arquivo de replay inválido")
+        offset = REPLAY_HEADER.size
+        tick_rate = 60
+        if version >= 2:
+            tick_rate, = REPLAY_TICK_RATE.unpack_from(data, offset)
+            offset += REPLAY_TICK_RATE.size
+        # Sem o campo, o tamanho da fila vem da versão
+        queue_size = REPLAY_LEGACY_QUEUE_SIZES.get(version)
+        board = BoardConfig() if queue_size is None else BoardConfig(queue_size=queue_size)
+        if version >= 3:
+            width, height, spawn_x, spawn_y, name_size = REPLAY_BOARD.unpack_from(data, offset)
+            offset += REPLAY_BOARD.size
+            piece_set = data[offset:offset + name_size].decode('utf-8')
+            offset += name_size
+            randomizer = 'uniform'
+            if version >= 4:
+                name_size = data[offset]
+                randomizer = data[offset + 1:offset + 1 + name_size].decode('utf-8')
+                offset += 1 + name_size
+            if version >= 5:
+                queue_size = data[offset]
+                offset += 1
+            board = BoardConfig(width, height, None if spawn_x < 0 else spawn_x,
+                                spawn_y, piece_set, randomizer, queue_size)
+        inputs = {}
+        tick = 0
+        while offset < len(data):
+            delta, offset = _read_varint(data, offset)
+            bits, offset = _read_varint(data, offset)
+            tick += delta
+            inputs[tick] = bits
+        return cls(seed, total_ticks, inputs, tick_rate, board)
+
+    @classmethod
+    def load(cls, path: str) -> 'ReplayData':
+        with open(path, 'rb') as replay_file:
+            return cls.from_bytes(replay_file.read())
+
+
+class ReplayPlayer:
+    """Reproduz um replay numa GameSimulation.
+
+    A cada keyframe_interval ticks guarda um keyframe do estado, então seek()
+    só precisa restaurar o keyframe anterior e avançar o resto.
+    """
+
+    def __init__(self, replay: ReplayData, simulation: Optional[GameSimulation] = None,
+                 keyframe_interval: int = 600):
+        self.replay = replay
+        self.simulation = simulation or GameSimulation(
+            seed=replay.seed, tick_rate=replay.tick_rate, board=replay.board
+        )
+        self.keyframe_interval = keyframe_interval
+        self.keyframes: Dict[int, GameSnapshot] = {}
+        self.tick = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.tick >= self.replay.total_ticks
+
+    def next_bits(self) -> int:
+        """Entrada do próximo tick (o chamador aplica e roda a gravidade)"""
+        if self.tick % self.keyframe_interval == 0 and self.tick not in self.keyframes:
+            self.keyframes[self.tick] = self.simulation.snapshot()
+        bits = self.replay.inputs.get(self.tick, 0)
+        self.tick += 1
+        return bits
+
+    def step(self):
+        self.simulation.step_bits(self.next_bits())
+
+    def fast_forward(self, to_tick: Optional[int] = None):
+        """Avança sem renderizar, na velocidade máxima da CPU"""
+        target = self.replay.total_ticks if to_tick is None else to_tick
+        while self.tick < target:
+            self.step()
+
+    def seek(self, tick: int):
+        """Vai para um tick a partir do keyframe mais próximo"""
+        tick = max(0, min(tick, self.replay.total_ticks))
+        keyframe = max((k for k in self.keyframes if k <= tick), default=None)
+        if tick < self.tick or (keyframe is not None and keyframe > self.tick):
+            self.simulation.restore(self.keyframes[keyframe])
+            self.tick = keyframe
+        self.fast_forward(tick)
+
+
+def replay_headless(path: str) -> GameResult:
+    """Roda um replay inteiro sem renderizar e devolve as estatísticas finais"""
+    player = ReplayPlayer(ReplayData.load(path))
+    player.fast_forward()
+    score = player.simulation.score_manager
+    return GameResult(
+        seed=player.replay.seed,
+        score=score.score,
+        level=score.level,
+        lines_cleared=score.lines_cleared,
+        max_combo=score.max_combo,
+        ticks=player.tick,
+    )
+
+
+def rescore_replays(paths: List[str], workers: Optional[int] = None) -> SelfPlaySummary:
+    """Recalcula em paralelo as estatísticas de vários replays"""
+    workers = workers or os.cpu_count() or 1
+    summary = SelfPlaySummary()
+    if workers == 1 or len(paths) <= 1:
+        for path in paths:
+            summary.add(replay_headless(path))
+        return summary
+
+    chunk_size = max(1, len(paths) // (workers * 4))
+    with futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(replay_headless, paths, chunksize=chunk_size):
+            summary.add(result)
+    return summary
+
+
+# Estatísticas
+class GameStats(NamedTuple):
+    """Resumo de uma partida terminada, com os ticks de cada peça"""
+    finished_at: float
+    seed: Optional[int]
+    score: int
+    level: int
+    lines: int
+    max_combo: int
+    ticks: int
+    tick_rate: int
+    piece_ticks: array
+
+
+class LeaderboardEntry(NamedTuple):
+    game_id: int
+    finished_at: float
+    day: str
+    score: int
+    level: int
+    lines: int
+    max_combo: int
+
+
+STATS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    finished_at REAL NOT NULL,
+    day TEXT NOT NULL,
+    seed INTEGER,
+    score INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    max_combo INTEGER NOT NULL,
+    ticks INTEGER NOT NULL,
+    tick_rate INTEGER NOT NULL,
+    pieces INTEGER NOT NULL,
+    avg_piece_ms REAL,
+    piece_ticks BLOB
+);
+CREATE INDEX IF NOT EXISTS games_score ON games (score DESC);
+CREATE INDEX IF NOT EXISTS games_day_score ON games (day, score DESC);
+'''
+STATS_INSERT = '''
+INSERT INTO games (finished_at, day, seed, score, level, lines, max_combo, ticks,
+                   tick_rate, pieces, avg_piece_ms, piece_ticks)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+LEADERBOARD_COLUMNS = 'id, finished_at, day, score, level, lines, max_combo'
+
+
+def stats_day(timestamp: float) -> str:
+    """Dia local (AAAA-MM-DD) usado no ranking diário"""
+    return time.strftime('%Y-%m-%d', time.localtime(timestamp))
+
+
+class StatsStore:
+    """Partidas e recordes guardados em SQLite.
+
+    record_game() só põe o resumo numa fila; uma thread de fundo grava em
+    lotes, uma transação por lote, então o laço do jogo nunca espera o disco.
+    Os rankings usam os índices de pontos e de (dia, pontos), então continuam
+    rápidos com milhões de partidas.
+    """
+
+    BATCH_SIZE = 256
+    # Espera máxima por mais partidas antes de gravar um lote
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, path: str):
+        self.path = path
+        connection = sqlite3.connect(path)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.executescript(STATS_SCHEMA)
+        connection.close()
+        # Conexão de leitura da thread principal; a de escrita é da thread de fundo
+        self._reader = sqlite3.connect(path)
+        self._queue: queue.Queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name='stats-writer',
+                                        daemon=True)
+        self._writer.start()
+
+    def record_game(self, stats: GameStats):
+        """Agenda a gravação da partida (não bloqueia)"""
+        self._queue.put(stats)
+
+    def _row(self, stats: GameStats) -> tuple:
+        pieces = len(stats.piece_ticks)
+        avg_piece_ms = None
+        if pieces:
+            avg_piece_ms = sum(stats.piece_ticks) * 1000.0 / (pieces * stats.tick_rate)
+        return (stats.finished_at, stats_day(stats.finished_at), stats.seed, stats.score,
+                stats.level, stats.lines, stats.max_combo, stats.ticks, stats.tick_rate,
+                pieces, avg_piece_ms, stats.piece_ticks.tobytes())
+
+    def _write_loop(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute('PRAGMA synchronous=NORMAL')
+        closing = False
+        while not closing:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.FLUSH_INTERVAL
+            while batch[-1] is not None and len(batch) < self.BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            closing = batch[-1] is None
+            rows = [self._row(stats) for stats in batch if stats is not None]
+            try:
+                if rows:
+                    with connection:
+                        connection.executemany(STATS_INSERT, rows)
+            except sqlite3.Error as e:
+                print(f"Erro ao gravar estatísticas: {e}")
+            for _ in batch:
+                self._queue.task_done()
+        connection.close()
+
+    def flush(self):
+        """Espera a gravação de tudo que já foi agendado"""
+        self._queue.join()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self._reader.close()
+
+    def best_score(self) -> int:
+        row = self._reader.execute('SELECT MAX(score) FROM games').fetchone()
+        return row[0] or 0
+
+    def top_scores(self, limit: int = 10, day: Optional[str] = None) -> List[LeaderboardEntry]:
+        """As limit maiores pontuações, no geral ou de um dia (AAAA-MM-DD)"""
+        if day is None:
+            rows = self._reader.execute(
+                f'SELECT {LEADERBOARD_COLUMNS} FROM games ORDER BY score DESC LIMIT ?',
+                (limit,)
+            )
         else:
-            self.combo = 0
-            
-        # Atualizar nível
-        self.level = self.lines_cleared // 10 + 1
-        
-        # Atualizar multiplicador baseado no nível
-        self.multiplier = 1.0 + (self.level - 1) * 0.1
-        
-    def reset(self):
-        '''zerar pontuação'''
-        self.__init__()
+            rows = self._reader.execute(
+                f'SELECT {LEADERBOARD_COLUMNS} FROM games WHERE day = ? '
+                'ORDER BY score DESC LIMIT ?',
+                (day, limit)
+            )
+        return [LeaderboardEntry(*row) for row in rows]
+
+    def piece_ticks(self, game_id: int) -> array:
+        """Ticks de cada peça de uma partida, da criação até fixar"""
+        row = self._reader.execute(
+            'SELECT piece_ticks FROM games WHERE id = ?', (game_id,)
+        ).fetchone()
+        ticks = array('H')
+        if row and row[0]:
+            ticks.frombytes(row[0])
+        return ticks
+
+
+class GameStatsRecorder:
+    """Junta os tempos das peças de uma GameSimulation e manda o resumo no game over"""
+
+    def __init__(self, store: StatsStore, simulation: GameSimulation,
+                 seed: Optional[int] = None):
+        self.store = store
+        self.simulation = simulation
+        self.seed = seed
+        self.best_score = store.best_score()
+        self.piece_ticks = array('H')
+        self._recorded = False
+
+        dispatcher = simulation.event_dispatcher
+        dispatcher.add_listener(GameEventType.GAME_STARTED, self._on_game_started)
+        dispatcher.add_listener(GameEventType.SHAPE_LOCKED, self._on_shape_locked)
+        dispatcher.add_listener(GameEventType.GAME_OVER, self._on_game_over)
+
+    def _on_game_started(self, event: GameEvent):
+        self.piece_ticks = array('H')
+        self._recorded = False
+
+    def _on_shape_locked(self, event: GameEvent):
+        self.piece_ticks.append(min(event.data['ticks'], 0xFFFF))
+
+    def _on_game_over(self, event: GameEvent):
+        if self._recorded:
+            return
+        self._recorded = True
+        simulation = self.simulation
+        score = simulation.score_manager
+        self.best_score = max(self.best_score, score.score)
+        self.store.record_game(GameStats(
+            finished_at=time.time(),
+            seed=self.seed,
+            score=score.score,
+            level=score.level,
+            lines=score.lines_cleared,
+            max_combo=score.max_combo,
+            ticks=simulation.tick_count,
+            tick_rate=simulation.tick_rate,
+            piece_ticks=self.piece_ticks,
+        ))
+
+
+# Multiplayer em rede
+# Quadro: tipo da mensagem (1 byte) + tamanho do payload (2 bytes)
+NET_FRAME = struct.Struct('<BH')
+# Cliente -> servidor
+MSG_JOIN = 1
+MSG_INPUT = 2
+MSG_LOCK = 3
+# Servidor -> cliente
+MSG_WELCOME = 16
+MSG_DELTA = 17
+MSG_MATCH_OVER = 18
+
+NET_INPUT = struct.Struct('<IB')        # seq, INPUT_BITS do tick
+NET_LOCK = struct.Struct('<IIBb')       # seq, número da peça, rotação, x
+# partida, jogador, seed, taxa de ticks, largura e altura da grade
+NET_WELCOME = struct.Struct('<IBqHBB')
+# tick, jogador, ack, número da peça, forma (0 = nenhuma), rotação, x, y,
+# pontos, linhas, lixo pendente, game over, linhas da grade no delta
+NET_DELTA = struct.Struct('<IBIIBBbbQHBBB')
+NET_DELTA_ROW = struct.Struct('<BI')    # y, ocupação da linha
+NET_MATCH_OVER = struct.Struct('<IB')   # partida, vencedor
+NO_WINNER = 0xFF
+
+# Pausa e reinício não valem numa partida em rede
+NET_INPUT_MASK = sum(INPUT_BITS.values()) & ~(
+    INPUT_BITS[GameAction.PAUSE] | INPUT_BITS[GameAction.RESTART]
+)
+# Linhas de lixo mandadas ao oponente por linhas limpas de uma vez
+GARBAGE_LINES = {1: 0, 2: 1, 3: 2, 4: 4}
+# As linhas vão como inteiros de 32 bits e os tipos como TetrominoType: as
+# partidas em rede usam sempre a grade clássica
+NET_BOARD = BoardConfig()
+
+
+class MatchDelta(NamedTuple):
+    """Mudanças no estado de um jogador desde o último delta"""
+    tick: int
+    player: int
+    ack: int
+    piece_seq: int
+    piece: Optional[Tuple[TetrominoType, int, int, int]]
+    score: int
+    lines: int
+    pending_garbage: int
+    game_over: bool
+    rows: Tuple[Tuple[int, int], ...]
+
+
+def _net_frame(kind: int, payload: bytes = b'') -> bytes:
+    return NET_FRAME.pack(kind, len(payload)) + payload
+
+
+async def _read_net_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    kind, length = NET_FRAME.unpack(await reader.readexactly(NET_FRAME.size))
+    payload = await reader.readexactly(length) if length else b''
+    return kind, payload
+
+
+def encode_delta(delta: MatchDelta) -> bytes:
+    """Payload de MSG_DELTA; linhas e lixo são limitados ao tamanho do campo"""
+    piece = (0, 0, 0, 0)
+    if delta.piece:
+        shape, rotation, x, y = delta.piece
+        piece = (shape.value, rotation, x, y)
+    header = NET_DELTA.pack(
+        delta.tick, delta.player, delta.ack, delta.piece_seq, *piece,
+        delta.score, min(delta.lines, 0xFFFF), min(delta.pending_garbage, 0xFF),
+        delta.game_over, len(delta.rows)
+    )
+    return header + b''.join(NET_DELTA_ROW.pack(y, row_mask) for y, row_mask in delta.rows)
+
+
+def decode_delta(payload: bytes) -> MatchDelta:
+    (tick, player, ack, piece_seq, shape, rotation, x, y, score, lines,
+     pending_garbage, game_over, row_count) = NET_DELTA.unpack_from(payload)
+    rows = tuple(
+        NET_DELTA_ROW.unpack_from(payload, NET_DELTA.size + i * NET_DELTA_ROW.size)
+        for i in range(row_count)
+    )
+    piece = (TetrominoType(shape), rotation, x, y) if shape else None
+    return MatchDelta(tick, player, ack, piece_seq, piece, score, lines,
+                      pending_garbage, bool(game_over), rows)
+
+
+def place_piece(simulation: GameSimulation, rotation: int, x: int):
+    """Gira, desliza e solta a peça atual como um jogador faria"""
+    tetromino = simulation.current_tetromino
+    if simulation.game_over or simulation.paused or not tetromino:
+        return
+    grid = simulation.grid
+    turns = (rotation - tetromino.rotation_index) % 4
+    if turns == 3:
+        tetromino.rotate(-1, grid)
+    else:
+        for _ in range(turns):
+            tetromino.rotate(1, grid)
+    while tetromino.position[0] != x:
+        if not tetromino.move(-1 if tetromino.position[0] > x else 1, 0, grid):
+            break
+    simulation.apply_action(GameAction.HARD_DROP)
+
+
+class ServerPlayer:
+    """Conexão de um jogador e o estado dele na partida atual"""
+
+    # Mensagens guardadas por jogador; o servidor aplica uma por tick
+    INBOX_SIZE = 64
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.match: Optional['Match'] = None
+        self.index = 0
+        self.simulation: Optional[GameSimulation] = None
+        self.inbox: deque = deque(maxlen=self.INBOX_SIZE)
+        self.outbox = bytearray()
+
+    def start(self, match: 'Match', index: int, simulation: GameSimulation):
+        self.match = match
+        self.index = index
+        self.simulation = simulation
+        self.inbox.clear()
+        self.ack = 0
+        self.piece = simulation.current_tetromino
+        self.piece_seq = 0
+        self.pending_garbage = 0
+        self.garbage_rng = random.Random(match.seed * 2 + index)
+        # Último estado mandado, base do próximo delta
+        self.sent_rows = (0,) * simulation.grid.height
+        self.sent_state = None
+
+    def flush(self):
+        if self.outbox and not self.writer.is_closing():
+            self.writer.write(bytes(self.outbox))
+        self.outbox.clear()
+
+
+class Match:
+    """Partida autoritativa: duas simulações headless com a mesma seed"""
+
+    def __init__(self, match_id: int, seed: int, players: List[ServerPlayer],
+                 tick_rate: Optional[int] = None):
+        self.match_id = match_id
+        self.seed = seed
+        self.players = players
+        self.tick = 0
+        for index, player in enumerate(players):
+            player.start(self, index, GameSimulation(seed=seed, tick_rate=tick_rate,
+                                                     board=NET_BOARD))
+
+    def opponent(self, player: ServerPlayer) -> ServerPlayer:
+        return self.players[1 - player.index]
+
+    def _apply_message(self, player: ServerPlayer, message: Tuple[int, int, Any]):
+        kind, seq, args = message
+        simulation = player.simulation
+        if kind == MSG_INPUT:
+            simulation.apply_input_bits(args & NET_INPUT_MASK)
+        elif args[0] == player.piece_seq:
+            # Lock de uma peça antiga é ignorado
+            place_piece(simulation, args[1], args[2])
+        player.ack = seq
+
+    def _step_player(self, player: ServerPlayer):
+        simulation = player.simulation
+        simulation.lines_cleared_last_step = 0
+        if player.inbox:
+            self._apply_message(player, player.inbox.popleft())
+        simulation.tick()
+
+        locked = simulation.current_tetromino is not player.piece
+        if locked:
+            player.piece = simulation.current_tetromino
+            player.piece_seq += 1
+
+        lines = simulation.lines_cleared_last_step
+        if lines:
+            # Linhas limpas cancelam primeiro o lixo que está chegando
+            sent = GARBAGE_LINES.get(lines, lines)
+            cancelled = min(sent, player.pending_garbage)
+            player.pending_garbage -= cancelled
+            self.opponent(player).pending_garbage += sent - cancelled
+        elif locked and player.pending_garbage and not simulation.game_over:
+            hole_x = player.garbage_rng.randrange(simulation.grid.width)
+            simulation.receive_garbage(player.pending_garbage, hole_x)
+            player.pending_garbage = 0
+
+    def _delta(self, player: ServerPlayer) -> Optional[bytes]:
+        """Quadro com o que mudou no jogador, ou None se nada mudou"""
+        simulation = player.simulation
+        tetromino = simulation.current_tetromino
+        piece = None
+        if tetromino:
+            piece = (tetromino.shape_type, tetromino.rotation_index,
+                     tetromino.position[0], tetromino.position[1])
+        score = simulation.score_manager
+        state = (player.ack, player.piece_seq, piece, score.score, score.lines_cleared,
+                 player.pending_garbage, simulation.game_over)
+
+        rows = simulation.grid.occupancy_rows()
+        sent_rows = player.sent_rows
+        rows_changed = rows is not sent_rows and rows != sent_rows
+        if not rows_changed and state == player.sent_state:
+            return None
+
+        changed = ()
+        if rows_changed:
+            changed = tuple(
+                (y, row_mask)
+                for y, (row_mask, old_mask) in enumerate(zip(rows, sent_rows))
+                if row_mask != old_mask
+            )
+            player.sent_rows = rows
+        player.sent_state = state
+        delta = MatchDelta(self.tick, player.index, player.ack, player.piece_seq, piece,
+                           score.score, score.lines_cleared, player.pending_garbage,
+                           simulation.game_over, changed)
+        return _net_frame(MSG_DELTA, encode_delta(delta))
+
+    def step(self) -> bool:
+        """Um tick da partida; retorna se ela acabou"""
+        self.tick += 1
+        for player in self.players:
+            self._step_player(player)
+        for player in self.players:
+            frame = self._delta(player)
+            if frame:
+                for receiver in self.players:
+                    receiver.outbox += frame
+        return any(player.simulation.game_over for player in self.players)
+
+
+class MatchServer:
+    """Servidor asyncio de partidas 1x1.
+
+    Os clientes mandam JOIN, depois INPUT (bits de um tick) ou LOCK (peça,
+    rotação, x). Todas as partidas rodam num único laço de ticks; a cada tick
+    os deltas de estado de cada partida vão num único write por cliente.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 tick_rate: Optional[int] = None, seed: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.tick_rate = tick_rate or GameConfiguration.GameParameters.TICK_RATE
+        self.rng = random.Random(seed)
+        self.matches: Dict[int, Match] = {}
+        self.waiting: Optional[ServerPlayer] = None
+        self.connections: Dict[ServerPlayer, asyncio.Task] = {}
+        self.next_match_id = 1
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tick_task: Optional[asyncio.Task] = None
+        # Estatísticas
+        self.ticks = 0
+        self.late_ticks = 0
+        self.tick_times: deque = deque(maxlen=100000)
+        self.matches_started = 0
+        self.matches_finished = 0
+        self.messages_in = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._handle_client, self.host, self.port, backlog=1024
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._tick_task = asyncio.ensure_future(self._tick_loop())
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Servidor de partidas em {self.host}:{self.port}")
+        await self._tick_task
+
+    async def stop(self):
+        if self._tick_task:
+            self._tick_task.cancel()
+        if self._server:
+            self._server.close()
+        for player in self.connections:
+            player.writer.close()
+        await asyncio.gather(*self.connections.values(), return_exceptions=True)
+        if self._server:
+            await self._server.wait_closed()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        player = ServerPlayer(writer)
+        self.connections[player] = asyncio.current_task()
+        try:
+            while True:
+                kind, payload = await _read_net_frame(reader)
+                self.messages_in += 1
+                if kind == MSG_JOIN:
+                    self._join(player)
+                elif player.match is None:
+                    continue
+                elif kind == MSG_INPUT:
+                    seq, bits = NET_INPUT.unpack(payload)
+                    player.inbox.append((kind, seq, bits))
+                elif kind == MSG_LOCK:
+                    seq, piece_seq, rotation, x = NET_LOCK.unpack(payload)
+                    player.inbox.append((kind, seq, (piece_seq, rotation, x)))
+        except (asyncio.IncompleteReadError, ConnectionError, struct.error):
+            pass
+        finally:
+            del self.connections[player]
+            self._leave(player)
+            writer.close()
+
+    def _join(self, player: ServerPlayer):
+        if player.match is not None or self.waiting is player:
+            return
+        opponent = self.waiting
+        if opponent is None or opponent.writer.is_closing():
+            self.waiting = player
+            return
+        self.waiting = None
+
+        match = Match(self.next_match_id, self.rng.getrandbits(63), [opponent, player],
+                      self.tick_rate)
+        self.next_match_id += 1
+        self.matches[match.match_id] = match
+        self.matches_started += 1
+        for index, seat in enumerate(match.players):
+            seat.writer.write(_net_frame(MSG_WELCOME, NET_WELCOME.pack(
+                match.match_id, index, match.seed, self.tick_rate,
+                NET_BOARD.width, NET_BOARD.height
+            )))
+
+    def _leave(self, player: ServerPlayer):
+        if self.waiting is player:
+            self.waiting = None
+        match = player.match
+        if match is not None:
+            self._finish_match(match, match.opponent(player).index)
+
+    def _finish_match(self, match: Match, winner: int):
+        frame = _net_frame(MSG_MATCH_OVER, NET_MATCH_OVER.pack(match.match_id, winner))
+        for player in match.players:
+            player.outbox += frame
+            player.flush()
+            player.match = None
+            player.simulation = None
+        del self.matches[match.match_id]
+        self.matches_finished += 1
+
+    def step(self):
+        """Um tick de todas as partidas"""
+        self.ticks += 1
+        for match in list(self.matches.values()):
+            if match.step():
+                alive = [p.index for p in match.players if not p.simulation.game_over]
+                self._finish_match(match, alive[0] if len(alive) == 1 else NO_WINNER)
+            else:
+                for player in match.players:
+                    player.flush()
+
+    async def _tick_loop(self):
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.tick_rate
+        next_tick = loop.time()
+        while True:
+            start = time.perf_counter()
+            self.step()
+            self.tick_times.append(time.perf_counter() - start)
+
+            next_tick += interval
+            delay = next_tick - loop.time()
+            if delay < 0:
+                # Atrasado: não acumula dívida de ticks
+                self.late_ticks += 1
+                next_tick = loop.time()
+            await asyncio.sleep(max(0.0, delay))
+
+    def stats(self) -> Dict[str, float]:
+        times = sorted(self.tick_times)
+        percentile = lambda q: times[min(len(times) - 1, int(len(times) * q))] * 1e3 if times else 0.0
+        return {
+            'ticks': self.ticks,
+            'late_ticks': self.late_ticks,
+            'tick_p50_ms': percentile(0.5),
+            'tick_p99_ms': percentile(0.99),
+            'tick_max_ms': times[-1] * 1e3 if times else 0.0,
+            'matches_started': self.matches_started,
+            'matches_finished': self.matches_finished,
+            'messages_in': self.messages_in,
+        }
+
+
+class MatchClient:
+    """Cliente do protocolo; remonta as grades dos dois jogadores pelos deltas"""
+
+    def __init__(self):
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.match_id: Optional[int] = None
+        self.player: Optional[int] = None
+        self.seed: Optional[int] = None
+        self.tick_rate: Optional[int] = None
+        # Tamanho da grade da partida, vindo no WELCOME (não do GameParameters local)
+        self.width: Optional[int] = None
+        self.height: Optional[int] = None
+        self.boards: List[List[int]] = []
+        self.last_delta: Dict[int, MatchDelta] = {}
+        self.winner: Optional[int] = None
+        self._seq = 0
+
+    async def connect(self, host: str, port: int):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+    def join(self):
+        self.writer.write(_net_frame(MSG_JOIN))
+
+    def send_input(self, bits: int) -> int:
+        """Manda o campo de entrada de um tick; retorna o seq para o ack"""
+        self._seq += 1
+        self.writer.write(_net_frame(MSG_INPUT, NET_INPUT.pack(self._seq, bits)))
+        return self._seq
+
+    def send_lock(self, piece_seq: int, rotation: int, x: int) -> int:
+        """Pede para soltar a peça piece_seq em (rotação, x)"""
+        self._seq += 1
+        self.writer.write(_net_frame(MSG_LOCK, NET_LOCK.pack(self._seq, piece_seq, rotation, x)))
+        return self._seq
+
+    async def receive(self) -> Tuple[int, Any]:
+        """Lê uma mensagem do servidor e atualiza o estado local"""
+        kind, payload = await _read_net_frame(self.reader)
+        if kind == MSG_WELCOME:
+            (self.match_id, self.player, self.seed, self.tick_rate,
+             self.width, self.height) = NET_WELCOME.unpack(payload)
+            self.boards = [[0] * self.height for _ in range(2)]
+            self.last_delta = {}
+            self.winner = None
+            return kind, self.match_id
+        if kind == MSG_DELTA:
+            delta = decode_delta(payload)
+            board = self.boards[delta.player]
+            for y, row_mask in delta.rows:
+                board[y] = row_mask
+            self.last_delta[delta.player] = delta
+            return kind, delta
+        if kind == MSG_MATCH_OVER:
+            _, winner = NET_MATCH_OVER.unpack(payload)
+            self.winner = None if winner == NO_WINNER else winner
+            return kind, self.winner
+        return kind, payload
+
+
+async def _run_bot(host: str, port: int, seed: int, lock_rate: float,
+                   latencies: List[float], counts: Dict[str, int]):
+    """Bot que solta cada peça numa rotação e coluna aleatórias.
+
+    Com lock_rate > 0 espera em média 1/lock_rate s antes de cada lock, como
+    um jogador humano; com 0 solta assim que recebe a peça.
+    """
+    rng = random.Random(seed)
+    client = MatchClient()
+    await client.connect(host, port)
+    try:
+        while True:
+            client.join()
+            pending = None
+            locked_piece = -1
+            while True:
+                kind, message = await client.receive()
+                if kind == MSG_MATCH_OVER:
+                    counts['matches'] += 1
+                    break
+                if kind != MSG_DELTA or message.player != client.player:
+                    continue
+                if pending and message.ack >= pending[0]:
+                    latencies.append(time.perf_counter() - pending[1])
+                    pending = None
+                if (pending is None and message.piece and not message.game_over
+                        and message.piece_seq != locked_piece):
+                    locked_piece = message.piece_seq
+                    if lock_rate:
+                        await asyncio.sleep(rng.expovariate(lock_rate))
+                    seq = client.send_lock(message.piece_seq, rng.randrange(4), rng.randrange(-1, 9))
+                    pending = (seq, time.perf_counter())
+                    counts['locks'] += 1
+    finally:
+        client.close()
+
+
+async def _run_bots(host: str, port: int, bots: int, duration: float, seed: int,
+                    lock_rate: float):
+    latencies: List[float] = []
+    counts = {'matches': 0, 'locks': 0}
+    tasks = [asyncio.ensure_future(_run_bot(host, port, seed + i, lock_rate, latencies, counts))
+             for i in range(bots)]
+    done, _ = await asyncio.wait(tasks, timeout=duration)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for task in done:
+        # Um bot que terminou antes do tempo falhou (ex.: conexão recusada)
+        if not task.cancelled() and task.exception():
+            raise task.exception()
+    return latencies, counts
+
+
+def _bot_worker(host: str, port: int, bots: int, duration: float, seed: int,
+                lock_rate: float):
+    return asyncio.run(_run_bots(host, port, bots, duration, seed, lock_rate))
+
+
+def _server_process(conn, tick_rate: Optional[int]):
+    """Servidor num processo próprio (um núcleo); para quando conn recebe algo"""
+    async def serve():
+        server = MatchServer(tick_rate=tick_rate)
+        await server.start()
+        conn.send(server.port)
+        await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+        await server.stop()
+        conn.send(server.stats())
+    asyncio.run(serve())
+
+
+def run_loopback_harness(bots: int = 200, duration: float = 10.0, workers: int = 1,
+                         tick_rate: Optional[int] = None, seed: int = 0,
+                         lock_rate: float = 0.0) -> Dict[str, float]:
+    """Roda bots contra um servidor local e mede vazão e latência por tick.
+
+    O servidor fica sozinho num processo; os bots são divididos entre workers
+    processos. A latência é o tempo entre mandar um LOCK e receber o delta
+    que o confirma (inclui a espera pelo próximo tick do servidor).
+    """
+    conn, server_conn = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=_server_process, args=(server_conn, tick_rate))
+    server.start()
+    port = conn.recv()
+
+    workers = max(1, min(workers, bots))
+    shares = [bots // workers + (i < bots % workers) for i in range(workers)]
+    latencies: List[float] = []
+    matches = locks = 0
+    try:
+        with futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = [
+                pool.submit(_bot_worker, '127.0.0.1', port, share, duration,
+                            seed + i * bots, lock_rate)
+                for i, share in enumerate(shares)
+            ]
+            for future in pending:
+                worker_latencies, counts = future.result()
+                latencies.extend(worker_latencies)
+                matches += counts['matches']
+                locks += counts['locks']
+    finally:
+        conn.send('stop')
+        server_stats = conn.recv()
+        server.join()
+
+    latencies.sort()
+    percentile = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1e3 if latencies else 0.0
+    return {
+        'bots': bots,
+        'duration_s': duration,
+        # Cada partida termina para os dois bots
+        'matches_per_s': matches / 2 / duration,
+        'locks_per_s': locks / duration,
+        'latency_p50_ms': percentile(0.5),
+        'latency_p99_ms': percentile(0.99),
+        **{f'server_{name}': value for name, value in server_stats.items()},
+    }
+
 
 #controles
 class InputHandler:
-    
-    def __init__(self):
-        self.key_map = {
-            pg.K_LEFT: 'left',
-            pg.K_a: 'left',
-            pg.K_RIGHT: 'right', 
-            pg.K_d: 'right',
-            pg.K_DOWN: 'down',
-            pg.K_s: 'down',
-            pg.K_UP: 'rotate_cw',
-            pg.K_e: 'rotate_cw',
-            pg.K_q: 'rotate_ccw',
-            pg.K_SPACE: 'hard_drop',
-            pg.K_ESCAPE: 'quit',
-            pg.K_p: 'pause',
-            pg.K_r: 'restart'
+    """Entrada por eventos KEYDOWN/KEYUP, consumida nos ticks de passo fixo.
+
+    Os eventos que run() drena vão para uma fila com horário de chegada.
+    Cada tick consome a fila em ordem; um segundo aperto da mesma ação fica
+    para o tick seguinte, então nenhum toque se perde, seja qual for a taxa
+    de quadros, e toda tecla vale no primeiro tick depois de chegar.
+    LEFT/RIGHT/DOWN seguros repetem com DAS/ARR contados em ticks.
+    """
+
+    REPEATABLE_ACTIONS = (GameAction.LEFT, GameAction.RIGHT, GameAction.DOWN)
+
+    def __init__(self, tick_rate: Optional[int] = None, clock=time.perf_counter):
+        self.key_map: Dict[int, GameAction] = {
+            pg.K_LEFT: GameAction.LEFT,
+            pg.K_a: GameAction.LEFT,
+            pg.K_RIGHT: GameAction.RIGHT,
+            pg.K_d: GameAction.RIGHT,
+            pg.K_DOWN: GameAction.DOWN,
+            pg.K_s: GameAction.DOWN,
+            pg.K_UP: GameAction.ROTATE_CW,
+            pg.K_e: GameAction.ROTATE_CW,
+            pg.K_q: GameAction.ROTATE_CCW,
+            pg.K_SPACE: GameAction.HARD_DROP,
+            pg.K_ESCAPE: GameAction.QUIT,
+            pg.K_p: GameAction.PAUSE,
+            pg.K_r: GameAction.RESTART
         }
-        
-        self.key_states = {}
-        self.key_pressed = {}
-        
-    def update(self):
-    
-        current_keys = pg.key.get_pressed()
-        
+        # Índice reverso ação -> teclas
+        self.action_keys: Dict[GameAction, Tuple[int, ...]] = {}
         for key_code, action in self.key_map.items():
-            current_state = current_keys[key_code] if key_code < len(current_keys) else False
-            previous_state = self.key_states.get(key_code, False)
-            
-            self.key_pressed[action] = current_state and not previous_state
-            self.key_states[key_code] = current_state
-    
-    def is_pressed(self, action: str) -> bool:
-        
-        return self.key_pressed.get(action, False)
-    
-    def is_held(self, action: str) -> bool:
-        
-        key_code = next((k for k, v in self.key_map.items() if v == action), None)
-        if key_code:
-            return self.key_states.get(key_code, False)
-        return False
+            self.action_keys[action] = self.action_keys.get(action, ()) + (key_code,)
+
+        self.clock = clock
+        # (horário de chegada, ação, tecla, apertou?)
+        self.queue: deque = deque()
+        self.held_keys: Dict[GameAction, set] = {action: set() for action in self.action_keys}
+        self.quit_requested = False
+        self.last_bits = 0
+        self.last_latency = 0.0
+        self._held_ticks: Dict[GameAction, int] = {}
+        self.set_tick_rate(tick_rate or GameConfiguration.GameParameters.TICK_RATE)
+
+    def set_tick_rate(self, tick_rate: int):
+        """Converte DAS/ARR de ms para ticks"""
+        settings = GameConfiguration.WindowSettings
+        self.das_ticks = max(1, round(settings.DAS_MS * tick_rate / 1000))
+        self.arr_ticks = max(1, round(settings.ARR_MS * tick_rate / 1000))
+
+    def handle_event(self, event) -> bool:
+        """Enfileira KEYDOWN/KEYUP das teclas mapeadas; retorna se usou o evento"""
+        if event.type not in (pg.KEYDOWN, pg.KEYUP):
+            return False
+        action = self.key_map.get(event.key)
+        if action is None:
+            return False
+        pressed = event.type == pg.KEYDOWN
+        if action is GameAction.QUIT:
+            self.quit_requested = self.quit_requested or pressed
+            return True
+        self.queue.append((self.clock(), action, event.key, pressed))
+        return True
+
+    def tick_bits(self) -> int:
+        """Campo de INPUT_BITS de um tick: apertos da fila + auto-repeat"""
+        bits = 0
+        pressed_now = set()
+        queue = self.queue
+        while queue:
+            timestamp, action, key_code, pressed = queue[0]
+            if pressed:
+                if action in pressed_now:
+                    break
+                pressed_now.add(action)
+                self.held_keys[action].add(key_code)
+                self._held_ticks[action] = 0
+                bits |= INPUT_BITS[action]
+                self.last_latency = self.clock() - timestamp
+            else:
+                self.held_keys[action].discard(key_code)
+            queue.popleft()
+
+        for action in self.REPEATABLE_ACTIONS:
+            if action in pressed_now:
+                continue
+            if not self.held_keys[action]:
+                self._held_ticks.pop(action, None)
+                continue
+            held = self._held_ticks.get(action, 0) + 1
+            self._held_ticks[action] = held
+            if held >= self.das_ticks and (held - self.das_ticks) % self.arr_ticks == 0:
+                bits |= INPUT_BITS[action]
+
+        self.last_bits = bits
+        return bits
+
+    def clear(self):
+        """Esquece fila e teclas seguras (ex.: janela perdeu o foco)"""
+        self.queue.clear()
+        for keys in self.held_keys.values():
+            keys.clear()
+        self._held_ticks.clear()
+
+    def is_pressed(self, action) -> bool:
+        """Se a ação entrou no último tick"""
+        bit = INPUT_BITS.get(GameAction(action), 0)
+        return bool(self.last_bits & bit)
+
+    def is_held(self, action) -> bool:
+        return bool(self.held_keys.get(GameAction(action)))
 
 class MouseHandler:
     
@@ -463,37 +3964,363 @@ class MouseHandler:
             return self.position
         return None
 
+#audio
+class AudioSystem:
+    """Mixer, música e efeitos sonoros carregados numa thread de fundo.
+
+    A thread inicia o mixer, decodifica os efeitos (AudioSettings) para a
+    memória e começa a música; até lá, ou sem dispositivo de áudio, play()
+    não faz nada. attach() liga os eventos de EVENT_SOUNDS aos efeitos, e
+    tocar um efeito na thread principal é só escolher um canal do pool.
+    """
+
+    EVENT_SOUNDS: Dict[GameEventType, str] = {
+        GameEventType.SHAPE_ROTATED: 'rotate',
+        GameEventType.SHAPE_LOCKED: 'lock',
+        GameEventType.LINE_CLEARED: 'clear',
+        GameEventType.LEVEL_CHANGED: 'level',
+        GameEventType.GAME_OVER: 'game_over',
+    }
+
+    def __init__(self, startup: Optional['StartupTimer'] = None):
+        self.startup = startup
+        self.available = False
+        # Sem som enquanto True (ex.: ticks pulados ao navegar num replay)
+        self.muted = False
+        self._sounds: Dict[str, Any] = {}
+        self._channels: list = []
+        self._next_channel = 0
+        self._dispatcher: Optional[EventDispatcher] = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._load, name='audio', daemon=True)
+        self._thread.start()
+
+    def _load(self):
+        start = time.perf_counter()
+        settings = GameConfiguration.AudioSettings
+        try:
+            pg.mixer.init(frequency=settings.FREQUENCY, size=-16, channels=2,
+                          buffer=settings.BUFFER)
+            print("Mixer inicializado com sucesso")
+            pg.mixer.set_num_channels(settings.SFX_CHANNELS)
+            channels = [pg.mixer.Channel(i) for i in range(settings.SFX_CHANNELS)]
+            sounds = {}
+            for name, (notes, duration_ms) in settings.SFX_TONES.items():
+                sound = self._load_sound(name) or self._make_tone(notes, duration_ms)
+                if sound is not None:
+                    sound.set_volume(settings.SFX_VOLUME)
+                    sounds[name] = sound
+            self._channels = channels
+            self._sounds = sounds
+            self.available = True
+            self._start_music(settings)
+        except Exception as e:
+            # Sem dispositivo (CI, servidor): o jogo segue mudo
+            print(f"Erro ao configurar áudio: {e}")
+        finally:
+            self._ready.set()
+            if self.startup:
+                self.startup.record('áudio (fundo)', time.perf_counter() - start)
+
+    def _load_sound(self, name: str):
+        sfx_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               GameConfiguration.AudioSettings.SFX_DIR)
+        for extension in ('.ogg', '.wav'):
+            path = os.path.join(sfx_dir, name + extension)
+            if os.path.exists(path):
+                try:
+                    return pg.mixer.Sound(path)
+                except pg.error as e:
+                    print(f"Erro ao carregar efeito {path}: {e}")
+        return None
+
+    @staticmethod
+    def _make_tone(notes: Tuple[int, ...], duration_ms: int):
+        """Notas em sequência com decaimento linear, no formato do mixer"""
+        frequency, size, channels = pg.mixer.get_init()
+        if size != -16:
+            return None
+        note_samples = frequency * duration_ms // (1000 * len(notes))
+        samples = array('h')
+        for note in notes:
+            step = 2 * math.pi * note / frequency
+            for i in range(note_samples):
+                value = int(12000 * (1 - i / note_samples) * math.sin(step * i))
+                samples.extend((value,) * channels)
+        return pg.mixer.Sound(buffer=samples.tobytes())
+
+    def _start_music(self, settings):
+        music_file = settings.MUSIC_FILE
+        if not os.path.exists(music_file):
+            print("Nenhum arquivo de música encontrado")
+            return
+        try:
+            pg.mixer.music.load(music_file)
+        except pg.error as e:
+            print(f"Erro ao carregar música: {e}")
+            return
+        print(f"Música carregada: {music_file}")
+        pg.mixer.music.set_volume(settings.MUSIC_VOLUME)
+        pg.mixer.music.play(-1)  # -1 para loop infinito
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def play(self, name: str):
+        """Toca um efeito já carregado; sem áudio ou antes da carga não faz nada"""
+        sound = self._sounds.get(name)
+        channels = self._channels
+        count = len(channels)
+        # SFX_CHANNELS = 0 desliga os efeitos
+        if sound is None or self.muted or count == 0:
+            return
+        index = self._next_channel
+        for offset in range(count):
+            if not channels[(index + offset) % count].get_busy():
+                index = (index + offset) % count
+                break
+        # Todas ocupadas: corta a voz do canal da vez
+        channels[index].play(sound)
+        self._next_channel = (index + 1) % count
+
+    def _on_event(self, event: GameEvent):
+        name = self.EVENT_SOUNDS[event.event_type]
+        if name == 'clear' and event.data.get('lines', 0) >= 4:
+            name = 'tetris'
+        self.play(name)
+
+    def attach(self, dispatcher: EventDispatcher):
+        """Liga os eventos de EVENT_SOUNDS aos efeitos (listeners síncronos)"""
+        self.detach()
+        for event_type in self.EVENT_SOUNDS:
+            dispatcher.add_listener(event_type, self._on_event)
+        self._dispatcher = dispatcher
+
+    def detach(self):
+        if self._dispatcher is not None:
+            for event_type in self.EVENT_SOUNDS:
+                self._dispatcher.remove_listener(event_type, self._on_event)
+            self._dispatcher = None
+
+    def close(self):
+        self.detach()
+        self._thread.join(1.0)
+
+
 #render
+class FontLoader:
+    """Carrega a fonte do jogo numa thread de fundo.
+
+    A thread acha o arquivo (FONT_FILE ou a busca de SysFont, que varre as
+    fontes do sistema) e lê os bytes; a thread principal só cria as fontes a
+    partir da memória. Até lá load() devolve a fonte padrão do pygame, e
+    revision muda quando a fonte final fica pronta.
+    """
+
+    def __init__(self, name: Optional[str] = None, path: Optional[str] = None,
+                 startup: Optional['StartupTimer'] = None):
+        self.name = name
+        self.path = path
+        self.startup = startup
+        self.revision = 0
+        self._data: Optional[bytes] = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._resolve, name='font-loader', daemon=True)
+        self._thread.start()
+
+    def _resolve(self):
+        start = time.perf_counter()
+        try:
+            path = self.path if self.path and os.path.exists(self.path) else None
+            if path is None and self.name:
+                path = pg.font.match_font(self.name)
+            self.path = path
+            if path:
+                with open(path, 'rb') as font_file:
+                    self._data = font_file.read()
+                self.revision += 1
+        except (OSError, ImportError) as e:
+            print(f"Erro ao carregar fonte: {e}")
+        finally:
+            self._ready.set()
+            if self.startup:
+                self.startup.record('fonte (fundo)', time.perf_counter() - start)
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def load(self, size: int):
+        if not pg.font.get_init():
+            pg.font.init()
+        if self._data is None:
+            return pg.font.Font(None, size)
+        return pg.font.Font(io.BytesIO(self._data), size)
+
+
 class RenderSystem:
     
-    def __init__(self, window_size: Tuple[int, int], tile_size: int):
+    def __init__(self, window_size: Tuple[int, int], tile_size: int,
+                 font_loader: Optional[FontLoader] = None):
         self.window_size = window_size
         self.tile_size = tile_size
+        # Escala dos painéis e textos; o tile da grade muda em fit_board()
+        self.ui_tile = tile_size
+        self.preview_tile = tile_size
+        self.board_size = (GameConfiguration.WindowSettings.GRID_WIDTH,
+                           GameConfiguration.WindowSettings.GRID_HEIGHT)
         self.colors = GameConfiguration.ColorSystem.get_color_palette()
+        if font_loader is None:
+            settings = GameConfiguration.WindowSettings
+            font_loader = FontLoader(settings.FONT_NAME, settings.FONT_FILE)
+        self.font_loader = font_loader
+        self._font_revision = font_loader.revision
         self.font_cache = {}
+        # LRU de textos renderizados: (texto, tamanho, cor) -> Surface
+        self.text_cache = OrderedDict()
+        self.text_cache_size = 128
+        self._overlays: Dict[int, pg.Surface] = {}
+        self._score_key = None
+        self._score_texts: List[pg.Surface] = []
+        self.block_sprites: Dict[str, pg.Surface] = {}
+        self.ghost_sprites: Dict[str, pg.Surface] = {}
+        self.preview_sprites: Dict[str, pg.Surface] = {}
+        self.show_ghost = GameConfiguration.WindowSettings.SHOW_GHOST_PIECE
+        self._ghost_key = None
+        self._ghost_row = 0
+        self._build_block_atlas()
+
+    def _build_block_atlas(self):
+        """Pré-renderiza um bloco com bisel por código de cor"""
+        code_mapping = GameConfiguration.ColorSystem.get_color_code_mapping()
+        converted = pg.display.get_surface() is not None
+        self.block_sprites = {}
+        self.ghost_sprites = {}
+        self.preview_sprites = {}
+        for code, color_name in code_mapping.items():
+            sprite = pg.Surface((self.tile_size, self.tile_size))
+            self.draw_block(sprite, 0, 0, self.colors[color_name])
+            self.block_sprites[code] = sprite.convert() if converted else sprite
+
+            if self.preview_tile == self.tile_size:
+                self.preview_sprites[code] = self.block_sprites[code]
+            else:
+                sprite = pg.Surface((self.preview_tile, self.preview_tile))
+                self.draw_block(sprite, 0, 0, self.colors[color_name], self.preview_tile)
+                self.preview_sprites[code] = sprite.convert() if converted else sprite
+
+            # Fantasma: só o contorno, o resto transparente (colorkey)
+            ghost = pg.Surface((self.tile_size, self.tile_size))
+            ghost.fill(self.colors['PRETO'])
+            pg.draw.rect(ghost, self.colors[color_name],
+                         (2, 2, self.tile_size - 3, self.tile_size - 3), 2)
+            ghost = ghost.convert() if converted else ghost
+            ghost.set_colorkey(self.colors['PRETO'])
+            self.ghost_sprites[code] = ghost
+        self._fallback_sprite = self.block_sprites['x']
+
+    def set_tile_size(self, tile_size: int):
+        """Muda o tamanho do tile e refaz o atlas de blocos"""
+        if tile_size != self.tile_size:
+            self.tile_size = tile_size
+            self._build_block_atlas()
+            self._score_key = None
+
+    def fit_board(self, width: int, height: int, preview_size: Tuple[int, int] = (4, 2)):
+        """Escolhe o tile da grade para ela caber na janela ao lado dos painéis.
+
+        preview_size é a maior peça (largura, altura) mostrada no preview,
+        que precisa caber na caixa de 4x3 tiles dos painéis.
+        """
+        settings = GameConfiguration.WindowSettings
+        panel_width = (settings.SCREEN_MULTIPLIER_X - settings.GRID_WIDTH) * self.ui_tile
+        tile = min(self.ui_tile,
+                   (self.window_size[0] - panel_width) // width,
+                   self.window_size[1] // height)
+        self.board_size = (width, height)
+        preview_tile = min(self.ui_tile, self.ui_tile * 4 // preview_size[0],
+                           self.ui_tile * 3 // preview_size[1])
+        if preview_tile != self.preview_tile:
+            self.preview_tile = preview_tile
+            self._build_block_atlas()
+        self.set_tile_size(max(tile, settings.MIN_TILE_SIZE))
+
+    @property
+    def show_grid_lines(self) -> bool:
+        return self.tile_size >= GameConfiguration.WindowSettings.GRID_LINES_MIN_TILE
+
+    @property
+    def panel_x(self) -> int:
+        """Borda direita da grade, onde começam os painéis"""
+        return self.board_size[0] * self.tile_size
+
+    def get_block_sprite(self, color_code: str) -> pg.Surface:
+        return self.block_sprites.get(color_code, self._fallback_sprite)
+
+    def draw_locked_cells(self, surface: pg.Surface, grid: GameGrid):
+        """Todas as células fixas numa única chamada a Surface.blits"""
+        tile = self.tile_size
+        sprites = self.block_sprites
+        fallback = self._fallback_sprite
+        surface.blits(
+            [(sprites.get(code, fallback), (x * tile, y * tile))
+             for x, y, code in grid.iter_filled_cells()],
+            doreturn=False
+        )
         
     def get_font(self, size: int, bold: bool =False):
         
         key = (size, bold)
         if key not in self.font_cache:
-            self.font_cache[key] = pg.font.SysFont("Russo One", size, bold=False)
+            self.font_cache[key] = self.font_loader.load(size)
         return self.font_cache[key]
+
+    def refresh_fonts(self) -> bool:
+        """Troca para a fonte final quando ela termina de carregar"""
+        if self.font_loader.revision == self._font_revision:
+            return False
+        self._font_revision = self.font_loader.revision
+        self.font_cache.clear()
+        self.text_cache.clear()
+        self._score_key = None
+        return True
+
+    def render_text(self, text: str, size: int, color: Tuple[int, int, int]) -> pg.Surface:
+        """font.render com cache LRU limitado"""
+        key = (text, size, color)
+        cache = self.text_cache
+        rendered = cache.get(key)
+        if rendered is None:
+            rendered = self.get_font(size).render(text, True, color)
+            cache[key] = rendered
+            if len(cache) > self.text_cache_size:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(key)
+        return rendered
+
+    def get_overlay(self, alpha: int) -> pg.Surface:
+        """Overlay translúcido da janela inteira, criado uma vez por alpha"""
+        overlay = self._overlays.get(alpha)
+        if overlay is None:
+            overlay = pg.Surface(self.window_size, pg.SRCALPHA)
+            overlay.fill((0, 0, 0, alpha))
+            self._overlays[alpha] = overlay
+        return overlay
     
     def draw_grid(self, surface: pg.Surface, grid: GameGrid, factory: TetrominoFactory):
         
         # Desenha célula preenchidas
-        for y in range(grid.height):
-            for x in range(grid.width):
-                if grid.cells[y][x]:
-                    color_code = grid.cells[y][x]
-                    color = factory.get_color_by_code(color_code)
-                    
-                    self.draw_block(
-                        surface,
-                        x * self.tile_size,
-                        y * self.tile_size,
-                        color
-                    )
+        self.draw_locked_cells(surface, grid)
+        if not self.show_grid_lines:
+            return
         
         for x in range(grid.width + 1):
             pg.draw.line(
@@ -513,21 +4340,26 @@ class RenderSystem:
                 1
             )
     
-    def draw_block(self, surface: pg.Surface, x: int, y: int, color: Tuple[int, int, int]):
-        """Desenha um bloco individual"""
+    def draw_block(self, surface: pg.Surface, x: int, y: int, color: Tuple[int, int, int],
+                   size: Optional[int] = None):
+        """Desenha um bloco individual (size padrão: o tile da grade)"""
+        size = size or self.tile_size
         # Bloco principal
         pg.draw.rect(
             surface,
             color,
-            (x, y, self.tile_size, self.tile_size)
+            (x, y, size, size)
         )
+        if size < 8:
+            # Tile pequeno demais para bisel
+            return
         
         # Borda interna ç
         highlight_color = tuple(min(c + 40, 255) for c in color)
         pg.draw.rect(
             surface,
             highlight_color,
-            (x + 2, y + 2, self.tile_size - 4, self.tile_size - 4),
+            (x + 2, y + 2, size - 4, size - 4),
             2
         )
         
@@ -536,73 +4368,96 @@ class RenderSystem:
         pg.draw.rect(
             surface,
             shadow_color,
-            (x + self.tile_size - 3, y + 2, 2, self.tile_size - 4)
+            (x + size - 3, y + 2, 2, size - 4)
         )
         pg.draw.rect(
             surface,
             shadow_color,
-            (x + 2, y + self.tile_size - 3, self.tile_size - 4, 2)
+            (x + 2, y + size - 3, size - 4, 2)
         )
     
-    def draw_tetromino(self, surface: pg.Surface, tetromino: ActiveTetromino):
+    def ghost_row(self, tetromino: ActiveTetromino, grid: GameGrid) -> int:
+        """Linha de pouso da peça, recalculada só quando x, rotação ou grade mudam.
+
+        Cair pela gravidade não muda o pouso (a peça segue o mesmo caminho).
+        """
+        key = (tetromino.shape_type, tetromino.rotation_index,
+               tetromino.position[0], grid.revision)
+        if key != self._ghost_key:
+            self._ghost_key = key
+            self._ghost_row = grid.landing_row(tetromino)
+        return self._ghost_row
+
+    def ghost_cells(self, tetromino: ActiveTetromino, grid: GameGrid) -> List[Tuple[int, int]]:
+        """Células (x, y) da peça fantasma"""
+        row = self.ghost_row(tetromino, grid)
+        pos_x = tetromino.position[0]
+        return [(pos_x + x, row + y) for x, y in tetromino.get_collision_mask().cells]
+
+    def draw_ghost(self, surface: pg.Surface, tetromino: ActiveTetromino, grid: GameGrid):
+        """Contorno de onde a peça vai cair"""
+        sprite = self.ghost_sprites.get(tetromino.color_code, self._fallback_sprite)
+        tile = self.tile_size
+        surface.blits(
+            [(sprite, (x * tile, y * tile)) for x, y in self.ghost_cells(tetromino, grid)],
+            doreturn=False
+        )
+
+    def draw_tetromino(self, surface: pg.Surface, tetromino: ActiveTetromino,
+                       offset_y: int = 0):
         #tertis ativo
-        shape_def = tetromino.get_current_shape()
-        color = tetromino.factory.get_color_by_code(tetromino.color_code)
-        
-        for y, row in enumerate(shape_def.shape_matrix):
-            for x, cell in enumerate(row):
-                if cell:
-                    block_x = (tetromino.position[0] + x) * self.tile_size
-                    block_y = (tetromino.position[1] + y) * self.tile_size
-                    self.draw_block(surface, block_x, block_y, color)
+        sprite = self.get_block_sprite(tetromino.color_code)
+        tile = self.tile_size
+        pos_x, pos_y = tetromino.position
+        surface.blits(
+            [(sprite, ((pos_x + x) * tile, (pos_y + y) * tile + offset_y))
+             for x, y in tetromino.get_collision_mask().cells],
+            doreturn=False
+        )
     
-    def draw_preview(self, surface: pg.Surface, preview_shapes: List[TetrominoType], 
+    def draw_preview(self, surface: pg.Surface, preview_shapes: Sequence[TetrominoType], 
                     factory: TetrominoFactory):
         """Draw das proximas peças"""
-        start_x = 10 * self.tile_size + 60
+        ui_tile = self.ui_tile
+        tile = self.preview_tile
+        start_x = self.panel_x + 60
         start_y = 50
         
         # Título
-        title_font = self.get_font(self.tile_size // 2, True)
-        title_text = title_font.render("PRÓXIMO BLOCO", True, self.colors['WHITE'])
+        title_text = self.render_text("PRÓXIMO BLOCO", ui_tile // 2, self.colors['WHITE'])
         surface.blit(title_text, (start_x, start_y - 40))
         
         for i, shape_type in enumerate(preview_shapes[:4]):
             shape_def = factory.get_definition(shape_type)
-            color = factory.get_color_by_code(
-                {'YELLOW': 'y', 'LIGHT_BLUE': 'l', 'PURPLE': 'p', 
-                 'ORANGE': 'o', 'BLUE': 'b', 'GREEN': 'g', 'RED': 'r'}[shape_def.color_name]
-            )
+            sprite = self.preview_sprites.get(factory.color_codes[shape_type],
+                                              self.preview_sprites['x'])
             
-            preview_y = start_y + i * (self.tile_size * 3 + 10)
+            preview_y = start_y + i * (ui_tile * 3 + 10)
             pg.draw.rect(
                 surface,
                 self.colors['DARK_GRAY'],
-                (start_x - 10, preview_y - 10, self.tile_size * 4 + 20, self.tile_size * 3 + 20),
+                (start_x - 10, preview_y - 10, ui_tile * 4 + 20, ui_tile * 3 + 20),
                 border_radius=5
             )
             
             # DRAW NA PEÇA DO CENTRO
-            shape_width = len(shape_def.shape_matrix[0]) * self.tile_size
-            shape_height = len(shape_def.shape_matrix) * self.tile_size
+            shape_width = len(shape_def.shape_matrix[0]) * tile
+            shape_height = len(shape_def.shape_matrix) * tile
             
-            offset_x = start_x + (self.tile_size * 4 - shape_width) // 2
-            offset_y = preview_y + (self.tile_size * 3 - shape_height) // 2
+            offset_x = start_x + (ui_tile * 4 - shape_width) // 2
+            offset_y = preview_y + (ui_tile * 3 - shape_height) // 2
             
-            for y, row in enumerate(shape_def.shape_matrix):
-                for x, cell in enumerate(row):
-                    if cell:
-                        block_x = offset_x + x * self.tile_size
-                        block_y = offset_y + y * self.tile_size
-                        self.draw_block(surface, block_x, block_y, color)
+            surface.blits(
+                [(sprite, (offset_x + x * tile, offset_y + y * tile))
+                 for x, y in shape_def.rotation_masks[0].cells],
+                doreturn=False
+            )
     
     def draw_score_panel(self, surface: pg.Surface, score_manager: ScoreManager):
         """DRAW PONTOS"""
-        panel_x = 10 * self.tile_size + 20
+        panel_x = self.panel_x + 20
         panel_y = 300
         
-        font = self.get_font(self.tile_size // 2)
-        
         # Fundo do painel
         pg.draw.rect(
             surface,
@@ -611,28 +4466,36 @@ class RenderSystem:
             border_radius=5
         )
         
-        info_lines = [
-            f"PONTOS: {score_manager.score}",
-            f"NÍVEL: {score_manager.level}",
-            f"LINHAS: {score_manager.lines_cleared}",
-            f"COMBO: x{score_manager.combo}",
-            f"MULT. : x{score_manager.multiplier:.1f}"
-        ]
-        
-        for i, line in enumerate(info_lines):
-            text = font.render(line, True, self.colors['WHITE'])
-            surface.blit(text, (panel_x, panel_y + i * 25))
+        # Só refaz os textos quando algum valor do placar muda
+        score_key = (score_manager.score, score_manager.level, score_manager.lines_cleared,
+                     score_manager.combo, score_manager.multiplier)
+        if score_key != self._score_key:
+            info_lines = [
+                f"PONTOS: {score_manager.score}",
+                f"NÍVEL: {score_manager.level}",
+                f"LINHAS: {score_manager.lines_cleared}",
+                f"COMBO: x{score_manager.combo}",
+                f"MULT. : x{score_manager.multiplier:.1f}"
+            ]
+            self._score_texts = [
+                self.render_text(line, self.ui_tile // 2, self.colors['WHITE'])
+                for line in info_lines
+            ]
+            self._score_key = score_key
+
+        surface.blits(
+            [(text, (panel_x, panel_y + i * 25)) for i, text in enumerate(self._score_texts)],
+            doreturn=False
+        )
     
-    def draw_game_over(self, surface: pg.Surface, score: int):
-        overlay = pg.Surface(self.window_size, pg.SRCALPHA)
-        overlay.fill((0, 0, 0, 180))
-        surface.blit(overlay, (0, 0))
-        
-        large_font = self.get_font(self.tile_size * 2, True)
-        medium_font = self.get_font(self.tile_size, True)
-        
+    def draw_game_over(self, surface: pg.Surface, score: int, best_score: Optional[int] = None):
+        surface.blit(self.get_overlay(180), (0, 0))
+
+        large_size = self.ui_tile * 2
+        medium_size = self.ui_tile
+
         # game Over.
-        game_over_text = large_font.render("GAME OVER", True, self.colors['RED'])
+        game_over_text = self.render_text("GAME OVER", large_size, self.colors['RED'])
         surface.blit(
             game_over_text,
             (self.window_size[0] // 2 - game_over_text.get_width() // 2,
@@ -640,15 +4503,25 @@ class RenderSystem:
         )
         
         # Pontos finais
-        score_text = medium_font.render(f"Pontuação Final: {score}", True, self.colors['GREEN'])
+        score_text = self.render_text(f"Pontuação Final: {score}", medium_size, self.colors['GREEN'])
         surface.blit(
             score_text,
             (self.window_size[0] // 2 - score_text.get_width() // 2,
              self.window_size[1] // 2)
         )
+
+        # Recorde salvo nas estatísticas
+        if best_score is not None:
+            best_text = self.render_text(f"Recorde: {best_score}", medium_size * 3 // 4,
+                                         self.colors['WHITE'])
+            surface.blit(
+                best_text,
+                (self.window_size[0] // 2 - best_text.get_width() // 2,
+                 self.window_size[1] * 7 // 12)
+            )
         
         # Instruções
-        restart_text = medium_font.render("Pressione R para reiniciar", True, self.colors['YELLOW'])
+        restart_text = self.render_text("Pressione R para reiniciar", medium_size, self.colors['YELLOW'])
         surface.blit(
             restart_text,
             (self.window_size[0] // 2 - restart_text.get_width() // 2,
@@ -656,12 +4529,9 @@ class RenderSystem:
         )
         
     def draw_pause_screen(self, surface: pg.Surface):
-        overlay = pg.Surface(self.window_size, pg.SRCALPHA)
-        overlay.fill((0, 0, 0, 150))
-        surface.blit(overlay, (0, 0))
-        
-        font = self.get_font(self.tile_size * 2, True)
-        pause_text = font.render("PAUSADO", True, self.colors['BLUE'])
+        surface.blit(self.get_overlay(150), (0, 0))
+
+        pause_text = self.render_text("PAUSADO", self.ui_tile * 2, self.colors['BLUE'])
         surface.blit(
             pause_text,
             (self.window_size[0] // 2 - pause_text.get_width() // 2,
@@ -669,238 +4539,656 @@ class RenderSystem:
         )
 
 
-class TetrisGameEngine:
-    def _setup_audio(self):
-        try:
-            pg.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
-            print("Mixer inicializado com sucesso")
-            
-            music_files = [
-                'tetris_music.mp3',]
-            
-            music_loaded = False
-            for music_file in music_files:
-                try:
-                    if os.path.exists(music_file):
-                        pg.mixer.music.load(music_file)
-                        print(f"Música carregada: {music_file}")
-                        music_loaded = True
-                        break
-                except:
-                    continue
-            
-            if music_loaded:
-                pg.mixer.music.set_volume(0.3)
-                pg.mixer.music.play(-1)  # -1 para loop infinito
-                
+class DirtyRectRenderer:
+    """Renderização retida com retângulos sujos.
+
+    O fundo com as linhas da grade e a camada de blocos fixos ficam em
+    Surfaces de cache, refeitas só quando a grade muda (GameGrid.revision).
+    A cada quadro só os tiles antigos e novos da peça ativa e os painéis que
+    mudaram são redesenhados, e apenas esses rects vão para
+    pg.display.update.
+    """
+
+    def __init__(self, renderer: RenderSystem):
+        self.renderer = renderer
+        self.background: Optional[pg.Surface] = None
+        self.grid_lines: Optional[pg.Surface] = None
+        self.board_layer: Optional[pg.Surface] = None
+        self.board_rect: Optional[pg.Rect] = None
+        self.panel_rect: Optional[pg.Rect] = None
+        self._grid_revision = None
+        self._piece_rects: List[pg.Rect] = []
+        self._panel_key = None
+        self._overlay_key = None
+        self._tile_size = renderer.tile_size
+        self._needs_full_redraw = True
+        # Área desenhada por cima depois do render (overlay do profiler)
+        self.overlay_rect: Optional[pg.Rect] = None
+
+    def invalidate(self):
+        """Força redesenho completo no próximo quadro (ex.: tamanho mudou)"""
+        self.background = None
+        self._needs_full_redraw = True
+
+    def _build_layers(self, grid: GameGrid):
+        tile = self.renderer.tile_size
+        colors = self.renderer.colors
+        window_w, window_h = self.renderer.window_size
+
+        board_size = (grid.width * tile + 1, grid.height * tile + 1)
+        # Linhas da grade numa camada transparente (ficam por cima dos blocos)
+        self.grid_lines = pg.Surface(board_size)
+        self.grid_lines.fill(colors['PRETO'])
+        self.grid_lines.set_colorkey(colors['PRETO'])
+        if self.renderer.show_grid_lines:
+            for x in range(grid.width + 1):
+                pg.draw.line(self.grid_lines, colors['GRID_LINE'],
+                             (x * tile, 0), (x * tile, grid.height * tile), 1)
+            for y in range(grid.height + 1):
+                pg.draw.line(self.grid_lines, colors['GRID_LINE'],
+                             (0, y * tile), (grid.width * tile, y * tile), 1)
+
+        self.background = pg.Surface(self.renderer.window_size)
+        self.background.fill(colors['BACKGROUND'])
+        self.background.blit(self.grid_lines, (0, 0))
+
+        board_w = grid.width * tile + 1
+        self.board_rect = pg.Rect(0, 0, board_w, grid.height * tile + 1)
+        self.panel_rect = pg.Rect(board_w, 0, window_w - board_w, window_h)
+        self.board_layer = pg.Surface(self.board_rect.size)
+        self._grid_revision = None
+
+    def _rebuild_board_layer(self, grid: GameGrid, factory: TetrominoFactory):
+        self.board_layer.fill(self.renderer.colors['BACKGROUND'])
+        self.renderer.draw_locked_cells(self.board_layer, grid)
+        self.board_layer.blit(self.grid_lines, (0, 0))
+        self._grid_revision = grid.revision
+
+    def _piece_tile_rects(self, tetromino: Optional[ActiveTetromino],
+                          grid: GameGrid, offset_y: int = 0) -> List[pg.Rect]:
+        """Tiles da peça ativa e, se ligado, da peça fantasma"""
+        if tetromino is None:
+            return []
+        tile = self.renderer.tile_size
+        pos_x, pos_y = tetromino.position
+        rects = [
+            pg.Rect((pos_x + x) * tile, (pos_y + y) * tile + offset_y, tile, tile)
+            for x, y in tetromino.get_collision_mask().cells
+        ]
+        if self.renderer.show_ghost:
+            rects.extend(
+                pg.Rect(x * tile, y * tile, tile, tile)
+                for x, y in self.renderer.ghost_cells(tetromino, grid)
+            )
+        return rects
+
+    def _draw_piece(self, surface: pg.Surface, engine: 'TetrisGameEngine', offset_y: int):
+        tetromino = engine.current_tetromino
+        if tetromino:
+            if self.renderer.show_ghost:
+                self.renderer.draw_ghost(surface, tetromino, engine.grid)
+            self.renderer.draw_tetromino(surface, tetromino, offset_y)
+
+    def _draw_panels(self, surface: pg.Surface, engine: 'TetrisGameEngine'):
+        surface.blit(self.background, self.panel_rect, self.panel_rect)
+        self.renderer.draw_preview(surface, engine.preview_shapes, engine.tetromino_factory)
+        self.renderer.draw_score_panel(surface, engine.score_manager)
+
+    def _draw_overlays(self, surface: pg.Surface, engine: 'TetrisGameEngine'):
+        if engine.game_over:
+            self.renderer.draw_game_over(surface, engine.score_manager.score, engine.best_score)
+        if engine.paused:
+            self.renderer.draw_pause_screen(surface)
+
+    def present(self, rects: Optional[List[pg.Rect]]):
+        """Envia os rects sujos (ou a janela toda) para a tela"""
+        if rects is None:
+            pg.display.update()
+        else:
+            pg.display.update(rects)
+
+    def render(self, surface: pg.Surface, engine: 'TetrisGameEngine'):
+        grid = engine.grid
+        if self.background is None or self._tile_size != self.renderer.tile_size:
+            self._build_layers(grid)
+            self._tile_size = self.renderer.tile_size
+            self._needs_full_redraw = True
+
+        score = engine.score_manager
+        panel_key = (
+            tuple(engine.preview_shapes[:4]),
+            score.score, score.level, score.lines_cleared, score.combo, score.multiplier
+        )
+        overlay_key = (engine.game_over, engine.paused)
+        offset_y = engine.piece_pixel_offset()
+        piece_rects = self._piece_tile_rects(engine.current_tetromino, grid, offset_y)
+        board_changed = grid.revision != self._grid_revision
+
+        if board_changed:
+            self._rebuild_board_layer(grid, engine.tetromino_factory)
+
+        overlay_active = engine.game_over or engine.paused
+        full = (
+            self._needs_full_redraw or
+            overlay_key != self._overlay_key or
+            (overlay_active and (board_changed or panel_key != self._panel_key or
+                                 piece_rects != self._piece_rects))
+        )
+
+        if full:
+            # Overlay translúcido cobre tudo: recompõe a janela inteira
+            surface.blit(self.background, (0, 0))
+            surface.blit(self.board_layer, self.board_rect)
+            self._draw_piece(surface, engine, offset_y)
+            self._draw_panels(surface, engine)
+            self._draw_overlays(surface, engine)
+            self.present(None)
+        else:
+            dirty: List[pg.Rect] = []
+            overlay = self.overlay_rect
+            if overlay:
+                # O overlay translúcido volta a ser desenhado a cada quadro: a
+                # área dele é recomposta antes, senão o alpha acumula
+                surface.blit(self.background, overlay, overlay)
+                board_part = overlay.clip(self.board_rect)
+                if board_part:
+                    surface.blit(self.board_layer, board_part, board_part)
+                dirty.append(overlay)
+            if board_changed:
+                surface.blit(self.board_layer, self.board_rect)
+                dirty.append(self.board_rect)
+                piece_changed = True
             else:
-                print("Nenhum arquivo de música encontrado")
-        
-        except Exception as e:
-            print(f"Erro ao configurar áudio: {e}")
-    
-    def __init__(self):
-    
-    
-        self._setup_audio()
-    
-        
-        # Inicialização da janela
-        pg.init()
-        
+                piece_changed = piece_rects != self._piece_rects or bool(
+                    overlay and overlay.collidelist(piece_rects) >= 0)
+                if piece_changed:
+                    for rect in self._piece_rects:
+                        surface.blit(self.board_layer, rect, rect)
+                    dirty.extend(self._piece_rects)
+
+            if piece_changed and engine.current_tetromino:
+                self._draw_piece(surface, engine, offset_y)
+                dirty.extend(piece_rects)
+
+            if panel_key != self._panel_key or (overlay and overlay.colliderect(self.panel_rect)):
+                self._draw_panels(surface, engine)
+                dirty.append(self.panel_rect)
+
+            if dirty:
+                self.present(dirty)
+
+        self._piece_rects = piece_rects
+        self._panel_key = panel_key
+        self._overlay_key = overlay_key
+        self._needs_full_redraw = False
+
+
+class FrameProfiler:
+    """Instrumentação opcional do loop principal.
+
+    Mede cada fase do quadro (event.get, input, lógica, cada draw_* e a
+    apresentação na tela), guarda uma janela deslizante de amostras por fase
+    para os percentis p50/p95/p99 e conta chamadas a is_collision por quadro.
+    Os dados aparecem num overlay (F3) e podem ser gravados como JSON lines.
+    As fases do loop (render, lógica...) contam o tempo total; os
+    métodos trocados por instrument() contam só o tempo próprio, sem o das
+    fases medidas dentro deles (draw_grid sem o draw_locked_cells que ele
+    chama), então as draw_* somadas não passam de render.
+
+    net_blocks é a variação de blocos vivos no quadro: objetos criados e
+    liberados no mesmo quadro não aparecem nela. Com trace_allocations o
+    tracemalloc mede também alloc_peak_kb, o pico de memória alocada acima
+    do início do quadro, que pega esses temporários (deixa tudo mais lento).
+    """
+
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, window: int = 600, jsonl_path: Optional[str] = None,
+                 trace_allocations: bool = False):
+        self.window = window
+        self.samples: Dict[str, deque] = {}
+        self.frame_index = 0
+        self.collision_calls = 0
+        self.overlay_visible = False
+        self.jsonl_path = jsonl_path
+        self._jsonl = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path else None
+        self._frame: Dict[str, float] = {}
+        # Tempo (ms) das fases filhas de cada medição em andamento
+        self._nested: List[float] = []
+        self._frame_start = 0.0
+        self._blocks_start = 0
+        self.trace_allocations = trace_allocations
+        self._traced_start = 0
+        if trace_allocations:
+            tracemalloc.start()
+        self._overlay_surface: Optional[pg.Surface] = None
+        self._overlay_refresh_frame = 0
+
+    def _record(self, name: str, value: float):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+        samples.append(value)
+
+    def begin_frame(self):
+        self._frame = {}
+        self.collision_calls = 0
+        self._blocks_start = sys.getallocatedblocks()
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            self._traced_start = tracemalloc.get_traced_memory()[0]
+        self._frame_start = time.perf_counter()
+
+    def measure(self, name: str, func, *args, **kwargs):
+        """Executa func medindo o tempo (ms) na fase name"""
+        return self._timed(name, False, func, args, kwargs)
+
+    def _timed(self, name: str, exclusive: bool, func, args, kwargs):
+        nested = self._nested
+        nested.append(0.0)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000.0
+            children = nested.pop()
+            if nested:
+                nested[-1] += elapsed
+            if exclusive:
+                elapsed -= children
+            self._frame[name] = self._frame.get(name, 0.0) + elapsed
+
+    def end_frame(self):
+        frame_ms = (time.perf_counter() - self._frame_start) * 1000.0
+        self._frame['frame'] = frame_ms
+        for name, value in self._frame.items():
+            self._record(name, value)
+        self._record('is_collision_calls', self.collision_calls)
+        net_blocks = sys.getallocatedblocks() - self._blocks_start
+        self._record('net_blocks', net_blocks)
+        peak_kb = None
+        if self.trace_allocations:
+            peak_kb = (tracemalloc.get_traced_memory()[1] - self._traced_start) / 1024.0
+            self._record('alloc_peak_kb', peak_kb)
+
+        if self._jsonl:
+            record = {
+                'frame': self.frame_index,
+                'phases_ms': {k: round(v, 4) for k, v in self._frame.items()},
+                'is_collision_calls': self.collision_calls,
+                'net_blocks': net_blocks,
+            }
+            if peak_kb is not None:
+                record['alloc_peak_kb'] = round(peak_kb, 3)
+            self._jsonl.write(json.dumps(record) + '\n')
+        self.frame_index += 1
+
+    def instrument(self, obj, method_names: List[str], prefix: str = ''):
+        """Troca métodos da instância por versões cronometradas (tempo próprio)"""
+        for method_name in method_names:
+            method = getattr(obj, method_name)
+            phase = prefix + method_name
+
+            def timed(*args, _method=method, _phase=phase, **kwargs):
+                return self._timed(_phase, True, _method, args, kwargs)
+
+            setattr(obj, method_name, timed)
+
+    def count_collisions(self, grid: GameGrid):
+        """Conta chamadas a is_collision na grade indicada"""
+        is_collision = grid.is_collision
+
+        def counted(*args, **kwargs):
+            self.collision_calls += 1
+            return is_collision(*args, **kwargs)
+
+        grid.is_collision = counted
+
+    def percentiles(self, name: str) -> Dict[str, float]:
+        samples = sorted(self.samples.get(name, ()))
+        if not samples:
+            return {f'p{p}': 0.0 for p in self.PERCENTILES}
+        last = len(samples) - 1
+        return {f'p{p}': samples[min(last, round(last * p / 100))] for p in self.PERCENTILES}
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {name: self.percentiles(name) for name in sorted(self.samples)}
+
+    def dump_summary(self):
+        """Grava o resumo de percentis como uma linha JSON"""
+        if self._jsonl:
+            record = {'frame': self.frame_index, 'summary': self.summary()}
+            self._jsonl.write(json.dumps(record) + '\n')
+            self._jsonl.flush()
+
+    def toggle_overlay(self):
+        self.overlay_visible = not self.overlay_visible
+        self._overlay_surface = None
+
+    def draw_overlay(self, surface: pg.Surface, renderer: RenderSystem) -> Optional[pg.Rect]:
+        """Desenha o overlay; o texto é refeito a cada 30 quadros"""
+        if not self.overlay_visible:
+            return None
+        if self._overlay_surface is None or self.frame_index >= self._overlay_refresh_frame:
+            font = renderer.get_font(14)
+            lines = ["fase               p50     p95     p99"]
+            for name, stats in self.summary().items():
+                lines.append(
+                    f"{name[:16]:<16} {stats['p50']:7.2f} {stats['p95']:7.2f} {stats['p99']:7.2f}"
+                )
+            texts = [font.render(line, True, renderer.colors['WHITE']) for line in lines]
+            width = max(text.get_width() for text in texts) + 12
+            height = len(texts) * 16 + 12
+            self._overlay_surface = pg.Surface((width, height), pg.SRCALPHA)
+            self._overlay_surface.fill((0, 0, 0, 200))
+            for i, text in enumerate(texts):
+                self._overlay_surface.blit(text, (6, 6 + i * 16))
+            self._overlay_refresh_frame = self.frame_index + 30
+        return surface.blit(self._overlay_surface, (4, 4))
+
+    def close(self):
+        if self._jsonl:
+            self.dump_summary()
+            self._jsonl.close()
+            self._jsonl = None
+        if self.trace_allocations:
+            tracemalloc.stop()
+            self.trace_allocations = False
+
+
+class FixedTimestepScheduler:
+    """Passo fixo com acumulador.
+
+    advance() soma o tempo real do quadro e devolve quantos ticks de
+    1/tick_rate s a lógica deve rodar. A sobra fica no acumulador e alpha diz
+    quanto do próximo tick já passou, para interpolar o render.
+    """
+
+    def __init__(self, tick_rate: int, max_ticks_per_frame: int = 16,
+                 max_frame_time: float = 0.25, clock=time.perf_counter):
+        self.tick_rate = tick_rate
+        self.tick_duration = 1.0 / tick_rate
+        self.max_ticks_per_frame = max_ticks_per_frame
+        self.max_frame_time = max_frame_time
+        self.clock = clock
+        self.accumulator = 0.0
+        self.total_ticks = 0
+        # Tempo descartado por quadros lentos demais (evita a espiral de atraso)
+        self.dropped_time = 0.0
+        self._last_time: Optional[float] = None
+
+    def reset(self):
+        """Esquece o tempo acumulado (ex.: antes do primeiro quadro)"""
+        self.accumulator = 0.0
+        self._last_time = None
+
+    def advance(self) -> int:
+        """Ticks a rodar neste quadro"""
+        now = self.clock()
+        if self._last_time is None:
+            self._last_time = now
+        frame_time = now - self._last_time
+        self._last_time = now
+
+        self.accumulator += frame_time
+        if self.accumulator > self.max_frame_time:
+            self.dropped_time += self.accumulator - self.max_frame_time
+            self.accumulator = self.max_frame_time
+
+        ticks = min(int(self.accumulator / self.tick_duration), self.max_ticks_per_frame)
+        self.accumulator -= ticks * self.tick_duration
+        self.total_ticks += ticks
+        return ticks
+
+    @property
+    def behind(self) -> bool:
+        """Ainda sobraram ticks inteiros depois do limite por quadro"""
+        return self.accumulator >= self.tick_duration
+
+    @property
+    def alpha(self) -> float:
+        return min(1.0, self.accumulator / self.tick_duration)
+
+
+class StartupTimer:
+    """Tempo de cada fase da abertura do jogo (--startup-report).
+
+    As fases de fundo (áudio, fonte) podem terminar depois do primeiro
+    quadro; nesse caso entram no relatório quando terminam.
+    """
+
+    def __init__(self, start: Optional[float] = None):
+        self.start = time.perf_counter() if start is None else start
+        self.phases: List[Tuple[str, float]] = []
+        self.reported = False
+        self.print_late = False
+
+    def record(self, name: str, seconds: float):
+        self.phases.append((name, seconds))
+        if self.reported and self.print_late:
+            print(f"  {name:<24} {seconds * 1e3:8.1f} ms")
+
+    def measure(self, name: str, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.record(name, time.perf_counter() - start)
+        return result
+
+    def format(self) -> str:
+        lines = ["Inicialização:"]
+        lines += [f"  {name:<24} {seconds * 1e3:8.1f} ms" for name, seconds in self.phases]
+        lines.append(f"  {'total até agora':<24} {(time.perf_counter() - self.start) * 1e3:8.1f} ms")
+        return "\n".join(lines)
+
+    def report(self, print_late: bool = True):
+        print(self.format())
+        self.reported = True
+        self.print_late = print_late
+
+
+class TetrisGameEngine:
+
+    def __init__(self, profiler: Optional[FrameProfiler] = None, seed: Optional[int] = None,
+                 record_path: Optional[str] = None, replay: Optional[ReplayData] = None,
+                 ai: Optional[AIPlayer] = None, tick_rate: Optional[int] = None,
+                 stats_path: Optional[str] = None, startup: Optional[StartupTimer] = None,
+                 startup_report: bool = False):
+        self.startup = startup or StartupTimer()
+        self.startup_report = startup_report
+
         # Configs
         self.window_settings = GameConfiguration.WindowSettings()
-        
-        self.screen = pg.display.set_mode(
+
+        self.startup.measure('import pygame', importlib.import_module, 'pygame')
+
+        # Fonte em segundo plano desde já (a varredura das fontes do sistema é lenta)
+        font_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 self.window_settings.FONT_FILE)
+        font_loader = FontLoader(self.window_settings.FONT_NAME, font_path, self.startup)
+
+        # Só vídeo e eventos; o pg.init() iniciaria todos os subsistemas
+        self.startup.measure('pg.display.init', pg.display.init)
+        self.screen = self.startup.measure(
+            'set_mode', pg.display.set_mode,
             (self.window_settings.WINDOW_WIDTH, self.window_settings.WINDOW_HEIGHT)
         )
         pg.display.set_caption(self.window_settings.WINDOW_TITLE)
+
+        # Mixer, efeitos e música numa thread, sem segurar a primeira tela
+        self.audio = AudioSystem(self.startup)
         
         self.clock = pg.time.Clock()
-        self.event_dispatcher = EventDispatcher()
-        self.input_handler = InputHandler()
         self.mouse_handler = MouseHandler()
-        self.score_manager = ScoreManager()
-        
-        self.tetromino_factory = TetrominoFactory()
-        
-# Grade do jogo
-        self.grid = GameGrid(
-            GameConfiguration.GameParameters.GRID_WIDTH,
-            GameConfiguration.GameParameters.GRID_HEIGHT
+
+        # Lógica do jogo (sem pygame); sempre com seed para poder gravar replay
+        board = None
+        if replay:
+            seed = replay.seed
+            tick_rate = replay.tick_rate
+            board = replay.board
+        elif seed is None:
+            seed = random.randrange(1 << 62)
+        self.seed = seed
+        self.simulation = self.startup.measure(
+            'simulação', GameSimulation, seed=seed, tick_rate=tick_rate, board=board
         )
-        
-        self.renderer = RenderSystem(
-            (self.window_settings.WINDOW_WIDTH, self.window_settings.WINDOW_HEIGHT),
-            self.window_settings.BASE_TILE_SIZE
+
+        self.audio.attach(self.simulation.event_dispatcher)
+
+        self.replay_player = ReplayPlayer(replay, self.simulation) if replay else None
+        self.ai = ai
+        self.record_path = record_path
+        self.recorder = (
+            ReplayRecorder(seed, self.simulation.tick_rate, self.simulation.board)
+            if record_path else None
         )
 
-        self.current_tetromino = None
-        self.preview_shapes = []
-        self.game_over = False
-        self.paused = False
-        self.fall_timer = 0
-        self.fall_speed = GameConfiguration.GameParameters.FALL_TIME_BASE
-        
-        # Inicialização
-        self._initialize_game()
-        
-        self._setup_event_handlers()
-    
-    def _initialize_game(self):
-        """Inicializa o estado do jogo"""
-        
-        self.preview_shapes = [
-            self.tetromino_factory.create_random() for _ in range(10)
-        ]
-        
-        
-        self._get_next_tetromino()
-        
-    
-        self.game_over = False
-        self.paused = False
-        self.fall_timer = 0
-        self.score_manager.reset()
-        self.grid.clear()
-        
-        
-        self.event_dispatcher.dispatch_event(
-            GameEvent(GameEventType.GAME_STARTED)
+        # Estatísticas só de partidas humanas (replays e IA ficam de fora)
+        self.stats_store = None
+        self.stats_recorder = None
+        if stats_path and not replay and not ai:
+            self.stats_store = self.startup.measure('estatísticas', StatsStore, stats_path)
+            self.stats_recorder = GameStatsRecorder(self.stats_store, self.simulation, seed)
+
+        # Lógica em ticks fixos, render na taxa que a tela permitir
+        self.scheduler = FixedTimestepScheduler(
+            self.simulation.tick_rate,
+            self.window_settings.MAX_TICKS_PER_FRAME,
+            self.window_settings.MAX_FRAME_TIME,
         )
-    
-    def _setup_event_handlers(self):
-        
-        self.event_dispatcher.add_listener(
-            GameEventType.LINE_CLEARED,
-            self._on_line_cleared
+        self.input_handler = InputHandler(self.simulation.tick_rate)
+
+        self.renderer = self.startup.measure(
+            'renderer', RenderSystem,
+            (self.window_settings.WINDOW_WIDTH, self.window_settings.WINDOW_HEIGHT),
+            self.window_settings.BASE_TILE_SIZE, font_loader
         )
-        
-        self.event_dispatcher.add_listener(
-            GameEventType.GAME_OVER,
-            self._on_game_over
+        # Tile da grade escalado para caber na janela (grades grandes)
+        self.renderer.fit_board(self.grid.width, self.grid.height,
+                                self.tetromino_factory.max_shape_size)
+        # Espera curta pela fonte para não trocar de fonte logo depois de abrir
+        self.startup.measure('espera da fonte', font_loader.wait,
+                             self.window_settings.FONT_WAIT_MS / 1000)
+        self.dirty_renderer = (
+            DirtyRectRenderer(self.renderer)
+            if self.window_settings.DIRTY_RECT_RENDERING else None
         )
-    
-    def _on_line_cleared(self, event: GameEvent):
-        
-        lines_count = event.data.get('lines', 0)
-        self.score_manager.add_line_clear_score(lines_count)
-        
 
-        self.fall_speed = max(
-            10,
-            GameConfiguration.GameParameters.FALL_TIME_BASE - 
-            (self.score_manager.level - 1) * 5
-        )
-    
-    def _on_game_over(self, event: GameEvent):
-        """Handler para game over"""
-        self.game_over = True
-    
-    def _get_next_tetromino(self):
-        if self.preview_shapes:
-            next_shape = self.preview_shapes.pop(0)
-            self.current_tetromino = ActiveTetromino(next_shape, self.tetromino_factory)
-            
-            
-            self.preview_shapes.append(self.tetromino_factory.create_random())
-            
-            
-            if self.grid.is_collision(self.current_tetromino):
-                self.event_dispatcher.dispatch_event(
-                    GameEvent(GameEventType.GAME_OVER)
-                )
-        else:
-            self.event_dispatcher.dispatch_event(
-                GameEvent(GameEventType.GAME_OVER)
-            )
-    
+        self.profiler = profiler
+        self._profiler_overlay_rect = None
+        if profiler:
+            self._instrument(profiler)
+
+    def _instrument(self, profiler: FrameProfiler):
+        profiler.instrument(self.renderer, [
+            'draw_grid', 'draw_locked_cells', 'draw_ghost', 'draw_tetromino', 'draw_preview',
+            'draw_score_panel', 'draw_game_over', 'draw_pause_screen'
+        ])
+        if self.dirty_renderer:
+            profiler.instrument(self.dirty_renderer, ['present'], 'display.')
+        profiler.count_collisions(self.grid)
+
+    def _phase(self, name: str, func, *args):
+        """Chama func, cronometrando se o profiler estiver ligado"""
+        if self.profiler is None:
+            return func(*args)
+        return self.profiler.measure(name, func, *args)
+
+    @property
+    def event_dispatcher(self) -> EventDispatcher:
+        return self.simulation.event_dispatcher
+
+    @property
+    def grid(self) -> GameGrid:
+        return self.simulation.grid
+
+    @property
+    def score_manager(self) -> ScoreManager:
+        return self.simulation.score_manager
+
+    @property
+    def tetromino_factory(self) -> TetrominoFactory:
+        return self.simulation.tetromino_factory
+
+    @property
+    def current_tetromino(self) -> Optional[ActiveTetromino]:
+        return self.simulation.current_tetromino
+
+    @property
+    def preview_shapes(self) -> Tuple[TetrominoType, ...]:
+        return self.simulation.preview_shapes
+
+    @property
+    def game_over(self) -> bool:
+        return self.simulation.game_over
+
+    @property
+    def paused(self) -> bool:
+        return self.simulation.paused
+
+    @property
+    def best_score(self) -> Optional[int]:
+        return self.stats_recorder.best_score if self.stats_recorder else None
+
     def _handle_input(self):
+        """ESC sai; as outras teclas entram pela fila do InputHandler"""
+        if self.input_handler.quit_requested:
+            self._quit()
 
-        self.input_handler.update()
-        
-        if self.input_handler.is_pressed('quit'):
-            pg.quit()
-            sys.exit()
-            
-        if self.input_handler.is_pressed('restart'):
-            self._initialize_game()
-            return
-            
-        if self.input_handler.is_pressed('pause'):
-            self.paused = not self.paused
-            
-        if self.game_over or self.paused or not self.current_tetromino:
-            return
-            
-        # Movimento da peça
-        if self.input_handler.is_pressed('left'):
-            self.current_tetromino.move(-1, 0, self.grid)
-        elif self.input_handler.is_pressed('right'):
-            self.current_tetromino.move(1, 0, self.grid)
-        elif self.input_handler.is_pressed('down'):
-            self.current_tetromino.move(0, 1, self.grid)
-            
-        # Rotação
-        if self.input_handler.is_pressed('rotate_cw'):
-            self.current_tetromino.rotate(1, self.grid)
-        elif self.input_handler.is_pressed('rotate_ccw'):
-            self.current_tetromino.rotate(-1, self.grid)
-            
-        #CAIR RÁPIDO
-        if self.input_handler.is_pressed('hard_drop'):
-            self.current_tetromino.hard_drop(self.grid)
-            self._lock_current_tetromino()
-    
-    def _lock_current_tetromino(self):
-        #FIXA BLOCO
-        if self.current_tetromino:
-           
-            self.score_manager.add_shape_score(self.current_tetromino)
-            
-            
-            success = self.grid.place_tetromino(self.current_tetromino)
-            
-            if not success:
-                self.event_dispatcher.dispatch_event(
-                    GameEvent(GameEventType.GAME_OVER)
-                )
-                return
-            
-            
-            completed_rows = self.grid.check_line_completions()
-            if completed_rows:
-                self.grid.remove_lines(completed_rows)
-                self.event_dispatcher.dispatch_event(
-                    GameEvent(
-                        GameEventType.LINE_CLEARED,
-                        {'lines': len(completed_rows)}
-                    )
-                )
-            
-            
-            self._get_next_tetromino()
-    
-    def _update_game_logic(self):
-        """Atualiza a lógica do jogo"""
-        if self.game_over or self.paused or not self.current_tetromino:
-            return
-            
-        self.fall_timer += 1
-        if self.fall_timer >= self.fall_speed:
-            if not self.current_tetromino.move(0, 1, self.grid):
-                self._lock_current_tetromino()
-            self.fall_timer = 0
+    def _tick_input_bits(self) -> int:
+        """Campo de entrada de um tick (replay, IA ou teclado)"""
+        keyboard = self.input_handler.tick_bits()
+        if self.replay_player:
+            return self.replay_player.next_bits()
+        if self.ai:
+            # P/R/ESC continuam no teclado; o resto vem da IA
+            keyboard &= INPUT_BITS[GameAction.PAUSE] | INPUT_BITS[GameAction.RESTART]
+            return keyboard | self.ai.next_bits(self.simulation)
+        return keyboard
+
+    def _update_game_logic(self, ticks: int = 1):
+        """Roda ticks de lógica de passo fixo (entrada + gravidade)"""
+        for _ in range(ticks):
+            bits = self._tick_input_bits()
+            if self.recorder:
+                self.recorder.record(bits)
+            self.simulation.apply_input_bits(bits)
+            self.simulation.tick()
+
+    def piece_pixel_offset(self) -> int:
+        """Deslocamento vertical da peça ativa com INTERPOLATE_RENDER.
+
+        Desenha a peça entre a linha atual e a próxima conforme o progresso
+        da gravidade (fall_timer mais a fração de tick do acumulador).
+        """
+        simulation = self.simulation
+        tetromino = simulation.current_tetromino
+        if (not self.window_settings.INTERPOLATE_RENDER or tetromino is None or
+                simulation.paused or simulation.game_over):
+            return 0
+        if self.renderer.ghost_row(tetromino, simulation.grid) <= tetromino.position[1]:
+            return 0
+        progress = (simulation.fall_timer + self.scheduler.alpha) / simulation.fall_speed
+        return int(min(progress, 1.0) * self.renderer.tile_size)
     
     def _render(self):
         """Renderiza o jogo"""
+        if self.renderer.refresh_fonts() and self.dirty_renderer:
+            self.dirty_renderer.invalidate()
+        if self.dirty_renderer:
+            self.dirty_renderer.render(self.screen, self)
+            return
+
         # Fundo
-        self.screen.fill(GameConfiguration.ColorSystem.get_color_palette()['BACKGROUND'])
+        self.screen.fill(self.renderer.colors['BACKGROUND'])
         
         self.renderer.draw_grid(self.screen, self.grid, self.tetromino_factory)
         
         if self.current_tetromino:
-            self.renderer.draw_tetromino(self.screen, self.current_tetromino)
+            if self.renderer.show_ghost:
+                self.renderer.draw_ghost(self.screen, self.current_tetromino, self.grid)
+            self.renderer.draw_tetromino(self.screen, self.current_tetromino,
+                                         self.piece_pixel_offset())
         
         self.renderer.draw_preview(self.screen, self.preview_shapes, self.tetromino_factory)
         
@@ -908,12 +5196,39 @@ class TetrisGameEngine:
         self.renderer.draw_score_panel(self.screen, self.score_manager)
         
         if self.game_over:
-            self.renderer.draw_game_over(self.screen, self.score_manager.score)
+            self.renderer.draw_game_over(self.screen, self.score_manager.score, self.best_score)
         
         if self.paused:
             self.renderer.draw_pause_screen(self.screen)
-        
-        pg.display.flip()
+
+        self._phase('display.flip', pg.display.flip)
+
+    def _draw_profiler_overlay(self):
+        rect = self.profiler.draw_overlay(self.screen, self.renderer)
+        if self.dirty_renderer:
+            # O próximo render recompõe a área antes de o overlay voltar
+            self.dirty_renderer.overlay_rect = rect
+        if rect:
+            pg.display.update(rect)
+            self._profiler_overlay_rect = rect
+        elif self._profiler_overlay_rect:
+            # Overlay escondido: a tela toda precisa ser recomposta
+            self._profiler_overlay_rect = None
+            if self.dirty_renderer:
+                self.dirty_renderer.invalidate()
+
+    def _quit(self):
+        if self.profiler:
+            self.profiler.close()
+        if self.recorder:
+            self.recorder.save(self.record_path)
+            print(f"Replay salvo em {self.record_path} (seed {self.seed})")
+        self.event_dispatcher.close()
+        if self.stats_store:
+            self.stats_store.close()
+        self.audio.close()
+        pg.quit()
+        sys.exit()
     
     def run(self):
         print("=" * 60)
@@ -923,27 +5238,218 @@ class TetrisGameEngine:
         print("Controles: Setas/AWSD para mover, Q/E para rotacionar")
         print("Espaço: Hard Drop, P: Pausar, R: Reiniciar, ESC: Sair")
         print("=" * 60)
-        
+
+        self.scheduler.reset()
+        skip_render = self.window_settings.SKIP_RENDER_WHEN_BEHIND
+        max_skipped = self.window_settings.MAX_SKIPPED_FRAMES
+        skipped_frames = 0
+        first_frame_start = time.perf_counter()
+        first_frame = True
         while True:
-            for event in pg.event.get():
+            if self.profiler:
+                self.profiler.begin_frame()
+
+            for event in self._phase('event.get', pg.event.get):
                 if event.type == pg.QUIT:
-                    pg.quit()
-                    sys.exit()
+                    self._quit()
+                if event.type == pg.WINDOWFOCUSLOST:
+                    # KEYUP de teclas soltas fora da janela não chega
+                    self.input_handler.clear()
+                self.input_handler.handle_event(event)
+                if self.replay_player and event.type == pg.KEYDOWN:
+                    # PageUp/PageDown: volta/avança 10 segundos no replay (na
+                    # taxa de ticks dele), sem os efeitos sonoros dos ticks pulados
+                    if event.key in (pg.K_PAGEUP, pg.K_PAGEDOWN):
+                        delta = 10 * self.replay_player.replay.tick_rate
+                        if event.key == pg.K_PAGEUP:
+                            delta = -delta
+                        self.audio.muted = True
+                        self.replay_player.seek(self.replay_player.tick + delta)
+                        self.audio.muted = False
+                if self.profiler and event.type == pg.KEYDOWN:
+                    if event.key == pg.K_F3:
+                        self.profiler.toggle_overlay()
+                    elif event.key == pg.K_F4:
+                        self.profiler.dump_summary()
             
-            self.mouse_handler.update()
+            self._phase('mouse_handler.update', self.mouse_handler.update)
             
-            self._handle_input()
+            self._phase('handle_input', self._handle_input)
 
-            self._update_game_logic()
-            
-            self._render()
+            ticks = self.scheduler.advance()
+            self._phase('update_game_logic', self._update_game_logic, ticks)
+
+            # Atrasado: gasta o quadro alcançando a lógica em vez de desenhar
+            rendered = not (skip_render and self.scheduler.behind and
+                            skipped_frames < max_skipped)
+            if rendered:
+                skipped_frames = 0
+                self._phase('render', self._render)
+            else:
+                skipped_frames += 1
+
+            if self.profiler:
+                # Sem render a tela não foi recomposta: o overlay já está lá
+                if rendered:
+                    self._draw_profiler_overlay()
+                self.profiler.end_frame()
             
             self.clock.tick(GameConfiguration.WindowSettings.FPS_LIMIT)
 
+            if first_frame:
+                first_frame = False
+                self.startup.record('primeiro quadro', time.perf_counter() - first_frame_start)
+                if self.startup_report:
+                    self.startup.report()
+
 print('=' * 60)
-def main():
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="POP BLOCK")
+    parser.add_argument('--selfplay', type=int, metavar='JOGOS',
+                        help="joga partidas headless em paralelo e mostra o resumo")
+    parser.add_argument('--max-ticks', type=int, default=100000,
+                        help="limite de ticks por partida do self-play")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="processos do self-play e dos replays (padrão: núcleos da CPU) "
+                             "ou dos bots do --loopback (padrão: 1)")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="seed da partida (ou da primeira partida do self-play)")
+    parser.add_argument('--record', metavar='ARQUIVO',
+                        help="grava um replay da partida ao sair")
+    parser.add_argument('--replay', metavar='ARQUIVO',
+                        help="reproduz um replay na janela (PageUp/PageDown para navegar)")
+    parser.add_argument('--replay-headless', metavar='ARQUIVO', nargs='+',
+                        help="recalcula replays sem janela e mostra o resumo")
+    parser.add_argument('--tick-rate', type=int, default=None,
+                        help="ticks de lógica por segundo (padrão: 60)")
+    parser.add_argument('--board', metavar='LxA',
+                        help="tamanho da grade, ex.: 100x200 (padrão: 10x20)")
+    parser.add_argument('--spawn', metavar='X,Y',
+                        help="posição de spawn das peças (padrão: centro do topo)")
+    parser.add_argument('--pieces', metavar='CONJUNTO',
+                        help="conjunto de peças: " + ", ".join(PIECE_SETS) + " ou arquivo JSON")
+    parser.add_argument('--randomizer', choices=list(RANDOMIZERS),
+                        help="sorteio das peças (padrão: uniform; bag é o 7-bag)")
+    parser.add_argument('--tile-size', type=int, default=None,
+                        help="tamanho máximo do tile em pixels (escala da janela)")
+    parser.add_argument('--ai', action='store_true',
+                        help="a IA joga a partida (ou as partidas do self-play)")
+    parser.add_argument('--server', action='store_true',
+                        help="roda o servidor de partidas multiplayer")
+    parser.add_argument('--port', type=int, default=7777,
+                        help="porta do servidor de partidas")
+    parser.add_argument('--loopback', type=int, metavar='BOTS',
+                        help="mede o servidor local com tantos bots conectados")
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help="duração da medição do --loopback em segundos")
+    parser.add_argument('--lock-rate', type=float, default=0.0,
+                        help="peças por segundo de cada bot do --loopback (0: sem pausa)")
+    parser.add_argument('--stats', metavar='ARQUIVO',
+                        default=GameConfiguration.GameParameters.STATS_PATH,
+                        help="banco SQLite das estatísticas e recordes")
+    parser.add_argument('--no-stats', action='store_true',
+                        help="não grava estatísticas das partidas")
+    parser.add_argument('--leaderboard', nargs='?', const='', metavar='DIA',
+                        help="mostra os recordes gerais ou de um dia (AAAA-MM-DD ou 'hoje')")
+    parser.add_argument('--startup-report', action='store_true',
+                        help="mostra o tempo de cada fase da abertura do jogo")
+    parser.add_argument('--profile', action='store_true',
+                        help="liga o profiler de quadros (F3 mostra, F4 grava o resumo)")
+    parser.add_argument('--profile-out', metavar='ARQUIVO',
+                        help="grava as medições do profiler em JSON lines")
+    parser.add_argument('--profile-alloc', action='store_true',
+                        help="o profiler mede as alocações de cada quadro com tracemalloc (lento)")
+    args = parser.parse_args(argv)
+
+    # Regras da partida: valem para o jogo, o self-play e os replays gravados
+    params = GameConfiguration.GameParameters
+    try:
+        if args.board:
+            params.GRID_WIDTH, params.GRID_HEIGHT = BoardConfig.parse_size(args.board)
+        if args.spawn:
+            spawn_x, _, spawn_y = args.spawn.partition(',')
+            params.SPAWN_X, params.SPAWN_Y = int(spawn_x), int(spawn_y or 0)
+        if args.pieces:
+            get_piece_set(args.pieces)
+            params.PIECE_SET = args.pieces
+        if args.randomizer:
+            params.RANDOMIZER = args.randomizer
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+    if args.tile_size:
+        settings = GameConfiguration.WindowSettings
+        settings.BASE_TILE_SIZE = args.tile_size
+        settings.WINDOW_WIDTH = args.tile_size * settings.SCREEN_MULTIPLIER_X
+        settings.WINDOW_HEIGHT = args.tile_size * settings.SCREEN_MULTIPLIER_Y
+
+    if args.selfplay:
+        start = time.perf_counter()
+        summary = run_self_play(
+            range(args.seed or 0, (args.seed or 0) + args.selfplay),
+            policy=AIPlayer() if args.ai else random_policy, workers=args.workers,
+            max_ticks=args.max_ticks
+        )
+        print(summary.format())
+        print(f"Tempo: {time.perf_counter() - start:.2f}s")
+        return
+
+    if args.leaderboard is not None:
+        day = args.leaderboard or None
+        if day == 'hoje':
+            day = stats_day(time.time())
+        store = StatsStore(args.stats)
+        entries = store.top_scores(10, day)
+        store.close()
+        print(f"Recordes {'de ' + day if day else 'gerais'}:")
+        for position, entry in enumerate(entries, 1):
+            print(f"{position:2}. {entry.score:>10}  nível {entry.level:<3} "
+                  f"linhas {entry.lines:<5} {entry.day}")
+        if not entries:
+            print("  nenhuma partida gravada")
+        return
+
+    if args.server:
+        server = MatchServer('0.0.0.0', args.port, tick_rate=args.tick_rate, seed=args.seed)
+        try:
+            asyncio.run(server.serve_forever())
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.loopback:
+        stats = run_loopback_harness(args.loopback, args.duration, workers=args.workers or 1,
+                                     tick_rate=args.tick_rate, seed=args.seed or 0,
+                                     lock_rate=args.lock_rate)
+        print(f"{stats['bots']} bots por {stats['duration_s']:.0f}s: "
+              f"{stats['matches_per_s']:.1f} partidas/s, {stats['locks_per_s']:.0f} peças/s")
+        print(f"Latência do lock: p50 {stats['latency_p50_ms']:.2f} ms, "
+              f"p99 {stats['latency_p99_ms']:.2f} ms")
+        print(f"Tick do servidor: p50 {stats['server_tick_p50_ms']:.3f} ms, "
+              f"p99 {stats['server_tick_p99_ms']:.3f} ms, "
+              f"máx {stats['server_tick_max_ms']:.2f} ms, "
+              f"{stats['server_late_ticks']} de {stats['server_ticks']} ticks atrasados")
+        return
+
+    if args.replay_headless:
+        start = time.perf_counter()
+        summary = rescore_replays(args.replay_headless, workers=args.workers)
+        print(summary.format())
+        print(f"Tempo: {time.perf_counter() - start:.2f}s")
+        return
+
+    startup = StartupTimer(_MODULE_START)
+    startup.record('módulo e imports', time.perf_counter() - _MODULE_START)
     try:
-        game = TetrisGameEngine()
+        profiler = None
+        if args.profile or args.profile_out or args.profile_alloc:
+            profiler = FrameProfiler(jsonl_path=args.profile_out,
+                                     trace_allocations=args.profile_alloc)
+        replay = ReplayData.load(args.replay) if args.replay else None
+        game = TetrisGameEngine(profiler, seed=args.seed, record_path=args.record,
+                                replay=replay, ai=AIPlayer() if args.ai else None,
+                                tick_rate=args.tick_rate,
+                                stats_path=None if args.no_stats else args.stats,
+                                startup=startup, startup_report=args.startup_report)
         game.run()
     except Exception as e:
         print(f"Erro durante a execução: {e}")
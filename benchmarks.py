@@ -0,0 +1,636 @@
+#Benchmarks do Pop Block
+#
+# Cargas com seed fixa. Os resultados podem ser gravados em JSON (--json) e
+# comparados com um baseline salvo (--baseline); métricas que pioraram mais
+# que --threshold são marcadas como regressão e o processo sai com código 1.
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Render sem janela (antes do pygame ser importado pelo Pop_Block)
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+from Pop_Block import (
+    ActiveTetromino,
+    AIPlayer,
+    AudioSystem,
+    BatchSimulation,
+    BitboardGameGrid,
+    EventDispatcher,
+    GameAction,
+    GameConfiguration,
+    GameEventType,
+    GameSimulation,
+    GRID_BACKENDS,
+    RANDOMIZERS,
+    TetrominoDefinition,
+    TetrominoFactory,
+    TetrominoType,
+    play_game,
+    random_policy,
+)
+
+
+def _legacy_get_current_shape(tetromino: ActiveTetromino) -> TetrominoDefinition:
+    """Reproduz o get_current_shape antigo, que criava uma definição por chamada"""
+    rotated_matrix = tetromino.definition.rotation_states[tetromino.rotation_index]
+    return TetrominoDefinition(
+        shape_type=tetromino.shape_type,
+        shape_matrix=rotated_matrix,
+        color_name=tetromino.definition.color_name
+    )
+
+
+def _count_allocations(func: Callable[[], object], calls: int) -> float:
+    """Blocos de memória alocados por chamada, mantendo os resultados vivos"""
+    results = [None] * calls
+    gc.collect()
+    gc.disable()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for i in range(calls):
+            results[i] = func()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+        gc.enable()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+    # A lista de resultados já existia antes do snapshot
+    return max(blocks, 0) / calls
+
+
+def _time_per_call(func: Callable[[], object], calls: int, repeats: int = 3) -> float:
+    """Menor tempo por chamada entre repeats rodadas (menos ruído)"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+
+def _percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def bench_get_current_shape(calls: int = 5000) -> Dict[str, float]:
+    """Compara alocações do get_current_shape antigo com a visão em cache"""
+    factory = TetrominoFactory()
+    tetromino = ActiveTetromino(TetrominoType.T, factory)
+    tetromino.rotation_index = 1
+
+    results = {}
+    for name, func in (
+        ('legacy', lambda: _legacy_get_current_shape(tetromino)),
+        ('cached', tetromino.get_current_shape),
+    ):
+        results[f'{name}_allocs_per_call'] = _count_allocations(func, calls)
+        results[f'{name}_ns'] = _time_per_call(func, calls) * 1e9
+    return results
+
+
+def bench_move_rotate_allocations(moves: int = 20000) -> Dict[str, float]:
+    """Blocos vivos e pico de memória num laço de move/rotate"""
+    params = GameConfiguration.GameParameters
+    factory = TetrominoFactory()
+    grid = BitboardGameGrid(params.GRID_WIDTH, params.GRID_HEIGHT)
+    tetromino = ActiveTetromino(TetrominoType.T, factory)
+    tetromino.position[1] = 5
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start_blocks = sys.getallocatedblocks()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        for i in range(moves):
+            tetromino.move(1 if i & 2 else -1, 0, grid)
+            tetromino.rotate(1 if i & 1 else -1, grid)
+            tetromino.get_current_shape()
+        _, peak = tracemalloc.get_traced_memory()
+        end_blocks = sys.getallocatedblocks()
+    finally:
+        tracemalloc.stop()
+    return {
+        'live_blocks_delta': end_blocks - start_blocks,
+        'peak_bytes': peak - base,
+    }
+
+
+def _random_board(grid_class, seed: int, pieces: int = 30):
+    """Grade de meio de jogo: peças soltas em rotações e colunas sorteadas"""
+    params = GameConfiguration.GameParameters
+    rng = random.Random(seed)
+    factory = TetrominoFactory()
+    grid = grid_class(params.GRID_WIDTH, params.GRID_HEIGHT)
+    shapes = list(TetrominoType)
+    for _ in range(pieces):
+        tetromino = ActiveTetromino(rng.choice(shapes), factory)
+        tetromino.rotation_index = rng.randrange(4)
+        tetromino.position = [rng.randrange(-1, params.GRID_WIDTH), 0]
+        if grid.is_collision(tetromino):
+            continue
+        tetromino.hard_drop(grid)
+        grid.place_tetromino(tetromino)
+        grid.remove_lines(grid.check_line_completions())
+    return grid
+
+
+def bench_is_collision(calls: int = 50000, seed: int = 0) -> Dict[str, float]:
+    """ns por is_collision em posições sorteadas de uma grade de meio de jogo"""
+    params = GameConfiguration.GameParameters
+    results = {}
+    for backend, grid_class in GRID_BACKENDS.items():
+        grid = _random_board(grid_class, seed)
+        rng = random.Random(seed)
+        factory = TetrominoFactory()
+        queries = []
+        for _ in range(256):
+            tetromino = ActiveTetromino(rng.choice(list(TetrominoType)), factory)
+            tetromino.rotation_index = rng.randrange(4)
+            tetromino.position = [rng.randrange(-1, params.GRID_WIDTH),
+                                  rng.randrange(params.GRID_HEIGHT - 2)]
+            queries.append(tetromino)
+        index = [0]
+
+        def query():
+            index[0] = (index[0] + 1) & 255
+            grid.is_collision(queries[index[0]])
+        results[f'{backend}_ns'] = _time_per_call(query, calls) * 1e9
+    return results
+
+
+def _lock_piece(grid, tetromino: ActiveTetromino):
+    """Fixação como na GameSimulation: só as linhas da peça são conferidas"""
+    grid.place_tetromino(tetromino)
+    mask = tetromino.get_collision_mask()
+    pos_y = tetromino.position[1]
+    rows = grid.check_line_completions(pos_y + mask.min_y, pos_y + mask.max_y)
+    if rows:
+        grid.remove_lines(rows)
+
+
+def bench_lock(locks: int = 20000, seed: int = 0) -> Dict[str, float]:
+    """ns por place_tetromino + check_line_completions + remove_lines"""
+    params = GameConfiguration.GameParameters
+    results = {}
+    for backend, grid_class in GRID_BACKENDS.items():
+        rng = random.Random(seed)
+        factory = TetrominoFactory()
+        grid = grid_class(params.GRID_WIDTH, params.GRID_HEIGHT)
+        shapes = list(TetrominoType)
+        elapsed = 0.0
+        done = 0
+        while done < locks:
+            tetromino = ActiveTetromino(rng.choice(shapes), factory)
+            tetromino.rotation_index = rng.randrange(4)
+            tetromino.position = [rng.randrange(-1, params.GRID_WIDTH), 0]
+            if grid.is_collision(tetromino):
+                # Fora da grade ou grade cheia: recomeça
+                if tetromino.position[0] + tetromino.get_collision_mask().min_x >= 0 and \
+                        tetromino.position[0] + tetromino.get_collision_mask().max_x < grid.width:
+                    grid.clear()
+                continue
+            tetromino.hard_drop(grid)
+            start = time.perf_counter()
+            _lock_piece(grid, tetromino)
+            elapsed += time.perf_counter() - start
+            done += 1
+        results[f'{backend}_ns'] = elapsed / locks * 1e9
+    return results
+
+
+BOARD_SIZES = ((10, 20), (40, 80), (100, 200))
+
+
+def bench_board_scaling(locks: int = 5000, clears: int = 1000,
+                        seed: int = 0) -> Dict[str, float]:
+    """Custo de fixar uma peça e de limpar uma linha por tamanho de grade.
+
+    As pilhas têm a mesma altura em todos os tamanhos, então os tempos devem
+    ficar estáveis conforme a grade cresce (só a largura pesa, pouco).
+    """
+    factory = TetrominoFactory()
+    shapes = list(TetrominoType)
+    stack_rows = 16
+    results = {}
+    for width, height in BOARD_SIZES:
+        grid = BitboardGameGrid(width, height)
+
+        def lock_pass() -> float:
+            rng = random.Random(seed)
+            grid.clear()
+            elapsed = 0.0
+            done = 0
+            while done < locks:
+                tetromino = ActiveTetromino(rng.choice(shapes), factory)
+                tetromino.rotation_index = rng.randrange(4)
+                tetromino.position = [rng.randrange(-1, width), 0]
+                mask = tetromino.get_collision_mask()
+                if (tetromino.position[0] + mask.min_x < 0 or
+                        tetromino.position[0] + mask.max_x >= width):
+                    continue
+                tetromino.hard_drop(grid)
+                if tetromino.position[1] < height - stack_rows:
+                    # Pilha na altura máxima: recomeça (fora da medição)
+                    grid.clear()
+                    continue
+                start = time.perf_counter()
+                _lock_piece(grid, tetromino)
+                elapsed += time.perf_counter() - start
+                done += 1
+            return elapsed
+
+        # Primeira passada só aquece os caches de máscaras deslocadas
+        # (RotationMask.shifted/painted) desta largura; a segunda é medida
+        lock_pass()
+        results[f'lock_{width}x{height}_ns'] = lock_pass() / locks * 1e9
+        rng = random.Random(seed)
+
+        # Linha de baixo completa sob uma pilha de stack_rows linhas com buraco
+        grid.clear()
+        full = grid.full_row_mask
+        for y in range(height - stack_rows, height - 1):
+            grid.rows[y] = full & ~(1 << rng.randrange(width))
+        grid.rows[height - 1] = full
+        grid.restore_state((tuple(grid.rows), tuple(grid.colors)))
+        state = grid.snapshot_state()
+        elapsed = 0.0
+        for _ in range(clears):
+            grid.restore_state(state)
+            start = time.perf_counter()
+            grid.remove_lines(grid.check_line_completions(height - 1, height - 1))
+            elapsed += time.perf_counter() - start
+        results[f'clear_{width}x{height}_ns'] = elapsed / clears * 1e9
+    smallest, largest = BOARD_SIZES[0], BOARD_SIZES[-1]
+    results['lock_growth'] = (results['lock_%dx%d_ns' % largest] /
+                              results['lock_%dx%d_ns' % smallest])
+    results['clear_growth'] = (results['clear_%dx%d_ns' % largest] /
+                               results['clear_%dx%d_ns' % smallest])
+    return results
+
+
+def _legacy_hard_drop(tetromino: ActiveTetromino, grid):
+    """hard_drop antigo, descendo uma linha por vez"""
+    while tetromino.move(0, 1, grid):
+        pass
+
+
+def bench_hard_drop(calls: int = 20000) -> Dict[str, float]:
+    """ns por hard drop do topo de uma grade vazia: laço antigo contra landing_row"""
+    params = GameConfiguration.GameParameters
+    grid = BitboardGameGrid(params.GRID_WIDTH, params.GRID_HEIGHT)
+    tetromino = ActiveTetromino(TetrominoType.T, TetrominoFactory())
+
+    results = {}
+    for name, drop in (('legacy', _legacy_hard_drop), ('landing_row', ActiveTetromino.hard_drop)):
+        def run():
+            tetromino.position[1] = 0
+            drop(tetromino, grid)
+        results[f'{name}_ns'] = _time_per_call(run, calls) * 1e9
+    return results
+
+
+def bench_randomizer(calls: int = 20000) -> Dict[str, float]:
+    """Próxima forma da fila, sorteio em lote e peek além do buffer"""
+    results = {}
+    for name in RANDOMIZERS:
+        factory = TetrominoFactory(seed=0, randomizer=name)
+        factory.reset_queue()
+        take = lambda: factory.randomizer.take(1000)
+        results[f'{name}_next_ns'] = _time_per_call(factory.next_shape, calls) * 1e9
+        results[f'{name}_take_ns'] = _time_per_call(take, 20) / 1000 * 1e9
+    results['peek_preview_ns'] = _time_per_call(lambda: factory.peek(4), calls) * 1e9
+    results['peek_64_ns'] = _time_per_call(lambda: factory.peek(64), 2000) * 1e9
+    return results
+
+
+def bench_headless_games(games: int = 500, seed: int = 0) -> Dict[str, float]:
+    """Partidas inteiras por segundo com a política aleatória do self-play"""
+    start = time.perf_counter()
+    ticks = 0
+    for game_seed in range(seed, seed + games):
+        ticks += play_game(game_seed, random_policy).ticks
+    elapsed = time.perf_counter() - start
+    return {
+        'games_per_s': games / elapsed,
+        'ticks_per_s': ticks / elapsed,
+    }
+
+
+def bench_events(ticks: int = 20000, seed: int = 0) -> Dict[str, float]:
+    """Custo por tick de inscrever-se em todo movimento (síncrono e em thread)"""
+    actions = (GameAction.LEFT, GameAction.RIGHT, GameAction.ROTATE_CW, GameAction.DOWN)
+    received = []
+
+    def run(simulation: GameSimulation):
+        simulation.reset()
+        for i in range(ticks):
+            if simulation.game_over:
+                simulation.reset()
+            simulation.step(actions[i & 3])
+
+    results = {}
+    for name, threaded in (('none', None), ('sync', False), ('threaded', True)):
+        simulation = GameSimulation(seed=seed)
+        dispatcher = simulation.event_dispatcher
+        if threaded is not None:
+            for event_type in (GameEventType.SHAPE_MOVED, GameEventType.SHAPE_ROTATED):
+                dispatcher.add_listener(event_type, received.append, threaded=threaded)
+        results[f'tick_{name}_ns'] = _time_per_call(lambda: run(simulation), 1) / ticks * 1e9
+        dispatcher.close()
+        if threaded:
+            results['threaded_dropped'] = dispatcher.dropped
+            results['threaded_stalls'] = dispatcher.stalls
+            results['threaded_received'] = len(received)
+        received.clear()
+
+    # Emissão direta para um listener síncrono: o evento sai do pool
+    dispatcher = EventDispatcher()
+    dispatcher.add_listener(GameEventType.SHAPE_LOCKED, lambda event: None)
+    emit = lambda: dispatcher.emit(GameEventType.SHAPE_LOCKED, 1, TetrominoType.T, 5)
+    results['emit_allocs_per_call'] = _count_allocations(emit, 5000)
+    results['emit_ns'] = _time_per_call(emit, 5000) * 1e9
+    return results
+
+
+def bench_audio(calls: int = 20000) -> Dict[str, float]:
+    """Custo na thread principal de tocar um efeito (direto e por evento)"""
+    import pygame as pg
+
+    pg.display.init()
+    audio = AudioSystem()
+    audio.wait(10.0)
+    dispatcher = EventDispatcher()
+    audio.attach(dispatcher)
+    emit = lambda: dispatcher.emit(GameEventType.SHAPE_LOCKED, 1, TetrominoType.T, 5)
+    results = {
+        'available': float(audio.available),
+        'play_ns': _time_per_call(lambda: audio.play('lock'), calls) * 1e9,
+        'event_ns': _time_per_call(emit, calls) * 1e9,
+    }
+    audio.close()
+    return results
+
+
+def bench_state_memory(count: int = 200, ticks: int = 2000, seed: int = 0) -> Dict[str, float]:
+    """Bytes por GameSimulation e por GameSnapshot de uma partida em andamento"""
+    GameSimulation(seed=seed)  # tabelas compartilhadas fora da medição
+    gc.collect()
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        simulations = [GameSimulation(seed=seed + i) for i in range(count)]
+        simulation_bytes = (tracemalloc.get_traced_memory()[0] - base) / count
+
+        simulation = simulations[0]
+        rng = random.Random(seed)
+        snapshots = []
+        base, _ = tracemalloc.get_traced_memory()
+        for _ in range(ticks):
+            if simulation.game_over:
+                simulation.reset()
+            simulation.step(random_policy(simulation, rng))
+            snapshots.append(simulation.snapshot())
+        snapshot_bytes = (tracemalloc.get_traced_memory()[0] - base) / ticks
+    finally:
+        tracemalloc.stop()
+    return {
+        'simulation_bytes': simulation_bytes,
+        'snapshot_bytes': snapshot_bytes,
+    }
+
+
+def bench_render(frames: int = 300, seed: int = 0) -> Dict[str, float]:
+    """ms por quadro de draw_grid e do _render completo numa Surface fora da tela"""
+    from Pop_Block import TetrisGameEngine, pg
+
+    engine = TetrisGameEngine(seed=seed)
+    # Fonte final antes de medir (senão a troca de fonte cai no meio da medição)
+    engine.renderer.font_loader.wait()
+    engine.renderer.refresh_fonts()
+    surface = pg.Surface(engine.screen.get_size())
+    engine.screen = surface
+    simulation = engine.simulation
+    rng = random.Random(seed)
+
+    def advance(ticks: int):
+        for _ in range(ticks):
+            if simulation.game_over:
+                simulation.reset()
+            simulation.step(random_policy(simulation, rng))
+
+    advance(300)
+    renderer = engine.renderer
+    results = {
+        'draw_grid_ms': _time_per_call(
+            lambda: renderer.draw_grid(surface, simulation.grid, simulation.tetromino_factory),
+            frames
+        ) * 1e3,
+    }
+
+    # Um tick de lógica entre quadros, como no jogo
+    dirty_renderer = engine.dirty_renderer
+    for name, renderer_mode in (('full', None), ('dirty', dirty_renderer)):
+        engine.dirty_renderer = renderer_mode
+        if renderer_mode:
+            renderer_mode.invalidate()
+        times = []
+        for _ in range(frames):
+            advance(1)
+            start = time.perf_counter()
+            engine._render()
+            times.append(time.perf_counter() - start)
+        results[f'render_{name}_p50_ms'] = _percentile(times, 0.5) * 1e3
+        results[f'render_{name}_p99_ms'] = _percentile(times, 0.99) * 1e3
+    engine.dirty_renderer = dirty_renderer
+    pg.quit()
+    return results
+
+
+def _scalar_place(simulation: GameSimulation, rotations: int, column: int):
+    """Mesma sequência de ações que BatchSimulation.place"""
+    for _ in range(rotations):
+        simulation.apply_action(GameAction.ROTATE_CW)
+    tetromino = simulation.current_tetromino
+    while tetromino.position[0] != column:
+        action = GameAction.LEFT if tetromino.position[0] > column else GameAction.RIGHT
+        if not simulation.apply_action(action):
+            break
+    simulation.apply_action(GameAction.HARD_DROP)
+
+
+def bench_batch_placements(boards: int = 10000, rounds: int = 20) -> Dict[str, float]:
+    """Peças fixadas por segundo: BatchSimulation contra GameSimulation em laço"""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    batch = BatchSimulation(boards)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        batch.place(rng.integers(0, 4, boards), rng.integers(0, 10, boards))
+    batch_rate = batch.placements / (time.perf_counter() - start)
+
+    moves = random.Random(0)
+    simulations = [GameSimulation(rng=random.Random(seed)) for seed in range(boards // 10)]
+    placements = 0
+    start = time.perf_counter()
+    for simulation in simulations:
+        for _ in range(rounds):
+            if simulation.game_over:
+                break
+            _scalar_place(simulation, moves.randrange(4), moves.randrange(10))
+            placements += 1
+    scalar_rate = placements / (time.perf_counter() - start)
+
+    return {
+        'batch_placements_per_s': batch_rate,
+        'scalar_placements_per_s': scalar_rate,
+        'speedup': batch_rate / scalar_rate,
+    }
+
+
+def bench_ai_decision(seed: int = 0, max_ticks: int = 3000) -> Dict[str, float]:
+    """Tempo de decisão do AIPlayer (profundidade 2) numa partida real"""
+    ai = AIPlayer()
+    simulation = GameSimulation(seed=seed)
+    times = []
+    while not simulation.game_over and simulation.tick_count < max_ticks:
+        simulation.step_bits(ai.next_bits(simulation))
+        if ai.last_decision_time:
+            times.append(ai.last_decision_time)
+            ai.last_decision_time = 0.0
+    times.sort()
+    return {
+        'decisions': len(times),
+        'p50_ms': _percentile(times, 0.5) * 1e3,
+        'p99_ms': _percentile(times, 0.99) * 1e3,
+        'table_hit_rate': ai.table.hits / max(1, ai.table.hits + ai.table.misses),
+    }
+
+
+BENCHMARKS: Dict[str, Callable[[], Dict[str, float]]] = {
+    'get_current_shape': bench_get_current_shape,
+    'move_rotate': bench_move_rotate_allocations,
+    'is_collision': bench_is_collision,
+    'lock': bench_lock,
+    'board_scaling': bench_board_scaling,
+    'hard_drop': bench_hard_drop,
+    'randomizer': bench_randomizer,
+    'headless_games': bench_headless_games,
+    'events': bench_events,
+    'audio': bench_audio,
+    'state_memory': bench_state_memory,
+    'render': bench_render,
+    'batch': bench_batch_placements,
+    'ai_decision': bench_ai_decision,
+}
+
+
+def metric_direction(name: str) -> int:
+    """-1 se menor é melhor, 1 se maior é melhor, 0 se a métrica é só informativa"""
+    if name.endswith(('_ns', '_ms', '_bytes', '_allocs_per_call')):
+        return -1
+    if name.endswith(('_per_s', 'speedup')):
+        return 1
+    return 0
+
+
+# Diferenças absolutas abaixo disto são ruído, qualquer que seja a variação relativa
+NOISE_FLOORS = {
+    '_ns': 20.0,
+    '_ms': 0.05,
+    '_bytes': 64.0,
+    '_allocs_per_call': 0.5,
+}
+
+
+def run_benchmarks(names: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        print(f"{name}...", end=' ', flush=True)
+        start = time.perf_counter()
+        try:
+            results[name] = bench()
+        except (ImportError, RuntimeError) as e:
+            # numpy ou pygame ausentes
+            print(f"ignorado ({e})")
+            continue
+        print(f"{time.perf_counter() - start:.1f}s")
+        for metric, value in results[name].items():
+            print(f"  {metric}: {value:.4g}")
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[Tuple[str, float, float, float, bool]]:
+    """(métrica, baseline, atual, variação, regressão) das métricas nos dois lados.
+
+    A variação é positiva quando a métrica melhorou.
+    """
+    rows = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            direction = metric_direction(metric)
+            base = baseline.get(name, {}).get(metric)
+            if not direction or not base:
+                continue
+            change = (value - base) / base * direction
+            floor = next((v for suffix, v in NOISE_FLOORS.items() if metric.endswith(suffix)), 0.0)
+            regression = change < -threshold and abs(value - base) > floor
+            rows.append((f'{name}.{metric}', base, value, change, regression))
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks do Pop Block")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), metavar='NOME',
+                        help=f"roda só estes benchmarks ({', '.join(BENCHMARKS)})")
+    parser.add_argument('--json', metavar='ARQUIVO', help="grava os resultados em JSON")
+    parser.add_argument('--baseline', metavar='ARQUIVO',
+                        help="compara com resultados salvos antes com --json")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="piora relativa que conta como regressão (padrão: 0.10)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.only)
+
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump({
+                'created_at': time.time(),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': results,
+            }, out, indent=2)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)['results']
+    rows = compare(results, baseline, args.threshold)
+    print(f"\nComparação com {args.baseline} (limite {args.threshold:.0%}):")
+    for metric, base, value, change, regression in rows:
+        flag = "  REGRESSÃO" if regression else ""
+        print(f"  {metric:<40} {base:>12.4g} -> {value:>12.4g} {change:+7.1%}{flag}")
+    regressions = sum(1 for row in rows if row[4])
+    print(f"{regressions} regressões")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
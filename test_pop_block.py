@@ -0,0 +1,403 @@
+"""Testes do Pop Block (python -m pytest -q); rodam sem janela."""
+
+import math
+import random
+import time
+from typing import List
+
+import pytest
+
+import benchmarks
+from Pop_Block import (
+    BATCH_ACTION_CODES, GRID_BACKENDS, INPUT_BITS, REPLAY_BOARD, REPLAY_HEADER,
+    REPLAY_TICK_RATE, REPLAY_VERSION, ActiveTetromino, AudioSystem, BatchSimulation,
+    BoardConfig, FrameProfiler, GameAction, GameConfiguration, GameEventType,
+    GameSimulation, MatchDelta, ReplayData, ReplayPlayer, ReplayRecorder,
+    TetrominoFactory, TetrominoType, decode_delta, encode_delta,
+)
+
+
+PLAY_KEYS = (GameAction.LEFT, GameAction.RIGHT, GameAction.ROTATE_CW,
+             GameAction.DOWN, GameAction.HARD_DROP)
+
+
+def _state(simulation: GameSimulation) -> tuple:
+    """O que precisa bater tick a tick entre duas simulações"""
+    tetromino = simulation.current_tetromino
+    piece = None
+    if tetromino:
+        piece = (tetromino.shape_type, tetromino.rotation_index, tuple(tetromino.position))
+    score = simulation.score_manager
+    return (simulation.grid.occupancy_rows(), piece,
+            tuple(simulation.tetromino_factory.queue), score.score,
+            score.lines_cleared, simulation.game_over, simulation.fall_timer,
+            simulation.piece_spawn_tick)
+
+
+def _random_bits(rng: random.Random, ticks: int, restarts=()) -> List[int]:
+    bits = []
+    for tick in range(ticks):
+        if tick in restarts:
+            bits.append(INPUT_BITS[GameAction.RESTART])
+        elif rng.random() < 0.2:
+            bits.append(INPUT_BITS[rng.choice(PLAY_KEYS)])
+        else:
+            bits.append(0)
+    return bits
+
+
+def _as_version(data: bytes, version: int) -> bytes:
+    """Regrava um replay atual no formato de uma versão anterior.
+
+    Cada versão acrescentou um campo depois do cabeçalho (taxa de ticks,
+    grade, randomizador, fila), então basta cortar os mais novos.
+    """
+    magic, _, seed, ticks = REPLAY_HEADER.unpack_from(data)
+    offset = REPLAY_HEADER.size
+    rate_end = offset + REPLAY_TICK_RATE.size
+    name_size = REPLAY_BOARD.unpack_from(data, rate_end)[-1]
+    board_end = rate_end + REPLAY_BOARD.size + name_size
+    randomizer_end = board_end + 1 + data[board_end]
+    fields = (data[offset:rate_end], data[rate_end:board_end],
+              data[board_end:randomizer_end], data[randomizer_end:randomizer_end + 1])
+    return (REPLAY_HEADER.pack(magic, version, seed, ticks) +
+            b''.join(fields[:version - 1]) + data[randomizer_end + 1:])
+
+
+# Configuração que cada versão assume para o que não guarda
+LEGACY_BOARDS = {
+    1: BoardConfig(queue_size=10),
+    2: BoardConfig(queue_size=10),
+    3: BoardConfig(queue_size=10),
+    4: BoardConfig(queue_size=8),
+    REPLAY_VERSION: BoardConfig(12, 24, piece_set='classic', randomizer='bag', queue_size=5),
+}
+
+
+@pytest.mark.parametrize('version', sorted(LEGACY_BOARDS))
+def test_replay_round_trip_with_restart(version):
+    board = LEGACY_BOARDS[version]
+    seed = 77
+    simulation = GameSimulation(seed=seed, tick_rate=60, board=board)
+    recorder = ReplayRecorder(seed, 60, board)
+    trace = []
+    for bits in _random_bits(random.Random(version), 3000, restarts=(500, 1700)):
+        simulation.step_bits(bits)
+        recorder.record(bits)
+        trace.append(_state(simulation))
+
+    replay = ReplayData.from_bytes(_as_version(recorder.to_bytes(), version))
+    assert replay.board == board
+    player = ReplayPlayer(replay)
+    played = []
+    while not player.finished:
+        player.step()
+        played.append(_state(player.simulation))
+    assert played == trace
+
+
+def test_replay_rejects_unknown_version():
+    recorder = ReplayRecorder(1)
+    recorder.record(0)
+    magic, _, seed, ticks = REPLAY_HEADER.unpack_from(recorder.to_bytes())
+    with pytest.raises(ValueError):
+        ReplayData.from_bytes(REPLAY_HEADER.pack(magic, REPLAY_VERSION + 1, seed, ticks))
+
+
+@pytest.mark.parametrize('randomizer', ['uniform', 'bag', 'history'])
+def test_snapshot_restore_continues_identically(randomizer):
+    board = BoardConfig(randomizer=randomizer)
+    simulation = GameSimulation(seed=3, board=board)
+    rng = random.Random(4)
+    for bits in _random_bits(rng, 1500):
+        simulation.step_bits(bits)
+    snapshot = simulation.snapshot()
+
+    future = _random_bits(rng, 1500, restarts=(900,))
+    expected = []
+    for bits in future:
+        simulation.step_bits(bits)
+        expected.append(_state(simulation))
+
+    # Na mesma simulação e numa nova com a mesma seed
+    for target in (simulation, GameSimulation(seed=3, board=board)):
+        target.restore(snapshot)
+        continued = []
+        for bits in future:
+            target.step_bits(bits)
+            continued.append(_state(target))
+        assert continued == expected
+
+
+
+def _lock_ticks(simulation: GameSimulation) -> List[int]:
+    """Tempos de spawn a fixação dos SHAPE_LOCKED da simulação"""
+    ticks = []
+    simulation.event_dispatcher.add_listener(
+        GameEventType.SHAPE_LOCKED, lambda event: ticks.append(event.data['ticks']))
+    return ticks
+
+
+def test_restore_keeps_spawn_to_lock_ticks():
+    drop = INPUT_BITS[GameAction.HARD_DROP]
+    simulation = GameSimulation(seed=6)
+    for bits in [drop] * 3 + [0] * 40:
+        simulation.step_bits(bits)
+    # A peça está caindo: nasceu antes do tick do snapshot
+    assert simulation.tick_count > simulation.piece_spawn_tick
+    snapshot = simulation.snapshot()
+    locks = _lock_ticks(simulation)
+    simulation.step_bits(drop)
+    expected = list(locks)
+    assert len(expected) == 1 and expected[0] > 0
+
+    for target in (simulation, GameSimulation(seed=6)):
+        target.restore(snapshot)
+        locks = _lock_ticks(target)
+        target.step_bits(drop)
+        assert locks == expected
+
+
+ACTIONS = (None, GameAction.LEFT, GameAction.RIGHT, GameAction.DOWN,
+           GameAction.ROTATE_CW, GameAction.ROTATE_CCW, GameAction.HARD_DROP)
+ACTION_WEIGHTS = (30, 3, 3, 1, 2, 2, 1)
+
+
+@pytest.mark.parametrize('tick_rate, randomizer', [(60, 'uniform'), (30, 'bag'), (144, 'history')])
+def test_batch_matches_scalar(tick_rate, randomizer):
+    count = 8
+    seeds = list(range(100, 100 + count))
+    board = BoardConfig(randomizer=randomizer)
+    batch = BatchSimulation(count, seeds, board, tick_rate=tick_rate)
+    simulations = [GameSimulation(seed=seed, tick_rate=tick_rate, board=board)
+                   for seed in seeds]
+    shape_types = batch.grid.shape_types
+    rng = random.Random(5)
+    for step in range(2000):
+        actions = [rng.choices(ACTIONS, ACTION_WEIGHTS)[0] for _ in range(count)]
+        lines = batch.step([BATCH_ACTION_CODES[action] for action in actions])
+        for i, simulation in enumerate(simulations):
+            assert simulation.step(actions[i]) == lines[i], (step, i)
+            assert simulation.game_over == batch.game_over[i], (step, i)
+            if simulation.game_over:
+                continue
+            tetromino = simulation.current_tetromino
+            assert shape_types[batch.piece_type[i]] == tetromino.shape_type, (step, i)
+            assert batch.rotation[i] == tetromino.rotation_index, (step, i)
+            assert [batch.pos_x[i], batch.pos_y[i]] == tetromino.position, (step, i)
+            assert simulation.fall_speed == batch.fall_speed[i], (step, i)
+            assert simulation.score_manager.score == batch.score[i], (step, i)
+
+
+def test_bag_deals_every_shape_once_per_seven():
+    factory = TetrominoFactory(seed=9, randomizer='bag')
+    shapes = set(factory.definitions)
+    drawn = [factory.next_shape() for _ in range(7 * 50)]
+    for start in range(0, len(drawn), 7):
+        assert set(drawn[start:start + 7]) == shapes
+
+    # A fila de preview não muda a ordem das peças que entram em jogo
+    # (a grade é esvaziada a cada peça para o jogo não acabar)
+    simulation = GameSimulation(seed=9, board=BoardConfig(randomizer='bag'))
+    spawned = []
+    for _ in range(7 * 20):
+        spawned.append(simulation.current_tetromino.shape_type)
+        simulation.apply_action(GameAction.HARD_DROP)
+        simulation.grid.clear()
+    assert not simulation.game_over
+    for start in range(0, len(spawned), 7):
+        assert set(spawned[start:start + 7]) == shapes
+
+
+@pytest.mark.parametrize('backend', sorted(GRID_BACKENDS))
+def test_remove_no_lines_is_a_no_op(backend):
+    grid = GRID_BACKENDS[backend](10, 20)
+    grid.add_garbage_rows(3, 4)
+    before = (grid.occupancy_rows(), grid.features(), grid.revision)
+    grid.remove_lines(grid.check_line_completions())
+    grid.remove_lines([])
+    assert (grid.occupancy_rows(), grid.features(), grid.revision) == before
+
+
+@pytest.mark.parametrize('piece, rows', [
+    ((TetrominoType.T, 3, 4, -1), ((0, 0), (18, 0b1111011111), (19, 0x3FF))),
+    (None, ()),
+])
+def test_match_delta_round_trip(piece, rows):
+    delta = MatchDelta(tick=123456, player=1, ack=99, piece_seq=42, piece=piece,
+                       score=987654321, lines=250, pending_garbage=7,
+                       game_over=piece is None, rows=rows)
+    assert decode_delta(encode_delta(delta)) == delta
+
+
+def test_match_delta_clamps_counters():
+    delta = MatchDelta(1, 0, 0, 0, None, 0, 70000, 300, False, ())
+    decoded = decode_delta(encode_delta(delta))
+    assert (decoded.lines, decoded.pending_garbage) == (0xFFFF, 0xFF)
+
+
+def _naive_drop(grid, tetromino) -> int:
+    """Distância de queda descendo uma linha por vez"""
+    distance = 0
+    while not grid.is_collision(tetromino, 0, distance + 1):
+        distance += 1
+    return distance
+
+
+def _recomputed_features(grid):
+    """features() de uma grade nova do mesmo tipo, recalculada do zero"""
+    fresh = type(grid)(grid.width, grid.height)
+    fresh.restore_state(grid.snapshot_state())
+    return fresh.features()
+
+
+def _check_grids(grids, probes):
+    list_grid, bitboard = grids
+    assert list_grid.cells == bitboard.cells
+    assert list_grid.features() == bitboard.features()
+    for grid in grids:
+        assert grid.features() == _recomputed_features(grid)
+    for tetromino in probes:
+        collides = [grid.is_collision(tetromino) for grid in grids]
+        assert collides[0] == collides[1]
+        if not collides[0]:
+            distances = [grid.drop_distance(tetromino) for grid in grids]
+            assert distances == [_naive_drop(list_grid, tetromino)] * 2
+
+
+@pytest.mark.parametrize('seed', range(12))
+def test_grid_backends_and_features_agree(seed):
+    """Lista e bitboard com as mesmas peças, incluindo beirais e lixo.
+
+    Depois de cada fixação, limpeza e linha de lixo, as duas grades têm
+    as mesmas células, colisões e quedas, e os atributos incrementais
+    batem com um recálculo completo.
+    """
+    rng = random.Random(seed)
+    width, height = rng.choice(((10, 20), (6, 12), (13, 30)))
+    grids = (GRID_BACKENDS['list'](width, height), GRID_BACKENDS['bitboard'](width, height))
+    factory = TetrominoFactory()
+    shapes = list(factory.definitions)
+
+    def random_piece() -> ActiveTetromino:
+        tetromino = ActiveTetromino(rng.choice(shapes), factory)
+        tetromino.rotation_index = rng.randrange(4)
+        mask = tetromino.get_collision_mask()
+        tetromino.position = [rng.randrange(-mask.min_x, width - mask.max_x),
+                              rng.randrange(-mask.min_y, height // 2)]
+        return tetromino
+
+    cleared = garbage = tucked = 0
+    for _ in range(400):
+        if rng.random() < 0.05:
+            count, hole = rng.randrange(1, 3), rng.randrange(width)
+            for grid in grids:
+                grid.add_garbage_rows(count, hole)
+            garbage += 1
+            _check_grids(grids, [random_piece() for _ in range(8)])
+            continue
+
+        # A maioria das peças vai para a coluna mais funda, para completar linhas
+        tetromino = random_piece()
+        mask = tetromino.get_collision_mask()
+        candidates = []
+        for x in range(-mask.min_x, width - mask.max_x):
+            tetromino.position = [x, -mask.min_y]
+            if not grids[0].is_collision(tetromino):
+                candidates.append((grids[0].drop_distance(tetromino), rng.random(), x))
+        if not candidates:
+            for grid in grids:
+                grid.clear()
+            continue
+        column = (max(candidates) if rng.random() < 0.7 else rng.choice(candidates))[2]
+        tetromino.position = [column, -mask.min_y]
+        tetromino.hard_drop(grids[0])
+        if rng.random() < 0.5:
+            # Sobe e desliza para baixo de um beiral, quando há um
+            direction = rng.choice((-1, 1))
+            lift = rng.randrange(1, 4)
+            top = tetromino.position[1] - lift + tetromino.get_collision_mask().min_y
+            if top >= 0 and not grids[0].is_collision(tetromino, 0, -lift):
+                tetromino.position[1] -= lift
+                while tetromino.move(direction, 0, grids[0]):
+                    pass
+                landing = tetromino.position[1] + grids[0].drop_distance(tetromino)
+                tucked += landing > tetromino.position[1] + lift
+                tetromino.position[1] = landing
+        for grid in grids:
+            assert grid.place_tetromino(tetromino)
+        rows = grids[0].check_line_completions()
+        assert rows == grids[1].check_line_completions()
+        for grid in grids:
+            grid.remove_lines(list(rows))
+        cleared += bool(rows)
+        _check_grids(grids, [random_piece() for _ in range(8)])
+    assert cleared and garbage and tucked
+
+
+class _NestedDraws:
+    """draw_grid chama draw_locked_cells, como no RenderSystem"""
+
+    def draw_grid(self):
+        time.sleep(0.005)
+        self.draw_locked_cells()
+
+    def draw_locked_cells(self):
+        time.sleep(0.02)
+
+
+def test_profiler_counts_nested_draws_once():
+    profiler = FrameProfiler()
+    renderer = _NestedDraws()
+    profiler.instrument(renderer, ['draw_grid', 'draw_locked_cells'])
+    profiler.begin_frame()
+    profiler.measure('render', renderer.draw_grid)
+    profiler.end_frame()
+    phases = {name: samples[-1] for name, samples in profiler.samples.items()}
+    assert phases['draw_locked_cells'] >= 20
+    assert 5 <= phases['draw_grid'] < 20
+    assert phases['draw_grid'] + phases['draw_locked_cells'] <= phases['render']
+    profiler.close()
+
+
+
+def test_audio_without_channels_stays_silent(monkeypatch):
+    monkeypatch.setattr(GameConfiguration.AudioSettings, 'SFX_CHANNELS', 0)
+    audio = AudioSystem()
+    assert audio.wait(5.0)
+    # Com ou sem dispositivo: um efeito carregado e nenhum canal
+    audio._sounds['lock'] = object()
+    try:
+        audio.play('lock')
+    finally:
+        audio.close()
+
+# Tamanhos mínimos de cada benchmark: só confere que roda até o fim
+BENCHMARK_SMOKE_SIZES = {
+    'get_current_shape': dict(calls=20),
+    'move_rotate': dict(moves=20),
+    'is_collision': dict(calls=20),
+    'lock': dict(locks=20),
+    'board_scaling': dict(locks=20, clears=5),
+    'hard_drop': dict(calls=20),
+    'randomizer': dict(calls=20),
+    'headless_games': dict(games=2),
+    'events': dict(ticks=200),
+    'audio': dict(calls=20),
+    'state_memory': dict(count=2, ticks=20),
+    'render': dict(frames=3),
+    'batch': dict(boards=20, rounds=1),
+    'ai_decision': dict(max_ticks=120),
+}
+
+
+def test_every_benchmark_has_a_smoke_size():
+    assert set(BENCHMARK_SMOKE_SIZES) == set(benchmarks.BENCHMARKS)
+
+
+@pytest.mark.parametrize('name', sorted(BENCHMARK_SMOKE_SIZES))
+def test_benchmark_runs_at_tiny_size(name):
+    results = benchmarks.BENCHMARKS[name](**BENCHMARK_SMOKE_SIZES[name])
+    assert results
+    for metric, value in results.items():
+        assert math.isfinite(value), metric